@@ -0,0 +1,47 @@
+"""Rebuild the hourly and daily activity rollups from existing sessions and messages
+
+New activity is counted as it is written; this fills the rollups for
+history recorded before they existed, or repairs them. The rebuilt buckets
+are replaced in one transaction.
+
+    cd backend
+    python backfill_analytics.py                      # everything; stop the API first
+    python backfill_analytics.py --until 2024-06-01   # only days before the rollups were switched on
+"""
+import argparse
+import asyncio
+import time
+from datetime import date, datetime
+
+
+async def backfill(until, batch_size):
+    from src.config.database import SessionLocal, create_tables, engine
+    from src.utils.analytics import backfill_rollups
+
+    await create_tables()
+    try:
+        return await backfill_rollups(SessionLocal, until=until, batch_size=batch_size)
+    finally:
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the analytics rollups from sessions and messages")
+    parser.add_argument(
+        "--until", type=date.fromisoformat,
+        help="Only rebuild days before this UTC date (YYYY-MM-DD); later buckets are left as they are",
+    )
+    parser.add_argument("--batch-size", type=int, default=10000, help="Rows read and written per round trip")
+    args = parser.parse_args()
+
+    until = datetime.combine(args.until, datetime.min.time()) if args.until else None
+    start = time.perf_counter()
+    totals = asyncio.run(backfill(until, args.batch_size))
+    print(
+        f"Replayed {totals['sessions']} sessions and {totals['messages']} messages into "
+        f"{totals['buckets']} buckets in {time.perf_counter() - start:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
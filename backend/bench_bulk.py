@@ -0,0 +1,151 @@
+"""Bulk import/export against the per-message API
+
+Serves the app in-process against a throwaway SQLite file and moves the
+same messages both ways:
+
+    write  one POST /conversations/{id}/messages/ per message, then one
+           POST /import/messages with all of them as NDJSON
+    read   paging GET /conversations/{id}/messages/ 100 at a time for every
+           conversation, then one GET /export/conversations stream
+
+The peak Python heap while producing the export is measured separately,
+on the server side (httpx's in-process transport buffers whole responses);
+it should stay about the same as --messages grows.
+
+    python bench_bulk.py --conversations 50 --messages 2000 --output bulk.json
+    DATABASE_URL=postgresql://... python bench_bulk.py   # against Postgres
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+
+import httpx
+
+
+def ndjson(records) -> bytes:
+    return "".join(json.dumps(record) + "\n" for record in records).encode()
+
+
+def rate(count: int, elapsed: float) -> dict:
+    return {"messages": count, "seconds": elapsed, "messages_per_s": count / elapsed if elapsed else 0.0}
+
+
+async def write_per_message(client, conversation_ids, count: int) -> dict:
+    start = time.perf_counter()
+    for i in range(count):
+        response = await client.post(
+            f"/api/conversations/{conversation_ids[i % len(conversation_ids)]}/messages/",
+            json={"content": f"Per-message benchmark {i}", "is_user": "true" if i % 2 == 0 else "false"},
+        )
+        response.raise_for_status()
+    return rate(count, time.perf_counter() - start)
+
+
+async def write_bulk(client, conversation_ids, count: int) -> dict:
+    body = ndjson(
+        {
+            "conversation_id": conversation_ids[i % len(conversation_ids)],
+            "content": f"Bulk benchmark {i}",
+            "is_user": "true" if i % 2 == 0 else "false",
+        }
+        for i in range(count)
+    )
+    start = time.perf_counter()
+    response = await client.post("/api/import/messages", content=body)
+    response.raise_for_status()
+    assert response.json()["inserted"] == count
+    return rate(count, time.perf_counter() - start)
+
+
+async def read_paged(client, conversation_ids) -> dict:
+    count = 0
+    start = time.perf_counter()
+    for conversation_id in conversation_ids:
+        cursor = None
+        while True:
+            params = {"limit": 100, **({"cursor": cursor} if cursor else {})}
+            response = await client.get(f"/api/conversations/{conversation_id}/messages/", params=params)
+            count += len(response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if cursor is None:
+                break
+    return rate(count, time.perf_counter() - start)
+
+
+async def read_export(client) -> dict:
+    count = 0
+    start = time.perf_counter()
+    async with client.stream("GET", "/api/export/conversations") as response:
+        async for line in response.aiter_lines():
+            if line and json.loads(line)["type"] == "message":
+                count += 1
+    return rate(count, time.perf_counter() - start)
+
+
+async def export_peak_heap_mb() -> float:
+    """Peak heap while serialising the whole export, as the route does"""
+    from src.config.database import SessionLocal
+    from src.repository.chat import stream_export
+    from src.utils.ndjson import dumps_line
+
+    tracemalloc.start()
+    async with SessionLocal() as db:
+        async for record in stream_export(db):
+            dumps_line(record)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 2**20
+
+
+async def run(conversations: int, messages: int) -> dict:
+    from src.main import app, lifespan
+
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            conversation_ids = []
+            for _ in range(conversations):
+                client.cookies.clear()
+                conversation_ids.append((await client.post("/api/conversations/")).json()["id"])
+            results = {
+                "write_per_message": await write_per_message(client, conversation_ids, messages),
+                "write_bulk": await write_bulk(client, conversation_ids, messages),
+                "read_paged": await read_paged(client, conversation_ids),
+                "read_export": await read_export(client),
+            }
+            results["read_export"]["peak_heap_mb"] = await export_peak_heap_mb()
+    results["write_speedup"] = results["write_bulk"]["messages_per_s"] / results["write_per_message"]["messages_per_s"]
+    results["read_speedup"] = results["read_export"]["messages_per_s"] / results["read_paged"]["messages_per_s"]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk NDJSON import/export vs the per-message API")
+    parser.add_argument("--conversations", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=2000, help="Messages written by each method")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.setdefault("DATABASE_URL", f"sqlite:///{tmp}/bench_bulk.db")
+        results = asyncio.run(run(args.conversations, args.messages))
+
+    print(f"{'':<20} {'messages':>9} {'seconds':>9} {'msg/s':>10}")
+    for name in ("write_per_message", "write_bulk", "read_paged", "read_export"):
+        stats = results[name]
+        print(f"{name:<20} {stats['messages']:>9} {stats['seconds']:>9.2f} {stats['messages_per_s']:>10.0f}")
+    print(f"\nWrite {results['write_speedup']:.1f}x, read {results['read_speedup']:.1f}x faster in bulk; "
+          f"export peak heap {results['read_export']['peak_heap_mb']:.1f} MB")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"python": platform.python_version(), "args": vars(args), **results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""List endpoint serialization: ORM objects + Pydantic vs column rows + orjson
+
+Fills a throwaway database, then builds the JSON body of
+GET /conversations/ and GET /conversations/{id}/messages/ both ways for
+pages of 100 and 1000 items:
+
+    orm   ORM objects validated through the response_model, as FastAPI did
+    rows  selected columns encoded directly (what the routes now do)
+
+CPU time is process time per request (it includes the database driver's
+thread); peak memory is the Python heap high-water mark while building
+one response.
+
+    python bench_lists.py --output lists.json
+    DATABASE_URL=postgresql://... python bench_lists.py
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import List
+
+PAGE_SIZES = (100, 1000)
+
+
+async def populate(engine, conversations: int, messages_per_conversation: int, long_conversation: int):
+    from sqlalchemy import insert
+
+    from src.models.chat import Conversation, Message
+    from src.models.session import Session
+
+    start_time = datetime(2024, 1, 1)
+    async with engine.begin() as conn:
+        await conn.execute(insert(Session), [{"session_id": "bench", "cookie_id": "bench", "messages_count": 0, "total_interactions": 0}])
+        session_id = (await conn.exec_driver_sql("SELECT id FROM sessions")).scalar_one()
+        await conn.execute(insert(Conversation), [
+            {"session_id": session_id, "created_at": start_time, "updated_at": start_time}
+            for _ in range(conversations)
+        ])
+        conversation_ids = [row[0] for row in await conn.exec_driver_sql("SELECT id FROM conversations ORDER BY id")]
+        counts = {conversation_ids[0]: long_conversation}
+        rows = [
+            {
+                "conversation_id": conversation_id,
+                "content": f"Message {i} about term dates, fees and where to find the library on campus",
+                "is_user": "true" if i % 2 == 0 else "false",
+                "timestamp": start_time + timedelta(seconds=i, microseconds=i * 1000 % 1_000_000),
+            }
+            for conversation_id in conversation_ids
+            for i in range(counts.get(conversation_id, messages_per_conversation))
+        ]
+        await conn.execute(insert(Message), rows)
+    return conversation_ids[0]
+
+
+def pydantic_json(schema, objects) -> bytes:
+    """The response_model path: validate ORM objects, dump to JSON types, encode"""
+    from pydantic import TypeAdapter
+
+    adapter = TypeAdapter(List[schema])
+    content = adapter.dump_python(adapter.validate_python(objects, from_attributes=True), mode="json")
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+async def build(db, endpoint: str, method: str, limit: int, conversation_id: int) -> bytes:
+    from src.repository import chat as chat_repository
+    from src.schemas import chat as schemas
+    from src.utils.json_response import dumps
+
+    if endpoint == "messages":
+        if method == "orm":
+            return pydantic_json(schemas.Message, await chat_repository.get_messages(db, conversation_id, limit=limit))
+        return dumps(await chat_repository.get_message_rows(db, conversation_id, limit=limit))
+    if method == "orm":
+        return pydantic_json(schemas.Conversation, await chat_repository.get_conversations(db, limit=limit))
+    return dumps(await chat_repository.get_conversation_rows(db, limit=limit))
+
+
+async def measure(endpoint: str, method: str, limit: int, conversation_id: int, runs: int) -> dict:
+    from src.config.database import SessionLocal
+
+    cpu, wall = [], []
+    for _ in range(runs + 1):
+        # A fresh session per request, like the route dependency
+        async with SessionLocal() as db:
+            cpu_start, wall_start = time.process_time(), time.perf_counter()
+            body = await build(db, endpoint, method, limit, conversation_id)
+            cpu.append(time.process_time() - cpu_start)
+            wall.append(time.perf_counter() - wall_start)
+    cpu, wall = sorted(cpu[1:]), sorted(wall[1:])  # first run warms caches
+
+    async with SessionLocal() as db:
+        tracemalloc.start()
+        await build(db, endpoint, method, limit, conversation_id)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {
+        "cpu_ms": 1000 * sum(cpu) / len(cpu),
+        "p50_ms": 1000 * wall[len(wall) // 2],
+        "peak_kb": peak / 1024,
+        "bytes": len(body),
+    }
+
+
+async def run(args) -> dict:
+    from src.config.database import create_tables, engine
+
+    await create_tables()
+    conversation_id = await populate(engine, max(PAGE_SIZES), args.messages_per_conversation, max(PAGE_SIZES))
+    results = {}
+    for endpoint in ("messages", "conversations"):
+        for limit in PAGE_SIZES:
+            case = {method: await measure(endpoint, method, limit, conversation_id, args.runs) for method in ("orm", "rows")}
+            case["cpu_speedup"] = case["orm"]["cpu_ms"] / case["rows"]["cpu_ms"]
+            case["same_bytes"] = case["orm"]["bytes"] == case["rows"]["bytes"]
+            results[f"{endpoint}_{limit}"] = case
+    await engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ORM + Pydantic vs column rows + orjson for list endpoints")
+    parser.add_argument("--messages-per-conversation", type=int, default=4, help="Messages nested in each listed conversation")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.setdefault("DATABASE_URL", f"sqlite:///{tmp}/bench_lists.db")
+        results = asyncio.run(run(args))
+
+    print(f"{'case':<20} {'orm cpu ms':>11} {'rows cpu ms':>12} {'speedup':>8} {'orm peak KB':>12} {'rows peak KB':>13}")
+    for name, case in results.items():
+        print(f"{name:<20} {case['orm']['cpu_ms']:>11.2f} {case['rows']['cpu_ms']:>12.2f} {case['cpu_speedup']:>7.1f}x "
+              f"{case['orm']['peak_kb']:>12.0f} {case['rows']['peak_kb']:>13.0f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"python": platform.python_version(), "args": vars(args), **results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
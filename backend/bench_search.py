@@ -0,0 +1,193 @@
+"""Message search latency on a large synthetic table: full-text index vs LIKE
+
+Fills a throwaway database with --rows synthetic messages (through the
+normal schema, so the full-text index is maintained as rows are written),
+then times the search query against the `LIKE '%term%'` scan it replaces:
+
+    python bench_search.py --rows 1000000 --output search.json
+    DATABASE_URL=postgresql://... python bench_search.py --rows 2000000
+
+Each case runs --runs times; LIKE runs --like-runs times because every run
+reads the whole table.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+STOP_WORDS = "the a is to of and in for on how what when where can i do my you are it at with".split()
+# Topic words sit among generated filler words in a Zipf distribution, so
+# each appears in roughly 0.1-5% of messages, as real vocabulary does
+TOPIC_WORDS = (
+    "library student course fees campus open hours apply module exam deadline accommodation "
+    "parking permit support visa international timetable lecture room book loan card email "
+    "password portal graduation scholarship funding finance union sport gym health wellbeing "
+    "career erasmus viva plagiarism bursary chaplaincy dissertation lanyard"
+).split()
+VOCABULARY_SIZE = 5000
+
+CASES = {
+    "common_word": {"q": "library"},
+    "two_words": {"q": "parking permit"},
+    "rare_word": {"q": "chaplaincy"},
+    "stemmed": {"q": "applying scholarships"},
+    "session_filter": {"q": "student", "session": True},
+    "date_filter": {"q": "accommodation", "days": 7},
+}
+
+
+def vocabulary(rng: random.Random):
+    """(words, cumulative weights) with topic words spread across the ranks"""
+    filler = ["".join(rng.choices("bcdfghklmnprstvw", k=2) + rng.choices("aeiou", k=1) + rng.choices("bcdfgklmnprst", k=2))
+              for _ in range(VOCABULARY_SIZE)]
+    for i, word in enumerate(TOPIC_WORDS):
+        filler[i * 40] = word
+    weights, total = [], 0.0
+    for rank in range(len(filler)):
+        total += 1 / (rank + 50)
+        weights.append(total)
+    return filler, weights
+
+
+def synthetic_content(rng: random.Random, words, cum_weights) -> str:
+    length = rng.randint(6, 40)
+    content = rng.choices(words, cum_weights=cum_weights, k=length // 2)
+    content += rng.choices(STOP_WORDS, k=length - len(content))
+    rng.shuffle(content)
+    return " ".join(content)
+
+
+async def populate(engine, rows: int, sessions: int, per_conversation: int, seed: int, chunk: int = 20000) -> float:
+    from sqlalchemy import insert
+
+    from src.models.chat import Conversation, Message
+    from src.models.session import Session
+
+    rng = random.Random(seed)
+    words, cum_weights = vocabulary(rng)
+    start_time = datetime(2024, 1, 1)
+    conversations = max(1, rows // per_conversation)
+    started = time.perf_counter()
+    async with engine.begin() as conn:
+        await conn.execute(insert(Session), [
+            {"session_id": f"bench-{i}", "cookie_id": f"bench-{i}", "messages_count": 0, "total_interactions": 0}
+            for i in range(sessions)
+        ])
+        session_ids = [row[0] for row in await conn.exec_driver_sql("SELECT id FROM sessions")]
+        await conn.execute(insert(Conversation), [
+            {"session_id": session_ids[i % len(session_ids)], "created_at": start_time, "updated_at": start_time}
+            for i in range(conversations)
+        ])
+        conversation_ids = [row[0] for row in await conn.exec_driver_sql("SELECT id FROM conversations")]
+    for offset in range(0, rows, chunk):
+        async with engine.begin() as conn:
+            await conn.execute(insert(Message), [
+                {
+                    "conversation_id": conversation_ids[i // per_conversation % len(conversation_ids)],
+                    "content": synthetic_content(rng, words, cum_weights),
+                    "is_user": "true" if i % 2 == 0 else "false",
+                    "timestamp": start_time + timedelta(seconds=i * 30),
+                }
+                for i in range(offset, min(offset + chunk, rows))
+            ])
+    return time.perf_counter() - started
+
+
+async def like_search(db, terms, session_id=None, since=None, limit: int = 20):
+    """What support staff ran before: a substring scan, newest first"""
+    from sqlalchemy import and_, select
+
+    from src.models.chat import Conversation, Message
+
+    query = (
+        select(Message.id, Message.content)
+        .join(Conversation, Conversation.id == Message.conversation_id)
+        .where(and_(*(Message.content.like(f"%{term}%") for term in terms)))
+        .order_by(Message.timestamp.desc())
+        .limit(limit)
+    )
+    if session_id is not None:
+        query = query.where(Conversation.session_id == session_id)
+    if since is not None:
+        query = query.where(Message.timestamp >= since)
+    return (await db.execute(query)).all()
+
+
+def percentiles(latencies) -> dict:
+    ordered = sorted(latencies)
+    pick = lambda pct: 1000 * ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+    return {"p50_ms": pick(50), "p95_ms": pick(95), "runs": len(ordered)}
+
+
+async def run(args) -> dict:
+    from sqlalchemy import func, select
+
+    from src.config.database import SessionLocal, create_tables, engine
+    from src.models.chat import Message
+    from src.repository.chat import search_messages, search_terms
+
+    await create_tables()
+    results = {"insert_s": await populate(engine, args.rows, args.sessions, args.per_conversation, args.seed)}
+    results["insert_rows_per_s"] = args.rows / results["insert_s"]
+
+    async with SessionLocal() as db:
+        last = (await db.execute(select(func.max(Message.timestamp)))).scalar_one()
+        for name, case in CASES.items():
+            terms = search_terms(case["q"])
+            filters = {}
+            if case.get("session"):
+                filters["session_id"] = 1
+            if case.get("days"):
+                filters["since"] = last - timedelta(days=case["days"])
+
+            timings = {}
+            for method, runs, search in (
+                ("fts", args.runs, lambda: search_messages(db, terms, **filters)),
+                ("like", args.like_runs, lambda: like_search(db, terms, **filters)),
+            ):
+                latencies = []
+                for _ in range(runs):
+                    start = time.perf_counter()
+                    hits = await search()
+                    latencies.append(time.perf_counter() - start)
+                timings[method] = {**percentiles(latencies), "hits": len(hits)}
+            timings["speedup"] = timings["like"]["p50_ms"] / max(timings["fts"]["p50_ms"], 1e-6)
+            results[name] = timings
+    await engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full-text search vs LIKE on synthetic messages")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--sessions", type=int, default=5000)
+    parser.add_argument("--per-conversation", type=int, default=20, help="Messages per conversation")
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--like-runs", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.setdefault("DATABASE_URL", f"sqlite:///{tmp}/bench_search.db")
+        results = asyncio.run(run(args))
+
+    print(f"{args.rows} messages inserted in {results['insert_s']:.1f}s ({results['insert_rows_per_s']:.0f} rows/s, index included)")
+    print(f"{'case':<16} {'fts p50':>9} {'fts p95':>9} {'like p50':>10} {'speedup':>9} {'hits':>5}")
+    for name in CASES:
+        row = results[name]
+        print(f"{name:<16} {row['fts']['p50_ms']:>9.2f} {row['fts']['p95_ms']:>9.2f} "
+              f"{row['like']['p50_ms']:>10.1f} {row['speedup']:>8.0f}x {row['fts']['hits']:>5}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"python": platform.python_version(), "args": vars(args), **results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
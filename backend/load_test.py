@@ -0,0 +1,201 @@
+"""Concurrent load test for the chat API
+
+Each virtual user creates a conversation and then loops over posting a
+message, reading its messages and listing conversations. Requests per
+second and latency percentiles are reported per endpoint.
+
+To compare two versions of the backend, run each one and save the results,
+then diff them:
+
+    python run.py                                    # in another shell
+    python load_test.py --url http://localhost:8000 --output before.json
+    ...switch version, restart...
+    python load_test.py --url http://localhost:8000 --output after.json
+    python load_test.py --compare before.json after.json
+
+Without --url the app is served in-process against a throwaway SQLite file,
+and --chat posts to the chat route backed by the stub LLM from stub_llm.py.
+With --baseline, endpoints whose p95 grew or whose req/s dropped by more
+than --max-regression are listed and the exit status is 1:
+
+    python load_test.py --chat --output bench.json
+    python load_test.py --chat --baseline bench.json --max-regression 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def virtual_user(client: httpx.AsyncClient, deadline: float, latencies, errors, chat: bool = False):
+    async def timed(name, method, url, **kwargs):
+        start = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        latencies[name].append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            errors[name] += 1
+        return response
+
+    response = await timed("create_conversation", "POST", "/api/conversations/")
+    if response.status_code >= 400:
+        return
+    conversation_id = response.json()["id"]
+    i = 0
+    while time.perf_counter() < deadline:
+        await timed(
+            "create_message", "POST", f"/api/conversations/{conversation_id}/messages/",
+            json={"content": f"Load test message {i}", "is_user": "true"},
+        )
+        await timed("read_messages", "GET", f"/api/conversations/{conversation_id}/messages/")
+        await timed("read_conversations", "GET", "/api/conversations/", params={"limit": 20})
+        if chat:
+            await timed(
+                "chat", "POST", f"/api/conversations/{conversation_id}/chat",
+                json={"prompt": f"Load test question {i % 10}"},
+            )
+        i += 1
+
+
+async def run_load(client: httpx.AsyncClient, concurrency: int, duration: float, chat: bool = False) -> dict:
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(virtual_user(client, deadline, latencies, errors, chat) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    endpoints = {}
+    for name, values in latencies.items():
+        endpoints[name] = {
+            "requests": len(values),
+            "errors": errors[name],
+            "rps": len(values) / elapsed,
+            "p50_ms": 1000 * percentile(values, 50),
+            "p95_ms": 1000 * percentile(values, 95),
+            "p99_ms": 1000 * percentile(values, 99),
+        }
+    total = sum(len(values) for values in latencies.values())
+    return {
+        "python": platform.python_version(),
+        "concurrency": concurrency,
+        "duration_s": elapsed,
+        "requests": total,
+        "rps": total / elapsed,
+        "endpoints": endpoints,
+    }
+
+
+async def run_in_process(concurrency: int, duration: float, chat: bool = False) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/load_test.db"
+        from src.main import app, lifespan
+        from src.utils.llm_client import llm_client
+        from stub_llm import create_stub_app
+
+        llm_client.url = "http://stub-llm/"
+        llm_client.summary_url = "http://stub-llm/summarize"
+        llm_client.transport = httpx.ASGITransport(app=create_stub_app(latency=0.05))
+        async with lifespan(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://load-test") as client:
+                return await run_load(client, concurrency, duration, chat)
+
+
+async def run_remote(url: str, concurrency: int, duration: float, chat: bool = False) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        return await run_load(client, concurrency, duration, chat)
+
+
+def print_results(results: dict):
+    print(f"\n{results['requests']} requests in {results['duration_s']:.1f}s "
+          f"with {results['concurrency']} users: {results['rps']:.1f} req/s")
+    print(f"{'endpoint':<22} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for name, stats in sorted(results["endpoints"].items()):
+        print(f"{name:<22} {stats['rps']:>8.1f} {stats['p50_ms']:>8.1f} "
+              f"{stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f} {stats['errors']:>7}")
+
+
+def compare(before_path: str, after_path: str):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"{'endpoint':<22} {'before':>9} {'after':>9} {'change':>8}")
+    rows = [("total", before["rps"], after["rps"])]
+    for name in sorted(set(before["endpoints"]) | set(after["endpoints"])):
+        rows.append((
+            name,
+            before["endpoints"].get(name, {}).get("rps", 0.0),
+            after["endpoints"].get(name, {}).get("rps", 0.0),
+        ))
+    for name, old, new in rows:
+        change = f"{(new / old - 1) * 100:+.0f}%" if old else "n/a"
+        print(f"{name:<22} {old:>9.1f} {new:>9.1f} {change:>8}")
+
+
+def find_regressions(baseline: dict, results: dict, max_regression: float) -> list:
+    regressions = []
+    for name, stats in results["endpoints"].items():
+        old = baseline["endpoints"].get(name)
+        if not old:
+            continue
+        if old["p95_ms"] and stats["p95_ms"] > old["p95_ms"] * (1 + max_regression):
+            regressions.append(f"{name}: p95 {old['p95_ms']:.1f} -> {stats['p95_ms']:.1f} ms")
+        if stats["rps"] < old["rps"] * (1 - max_regression):
+            regressions.append(f"{name}: {old['rps']:.1f} -> {stats['rps']:.1f} req/s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Hull Chat API")
+    parser.add_argument("--url", help="Base URL of a running server (default: in-process app)")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds to run")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--chat", action="store_true", help="Include the chat route (stub LLM in-process)")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="Compare two result files")
+    parser.add_argument("--baseline", help="Fail on regressions against this result file")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    if args.url:
+        results = asyncio.run(run_remote(args.url, args.concurrency, args.duration, args.chat))
+    else:
+        results = asyncio.run(run_in_process(args.concurrency, args.duration, args.chat))
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(json.load(f), results, args.max_regression)
+        if regressions:
+            print(f"\nRegressions beyond {args.max_regression:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.max_regression:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
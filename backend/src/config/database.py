@@ -0,0 +1,81 @@
+import importlib
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
+from src.config import settings
+
+def async_database_url(url: str) -> str:
+    """Point plain postgresql:// and sqlite:// URLs at their async drivers"""
+    if url.startswith("postgresql://"):
+        return "postgresql+asyncpg://" + url[len("postgresql://"):]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+def engine_options(url: str) -> dict:
+    """Pool settings from configuration; SQLite manages its own pool"""
+    options = {"echo": settings.DB_ECHO}
+    if not url.startswith("sqlite"):
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+        )
+    return options
+
+SQLALCHEMY_DATABASE_URL = async_database_url(settings.DATABASE_URL)
+
+# Create SQLAlchemy async engine
+engine = create_async_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
+
+# Create SessionLocal class; objects stay usable after commit so responses
+# can be serialized without another round trip
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# Create Base class
+Base = declarative_base()
+
+# Modules whose tables live on Base
+MODEL_MODULES = ("src.models.chat", "src.models.session", "src.models.analytics")
+
+def register_models():
+    """Import every model module so all tables are on Base.metadata"""
+    for module in MODEL_MODULES:
+        importlib.import_module(module)
+
+def _add_missing_columns(conn):
+    """Add nullable columns that were added to a model after its table was created"""
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing and column.nullable:
+                column_type = column.type.compile(dialect=conn.dialect)
+                conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+
+def _create_all(conn):
+    from src.models.search import create_search_index
+
+    register_models()
+    Base.metadata.create_all(conn)
+    _add_missing_columns(conn)
+    # create_all skips tables that already exist, so indexes added to an
+    # existing table are created here
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+    # Full-text index; dialect-specific, so not part of the metadata
+    create_search_index(conn)
+
+async def create_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(_create_all)
+
+# Dependency to get DB session
+async def get_db():
+    async with SessionLocal() as db:
+        yield db
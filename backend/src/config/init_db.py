@@ -1,24 +1,33 @@
+import asyncio
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
-from src.config.database import engine
+from src.config.database import engine, register_models
 from src.models.chat import Base as ChatBase
 from src.models.session import Base as SessionBase
+from src.models.search import create_search_index, drop_search_index
 
-def init_database():
+async def init_database():
+    # The rollup tables share the Base
+    register_models()
     try:
-        # Drop existing tables
-        ChatBase.metadata.drop_all(bind=engine)
-        SessionBase.metadata.drop_all(bind=engine)
-        
-        # Create tables with new schema
-        SessionBase.metadata.create_all(bind=engine)
-        ChatBase.metadata.create_all(bind=engine)
-        
+        async with engine.begin() as conn:
+            # Drop existing tables
+            await conn.run_sync(drop_search_index)
+            await conn.run_sync(ChatBase.metadata.drop_all)
+            await conn.run_sync(SessionBase.metadata.drop_all)
+
+            # Create tables with new schema
+            await conn.run_sync(SessionBase.metadata.create_all)
+            await conn.run_sync(ChatBase.metadata.create_all)
+            await conn.run_sync(create_search_index)
+
         print("Database tables recreated successfully!")
     except Exception as e:
         print(f"Error creating database tables: {e}")
+    finally:
+        await engine.dispose()
 
 if __name__ == "__main__":
-    init_database() 
\ No newline at end of file
+    asyncio.run(init_database()) 
\ No newline at end of file
@@ -1,21 +1,41 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from src.routes import chat
-from src.config.database import engine
-from src.models.chat import Base
-from src.models.session import Base as SessionBase
+from fastapi.responses import JSONResponse, PlainTextResponse
+from src.config import settings
+from src.routes import analytics, chat
+from src.config.database import engine, create_tables
+from src.utils.pagination import NEXT_CURSOR_HEADER
+from src.utils.analytics import activity_rollups
+from src.utils.llm_client import llm_client
+from src.utils.metrics import METRICS_CONTENT_TYPE, REGISTRY, MetricsMiddleware, instrument_engine
+from src.utils.session_cache import session_analytics
+from src.utils.summaries import summarizer
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
-SessionBase.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create database tables
+    await create_tables()
+    session_analytics.start()
+    activity_rollups.start()
+    await llm_client.start()
+    yield
+    await summarizer.stop()
+    await llm_client.close()
+    # Write buffered session counters and rollups before the pool goes away
+    await session_analytics.stop()
+    await activity_rollups.stop()
+    await engine.dispose()
 
-app = FastAPI(title="Hull Chat API")
+app = FastAPI(title="Hull Chat API", lifespan=lifespan)
+
+if settings.METRICS_ENABLED:
+    instrument_engine(engine)
 
 # Configure CORS
 app.add_middleware(
@@ -24,7 +44,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "Server-Timing"],
 )
+# Added last so it wraps CORS and error handling and times the whole request
+app.add_middleware(MetricsMiddleware, enabled=settings.METRICS_ENABLED)
 
 # Add error handling
 @app.exception_handler(Exception)
@@ -37,6 +60,11 @@ async def global_exception_handler(request: Request, exc: Exception):
 
 # Include routers
 app.include_router(chat.router, prefix="/api", tags=["chat"])
+app.include_router(analytics.router, prefix="/api", tags=["analytics"])
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
 
 @app.get("/")
 async def root():
@@ -0,0 +1,35 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from src.config.database import Base
+
+# Rollup granularities; a bucket is the UTC start of its hour or day
+HOUR = "hour"
+DAY = "day"
+GRANULARITIES = (HOUR, DAY)
+
+class ActivityRollup(Base):
+    """Activity counts per hour and per day, kept up to date as sessions and messages are written"""
+    __tablename__ = "activity_rollups"
+
+    granularity = Column(String, primary_key=True)  # 'hour' or 'day'
+    bucket = Column(DateTime, primary_key=True)
+    sessions_started = Column(Integer, nullable=False, default=0)
+    active_sessions = Column(Integer, nullable=False, default=0)  # distinct sessions that started or sent messages
+    user_messages = Column(Integer, nullable=False, default=0)
+    bot_messages = Column(Integer, nullable=False, default=0)
+    devices = Column(Integer, nullable=False, default=0)  # distinct device_info of the active sessions
+
+class ActivityRollupMember(Base):
+    """The sessions and devices already counted in a bucket
+
+    Distinct counts cannot be added up, so each (bucket, session) and
+    (bucket, device) pair is inserted once and only new pairs bump
+    `active_sessions` and `devices`. Rows are only needed while their
+    bucket can still change and are pruned after
+    ANALYTICS_MEMBER_RETENTION_DAYS.
+    """
+    __tablename__ = "activity_rollup_members"
+
+    granularity = Column(String, primary_key=True)
+    bucket = Column(DateTime, primary_key=True, index=True)  # for pruning by age
+    kind = Column(String, primary_key=True)  # 'session' or 'device'
+    key = Column(String, primary_key=True)  # session id or device fingerprint
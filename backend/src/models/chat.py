@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from src.config.database import Base
@@ -10,9 +10,19 @@ class Conversation(Base):
     session_id = Column(Integer, ForeignKey("sessions.id"))  # Link to session
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Rolling summary of the older turns, written in the background (see
+    # utils.summaries); messages up to and including (timestamp, id) of the
+    # marker are folded into it and no longer sent as history
+    summary = Column(Text, nullable=True)
+    summary_until_timestamp = Column(DateTime, nullable=True)
+    summary_until_id = Column(Integer, nullable=True)
     
     # Relationships
-    messages = relationship("Message", back_populates="conversation")
+    messages = relationship(
+        "Message",
+        back_populates="conversation",
+        order_by="(Message.timestamp, Message.id)",
+    )
     session = relationship("Session", back_populates="conversations")
 
 class Message(Base):
@@ -24,4 +34,9 @@ class Message(Base):
     is_user = Column(String, nullable=False)  # 'true' for user, 'false' for bot
     timestamp = Column(DateTime, default=datetime.utcnow)
     
-    conversation = relationship("Conversation", back_populates="messages") 
\ No newline at end of file
+    conversation = relationship("Conversation", back_populates="messages")
+
+    __table_args__ = (
+        # Serves both "messages of a conversation" and keyset pagination by time
+        Index("ix_messages_conversation_id_timestamp", "conversation_id", "timestamp"),
+    ) 
\ No newline at end of file
@@ -0,0 +1,58 @@
+"""Full-text index over message content
+
+Postgres uses a GIN index on to_tsvector(content); SQLite uses an FTS5
+table kept in sync with `messages` by triggers. Either way every write to
+`messages` (create_message, the chat exchange, bulk imports) updates the
+index in the same transaction, so there is no rebuild step.
+"""
+from sqlalchemy import literal_column
+
+# Postgres text search configuration; the query must use the same
+# expression as the index for the planner to pick it
+TEXT_SEARCH_CONFIG = "english"
+FTS_TABLE = "messages_fts"
+
+def pg_config():
+    return literal_column(f"'{TEXT_SEARCH_CONFIG}'::regconfig")
+
+_PG_INDEX = (
+    "CREATE INDEX IF NOT EXISTS ix_messages_content_fts ON messages "
+    f"USING GIN (to_tsvector('{TEXT_SEARCH_CONFIG}'::regconfig, content))"
+)
+
+# External-content FTS5 table: stores only the index, the text stays in
+# `messages`. The porter tokenizer stems English like the Postgres config.
+_SQLITE_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "content, content='messages', content_rowid='id', tokenize='porter unicode61')",
+    f"CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, content) VALUES (new.id, new.content); END",
+    f"CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) VALUES ('delete', old.id, old.content); END",
+    f"CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) VALUES ('delete', old.id, old.content); "
+    f"INSERT INTO {FTS_TABLE}(rowid, content) VALUES (new.id, new.content); END",
+]
+
+def create_search_index(conn):
+    """Create the index for the connection's dialect; existing rows are indexed once"""
+    dialect = conn.dialect.name
+    if dialect == "postgresql":
+        conn.exec_driver_sql(_PG_INDEX)
+    elif dialect == "sqlite":
+        exists = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+        ).first()
+        for statement in _SQLITE_DDL:
+            conn.exec_driver_sql(statement)
+        if not exists:
+            conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+def drop_search_index(conn):
+    dialect = conn.dialect.name
+    if dialect == "postgresql":
+        conn.exec_driver_sql("DROP INDEX IF EXISTS ix_messages_content_fts")
+    elif dialect == "sqlite":
+        for trigger in ("messages_fts_insert", "messages_fts_delete", "messages_fts_update"):
+            conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+        conn.exec_driver_sql(f"DROP TABLE IF EXISTS {FTS_TABLE}")
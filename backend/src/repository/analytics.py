@@ -0,0 +1,31 @@
+from datetime import datetime
+from typing import List
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.models.analytics import ActivityRollup
+
+async def get_rollups(db: AsyncSession, granularity: str, since: datetime, until: datetime, limit: int) -> List[dict]:
+    """Rollup rows with `since` <= bucket < `until`, oldest first
+
+    A range scan of the primary key: the cost depends on how many buckets
+    are asked for, not on how much activity they hold. Buckets without
+    activity have no row and are left out.
+    """
+    result = await db.execute(
+        select(
+            ActivityRollup.bucket,
+            ActivityRollup.sessions_started,
+            ActivityRollup.active_sessions,
+            ActivityRollup.user_messages,
+            ActivityRollup.bot_messages,
+            ActivityRollup.devices,
+        )
+        .where(
+            ActivityRollup.granularity == granularity,
+            ActivityRollup.bucket >= since,
+            ActivityRollup.bucket < until,
+        )
+        .order_by(ActivityRollup.bucket)
+        .limit(limit)
+    )
+    return [{**row._mapping, "messages": row.user_messages + row.bot_messages} for row in result]
@@ -0,0 +1,396 @@
+import re
+from collections import Counter
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Tuple
+from sqlalchemy import and_, column, func, insert, literal_column, or_, select, table, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from src.models.chat import Conversation, Message
+from src.models.search import FTS_TABLE, pg_config
+from src.schemas.chat import MessageCreate, MessageImport
+from src.utils.analytics import RollupBatch, record_activity
+from src.utils.session import update_session_analytics
+
+async def create_conversation(db: AsyncSession, session_id: int) -> Conversation:
+    # Start with an empty, already-loaded messages collection so the
+    # response can be built without a lazy load
+    conversation = Conversation(session_id=session_id, messages=[])
+    db.add(conversation)
+    await db.commit()
+    return conversation
+
+# Columns of a message in the order the Message schema serializes them, so
+# rows can be encoded as the API's JSON without building objects
+MESSAGE_COLUMNS = (Message.content, Message.is_user, Message.id, Message.conversation_id, Message.timestamp)
+_MESSAGE_KEYS = tuple(column.key for column in MESSAGE_COLUMNS)
+
+def _conversation_page(query, skip: int, limit: int, after_id: Optional[int]):
+    # `after_id` (keyset) takes precedence over `skip` (offset)
+    query = query.order_by(Conversation.id)
+    if after_id is not None:
+        query = query.where(Conversation.id > after_id)
+    elif skip:
+        query = query.offset(skip)
+    return query.limit(limit)
+
+def _message_page(query, conversation_id: int, skip: int, limit: int, after: Optional[Tuple[datetime, int]]):
+    query = query.where(Message.conversation_id == conversation_id).order_by(Message.timestamp, Message.id)
+    if after is not None:
+        query = query.where(tuple_(Message.timestamp, Message.id) > tuple_(*after))
+    elif skip:
+        query = query.offset(skip)
+    return query.limit(limit)
+
+async def get_conversations(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    after_id: Optional[int] = None,
+) -> List[Conversation]:
+    """Conversations ordered by id, with their messages in one extra query
+
+    `after_id` (keyset) takes precedence over `skip` (offset).
+    """
+    query = select(Conversation).options(selectinload(Conversation.messages))
+    result = await db.execute(_conversation_page(query, skip, limit, after_id))
+    return list(result.scalars().all())
+
+async def get_conversation_rows(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    after_id: Optional[int] = None,
+) -> List[dict]:
+    """Same page as get_conversations, as plain dicts shaped like the Conversation schema
+
+    Selects columns only, in two queries, with no ORM objects built.
+    """
+    query = select(Conversation.id, Conversation.created_at, Conversation.updated_at)
+    result = await db.execute(_conversation_page(query, skip, limit, after_id))
+    conversations = [
+        {"id": row[0], "created_at": row[1], "updated_at": row[2], "messages": []} for row in result
+    ]
+    if conversations:
+        by_id = {conversation["id"]: conversation["messages"] for conversation in conversations}
+        result = await db.execute(
+            select(*MESSAGE_COLUMNS)
+            .where(Message.conversation_id.in_(by_id))
+            .order_by(Message.conversation_id, Message.timestamp, Message.id)
+        )
+        for row in result:
+            by_id[row[3]].append(dict(zip(_MESSAGE_KEYS, row)))
+    return conversations
+
+async def get_conversation(db: AsyncSession, conversation_id: int) -> Optional[Conversation]:
+    result = await db.execute(
+        select(Conversation)
+        .options(selectinload(Conversation.messages))
+        .where(Conversation.id == conversation_id)
+    )
+    return result.scalar_one_or_none()
+
+async def conversation_exists(db: AsyncSession, conversation_id: int) -> bool:
+    result = await db.execute(select(Conversation.id).where(Conversation.id == conversation_id))
+    return result.scalar_one_or_none() is not None
+
+async def _touch_conversation(db: AsyncSession, conversation_id: int, session_id: Optional[int], messages: int, now: datetime):
+    await db.execute(update(Conversation).where(Conversation.id == conversation_id).values(updated_at=now))
+    if session_id is not None:
+        await update_session_analytics(db, session_id, messages=messages, interactions=messages)
+
+async def create_message(db: AsyncSession, message: MessageCreate, conversation_id: int) -> Optional[Message]:
+    """Store a message and bump conversation/session activity in one transaction
+
+    Returns None when the conversation does not exist.
+    """
+    result = await db.execute(
+        select(Conversation.session_id).where(Conversation.id == conversation_id)
+    )
+    row = result.one_or_none()
+    if row is None:
+        return None
+
+    now = datetime.utcnow()
+    db_message = Message(**message.model_dump(), conversation_id=conversation_id, timestamp=now)
+    db.add(db_message)
+    await _touch_conversation(db, conversation_id, row.session_id, 1, now)
+    await record_activity(db, RollupBatch().add_message(row.session_id, message.is_user, now))
+    await db.commit()
+    return db_message
+
+async def create_messages_bulk(db: AsyncSession, messages: List[MessageImport]) -> List[int]:
+    """Insert a batch of messages in one transaction with set-based statements
+
+    One SELECT finds the conversations, one multi-row INSERT stores the
+    messages, one UPDATE bumps the conversations' activity, session
+    analytics are counted once per session and the activity rollups once
+    per batch. Messages keep their own timestamps when given. Returns the
+    indexes of messages skipped because their conversation does not exist.
+    """
+    conversation_ids = {message.conversation_id for message in messages}
+    result = await db.execute(
+        select(Conversation.id, Conversation.session_id).where(Conversation.id.in_(conversation_ids))
+    )
+    sessions = {row.id: row.session_id for row in result}
+    skipped = [i for i, message in enumerate(messages) if message.conversation_id not in sessions]
+    rows = [message for message in messages if message.conversation_id in sessions]
+    if not rows:
+        return skipped
+
+    now = datetime.utcnow()
+    await db.execute(
+        insert(Message),
+        [
+            {
+                "conversation_id": message.conversation_id,
+                "content": message.content,
+                "is_user": message.is_user,
+                "timestamp": message.timestamp or now,
+            }
+            for message in rows
+        ],
+    )
+    touched = {message.conversation_id for message in rows}
+    await db.execute(update(Conversation).where(Conversation.id.in_(touched)).values(updated_at=now))
+    per_session = Counter(sessions[message.conversation_id] for message in rows)
+    for session_id, count in per_session.items():
+        if session_id is not None:
+            await update_session_analytics(db, session_id, messages=count, interactions=count)
+    rollups = RollupBatch()
+    for message in rows:
+        rollups.add_message(sessions[message.conversation_id], message.is_user, message.timestamp or now)
+    await record_activity(db, rollups)
+    await db.commit()
+    return skipped
+
+async def stream_export(
+    db: AsyncSession, since: Optional[datetime] = None, fetch_size: int = 1000
+) -> AsyncIterator[dict]:
+    """Every conversation followed by its messages, as plain records
+
+    A single ordered outer join read through a server-side cursor
+    (`yield_per`), so memory stays flat however much history there is.
+    Only columns are selected; no ORM objects are built. `since` limits
+    the export to conversations updated at or after that time.
+    """
+    query = (
+        select(
+            Conversation.id.label("conversation_id"),
+            Conversation.session_id,
+            Conversation.created_at,
+            Conversation.updated_at,
+            Message.id.label("message_id"),
+            Message.content,
+            Message.is_user,
+            Message.timestamp,
+        )
+        .outerjoin(Message, Message.conversation_id == Conversation.id)
+        .order_by(Conversation.id, Message.timestamp, Message.id)
+        .execution_options(yield_per=fetch_size)
+    )
+    if since is not None:
+        query = query.where(Conversation.updated_at >= since)
+    result = await db.stream(query)
+    current = None
+    async for row in result:
+        if row.conversation_id != current:
+            current = row.conversation_id
+            yield {
+                "type": "conversation",
+                "id": row.conversation_id,
+                "session_id": row.session_id,
+                "created_at": row.created_at,
+                "updated_at": row.updated_at,
+            }
+        if row.message_id is not None:
+            yield {
+                "type": "message",
+                "id": row.message_id,
+                "conversation_id": row.conversation_id,
+                "content": row.content,
+                "is_user": row.is_user,
+                "timestamp": row.timestamp,
+            }
+
+def _unsummarized():
+    """Join condition for the messages not yet folded into the conversation's summary"""
+    return and_(
+        Message.conversation_id == Conversation.id,
+        or_(
+            Conversation.summary_until_id.is_(None),
+            tuple_(Message.timestamp, Message.id)
+            > tuple_(Conversation.summary_until_timestamp, Conversation.summary_until_id),
+        ),
+    )
+
+async def get_chat_context(
+    db: AsyncSession, conversation_id: int, history_limit: int
+) -> Optional[Tuple[Optional[int], Optional[str], List[Message]]]:
+    """(session id, summary, most recent messages oldest first) in a single query
+
+    Messages already folded into the summary are left out. The outer join
+    yields one row even for a conversation without messages; None means
+    the conversation does not exist.
+    """
+    result = await db.execute(
+        select(Conversation.session_id, Conversation.summary, Message)
+        .outerjoin(Message, _unsummarized())
+        .where(Conversation.id == conversation_id)
+        .order_by(Message.timestamp.desc(), Message.id.desc())
+        .limit(max(history_limit, 1))
+    )
+    rows = result.all()
+    if not rows:
+        return None
+    history = [row.Message for row in rows if row.Message is not None][:history_limit]
+    return rows[0].session_id, rows[0].summary, history[::-1]
+
+async def get_unsummarized_messages(
+    db: AsyncSession, conversation_id: int
+) -> Optional[Tuple[Optional[str], Optional[int], List[Message]]]:
+    """(summary, summary_until_id, every message after it oldest first)"""
+    result = await db.execute(
+        select(Conversation.summary, Conversation.summary_until_id, Message)
+        .outerjoin(Message, _unsummarized())
+        .where(Conversation.id == conversation_id)
+        .order_by(Message.timestamp, Message.id)
+    )
+    rows = result.all()
+    if not rows:
+        return None
+    return rows[0].summary, rows[0].summary_until_id, [row.Message for row in rows if row.Message is not None]
+
+async def store_summary(
+    db: AsyncSession, conversation_id: int, previous_until_id: Optional[int], summary: str, last_folded: Message
+) -> bool:
+    """Replace the summary if nobody else has since; False when they have
+
+    The check on the previous marker keeps two overlapping summary runs
+    from overwriting each other's work.
+    """
+    current = (
+        Conversation.summary_until_id.is_(None)
+        if previous_until_id is None
+        else Conversation.summary_until_id == previous_until_id
+    )
+    result = await db.execute(
+        update(Conversation)
+        .where(Conversation.id == conversation_id, current)
+        .values(
+            summary=summary,
+            summary_until_timestamp=last_folded.timestamp,
+            summary_until_id=last_folded.id,
+            updated_at=Conversation.updated_at,
+        )
+    )
+    await db.commit()
+    return result.rowcount == 1
+
+async def create_exchange(
+    db: AsyncSession,
+    conversation_id: int,
+    session_id: Optional[int],
+    prompt: str,
+    prompt_time: datetime,
+    response: str,
+) -> Tuple[Message, Message]:
+    """Store a question and its answer together in one transaction"""
+    now = datetime.utcnow()
+    user_message = Message(conversation_id=conversation_id, content=prompt, is_user="true", timestamp=prompt_time)
+    bot_message = Message(conversation_id=conversation_id, content=response, is_user="false", timestamp=now)
+    db.add_all([user_message, bot_message])
+    await _touch_conversation(db, conversation_id, session_id, 2, now)
+    rollups = RollupBatch().add_message(session_id, "true", prompt_time).add_message(session_id, "false", now)
+    await record_activity(db, rollups)
+    await db.commit()
+    return user_message, bot_message
+
+async def get_messages(
+    db: AsyncSession,
+    conversation_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[Tuple[datetime, int]] = None,
+) -> List[Message]:
+    """Messages in (timestamp, id) order
+
+    `after` is the (timestamp, id) of the last message already seen; it
+    takes precedence over `skip` and stays fast however deep the page is.
+    """
+    result = await db.execute(_message_page(select(Message), conversation_id, skip, limit, after))
+    return list(result.scalars().all())
+
+async def get_message_rows(
+    db: AsyncSession,
+    conversation_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[Tuple[datetime, int]] = None,
+) -> List[dict]:
+    """Same page as get_messages, as plain dicts shaped like the Message schema"""
+    result = await db.execute(_message_page(select(*MESSAGE_COLUMNS), conversation_id, skip, limit, after))
+    return [dict(zip(_MESSAGE_KEYS, row)) for row in result]
+
+def search_terms(text: str) -> List[str]:
+    """Words of a search query; operators and punctuation are ignored"""
+    return re.findall(r"\w+", text)
+
+async def search_messages(
+    db: AsyncSession,
+    terms: List[str],
+    session_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    offset: int = 0,
+    limit: int = 20,
+) -> List[dict]:
+    """Messages containing every term (stemmed), most relevant first
+
+    Uses the full-text index (see models.search). Each hit has the Message
+    fields plus the conversation's session_id, a rank and a snippet.
+    """
+    columns = [
+        Message.id,
+        Message.conversation_id,
+        Message.content,
+        Message.is_user,
+        Message.timestamp,
+        Conversation.session_id,
+    ]
+    if db.get_bind().dialect.name == "postgresql":
+        document = func.to_tsvector(pg_config(), Message.content)
+        query_vector = func.plainto_tsquery(pg_config(), " ".join(terms))
+        rank = func.ts_rank_cd(document, query_vector).label("rank")
+        snippet = func.ts_headline(
+            pg_config(), Message.content, query_vector, "StartSel=[, StopSel=], MaxWords=24, MinWords=8"
+        )
+        query = (
+            select(*columns, rank, snippet.label("snippet"))
+            .select_from(Message)
+            .where(document.op("@@")(query_vector))
+            .order_by(rank.desc(), Message.id.desc())
+        )
+    else:
+        fts = table(FTS_TABLE, column("rowid"))
+        fts_column = literal_column(FTS_TABLE)
+        # bm25() is lower for better matches
+        rank = (-func.bm25(fts_column)).label("rank")
+        snippet = func.snippet(fts_column, 0, "[", "]", "…", 16)
+        match = " ".join('"' + term + '"' for term in terms)
+        query = (
+            select(*columns, rank, snippet.label("snippet"))
+            .select_from(fts)
+            .join(Message, Message.id == fts.c.rowid)
+            .where(fts_column.op("MATCH")(match))
+            .order_by(rank.desc(), Message.id.desc())
+        )
+    query = query.join(Conversation, Conversation.id == Message.conversation_id)
+    if session_id is not None:
+        query = query.where(Conversation.session_id == session_id)
+    if since is not None:
+        query = query.where(Message.timestamp >= since)
+    if until is not None:
+        query = query.where(Message.timestamp < until)
+    result = await db.execute(query.offset(offset).limit(limit))
+    return [row._asdict() for row in result]
+
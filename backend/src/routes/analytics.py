@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from src.config import settings
+from src.config.database import get_db
+from src.models.analytics import DAY, HOUR
+from src.repository import analytics as analytics_repository
+from src.schemas.analytics import ActivityBucket
+from src.utils.analytics import bucket_start, to_utc_naive
+
+router = APIRouter()
+
+BUCKET_LENGTH = {HOUR: timedelta(hours=1), DAY: timedelta(days=1)}
+
+async def _activity(
+    db: AsyncSession, granularity: str, since: Optional[datetime], until: Optional[datetime], default_buckets: int
+) -> List[dict]:
+    length = BUCKET_LENGTH[granularity]
+    until = to_utc_naive(until) if until is not None else datetime.utcnow()
+    since = bucket_start(granularity, since if since is not None else until - default_buckets * length)
+    if (until - since) / length > settings.ANALYTICS_MAX_BUCKETS:
+        raise HTTPException(
+            status_code=400, detail=f"Range covers more than {settings.ANALYTICS_MAX_BUCKETS} {granularity}s"
+        )
+    return await analytics_repository.get_rollups(db, granularity, since, until, settings.ANALYTICS_MAX_BUCKETS)
+
+@router.get("/analytics/hourly", response_model=List[ActivityBucket])
+async def hourly_activity(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Activity per hour, oldest first; the last 24 hours by default
+
+    `since` is rounded down to its hour and `until` is exclusive. Hours
+    without activity are left out. Counts lag by up to
+    ANALYTICS_FLUSH_INTERVAL seconds.
+    """
+    return await _activity(db, HOUR, since, until, 24)
+
+@router.get("/analytics/daily", response_model=List[ActivityBucket])
+async def daily_activity(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Activity per day (UTC), oldest first; the last 30 days by default
+
+    `since` is rounded down to its day and `until` is exclusive, so
+    `?since=<today>` gives today's counts.
+    """
+    return await _activity(db, DAY, since, until, 30)
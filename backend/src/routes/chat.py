@@ -1,22 +1,54 @@
+from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, Request, Response
-from sqlalchemy.orm import Session
-from typing import List
-from src.config.database import get_db
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from src.config.database import SessionLocal, get_db
 from src.repository import chat as chat_repository
-from src.schemas.chat import Conversation, Message, MessageCreate, ConversationCreate
-from src.utils.session import create_or_get_session, update_session_analytics
+from src.config import settings
+from src.schemas.chat import (
+    ChatRequest,
+    ChatResponse,
+    Conversation,
+    ImportLineError,
+    ImportResult,
+    Message,
+    MessageCreate,
+    MessageImport,
+    MessageSearchHit,
+)
+from src.utils.llm_client import LLMServiceError, history_payload, llm_client
+from src.utils.json_response import FastJSONResponse
+from src.utils.metrics import span
+from src.utils.ndjson import NDJSON_MEDIA_TYPE, dumps_line, iter_lines
+from src.utils.pagination import (
+    NEXT_CURSOR_HEADER,
+    InvalidCursor,
+    decode_id_cursor,
+    decode_timestamp_cursor,
+    encode_cursor,
+)
+from src.utils.session import create_or_get_session
+from src.utils.summaries import summarizer
 
 router = APIRouter()
 
+# Line errors listed in an import response; the rest are only counted
+MAX_IMPORT_ERRORS = 100
+
+# Export lines are sent in chunks of about this many bytes
+EXPORT_CHUNK_BYTES = 64 * 1024
+
 @router.post("/conversations/", response_model=Conversation)
-def create_conversation(
+async def create_conversation(
     request: Request,
     response: Response,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     # Get or create session using cookie
     cookie_id = request.cookies.get("session_id")
-    session = create_or_get_session(db, request, cookie_id)
+    session = await create_or_get_session(db, request, cookie_id)
     
     # Set cookie if it's a new session
     if not cookie_id:
@@ -29,45 +61,199 @@ def create_conversation(
         )
     
     # Create conversation linked to session
-    return chat_repository.create_conversation(db, session.id)
+    return await chat_repository.create_conversation(db, session.id)
 
 @router.get("/conversations/", response_model=List[Conversation])
-def read_conversations(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    conversations = chat_repository.get_conversations(db, skip=skip, limit=limit)
-    return conversations
+async def read_conversations(
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    # Pass the X-Next-Cursor header of one page as `cursor` to get the next
+    try:
+        after_id = decode_id_cursor(cursor)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # Rows are encoded directly; response_model only documents the shape
+    conversations = await chat_repository.get_conversation_rows(db, skip=skip, limit=limit, after_id=after_id)
+    headers = {}
+    if conversations and len(conversations) == limit:
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(conversations[-1]["id"])
+    return FastJSONResponse(conversations, headers=headers)
 
 @router.get("/conversations/{conversation_id}", response_model=Conversation)
-def read_conversation(conversation_id: int, db: Session = Depends(get_db)):
-    conversation = chat_repository.get_conversation(db, conversation_id)
+async def read_conversation(conversation_id: int, db: AsyncSession = Depends(get_db)):
+    conversation = await chat_repository.get_conversation(db, conversation_id)
     if conversation is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
     return conversation
 
 @router.post("/conversations/{conversation_id}/messages/", response_model=Message)
-def create_message(
+async def create_message(
     conversation_id: int,
     message: MessageCreate,
-    request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    conversation = chat_repository.get_conversation(db, conversation_id)
-    if conversation is None:
+    # Message, conversation activity and session analytics in one transaction
+    db_message = await chat_repository.create_message(db, message, conversation_id)
+    if db_message is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
-    
-    # Update session analytics
-    if conversation.session:
-        update_session_analytics(db, conversation.session)
-    
-    return chat_repository.create_message(db, message, conversation_id)
+    return db_message
 
 @router.get("/conversations/{conversation_id}/messages/", response_model=List[Message])
-def read_messages(
+async def read_messages(
     conversation_id: int,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
 ):
-    conversation = chat_repository.get_conversation(db, conversation_id)
-    if conversation is None:
+    try:
+        after = decode_timestamp_cursor(cursor)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not await chat_repository.conversation_exists(db, conversation_id):
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    messages = await chat_repository.get_message_rows(db, conversation_id, skip=skip, limit=limit, after=after)
+    headers = {}
+    if messages and len(messages) == limit:
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(messages[-1]["timestamp"], messages[-1]["id"])
+    return FastJSONResponse(messages, headers=headers)
+
+@router.post("/conversations/{conversation_id}/chat", response_model=ChatResponse)
+async def chat(
+    conversation_id: int,
+    chat_request: ChatRequest,
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    prompt_time = datetime.utcnow()
+    context = await chat_repository.get_chat_context(db, conversation_id, settings.CHAT_HISTORY_MESSAGES)
+    if context is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
-    return chat_repository.get_messages(db, conversation_id, skip=skip, limit=limit) 
\ No newline at end of file
+    session_id, summary, history = context
+    # End the read transaction so no pooled connection is held while the
+    # model generates
+    await db.commit()
+
+    try:
+        with span("llm"):
+            reply = await llm_client.chat(
+                chat_request.prompt, history_payload(history), summary, request.cookies.get("session_id")
+            )
+    except LLMServiceError as exc:
+        if exc.retry_after is not None:
+            # The service is shedding load; tell the client when to come back
+            raise HTTPException(status_code=exc.status, detail=str(exc), headers={"Retry-After": exc.retry_after})
+        raise HTTPException(status_code=504 if exc.timeout else 502, detail=str(exc))
+
+    user_message, assistant_message = await chat_repository.create_exchange(
+        db, conversation_id, session_id, chat_request.prompt, prompt_time, reply.response
+    )
+    # Long conversations get their older turns summarised in the background
+    summarizer.maybe_schedule(
+        conversation_id, summary, [m.content for m in history] + [chat_request.prompt, reply.response]
+    )
+    return ChatResponse(
+        user_message=Message.model_validate(user_message),
+        assistant_message=Message.model_validate(assistant_message),
+        source_documents=reply.source_documents,
+    )
+
+@router.get("/search/messages", response_model=List[MessageSearchHit])
+async def search_messages(
+    q: str,
+    response: Response,
+    session_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = settings.SEARCH_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Full-text search over message content, best matches first
+
+    Every word of `q` must match (after stemming). Filter by the
+    conversation's `session_id` and by message time (`since` inclusive,
+    `until` exclusive); page with the X-Next-Cursor header.
+    """
+    terms = chat_repository.search_terms(q)
+    if not terms:
+        raise HTTPException(status_code=400, detail="Search query has no words")
+    try:
+        offset = decode_id_cursor(cursor) or 0
+        if offset < 0:
+            raise InvalidCursor(cursor)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    limit = max(1, min(limit, settings.SEARCH_MAX_PAGE_SIZE))
+    hits = await chat_repository.search_messages(
+        db, terms, session_id=session_id, since=since, until=until, offset=offset, limit=limit
+    )
+    if len(hits) == limit:
+        # Ranked results have no stable sort key, so the cursor is an offset
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(offset + limit)
+    return hits
+
+@router.post("/import/messages", response_model=ImportResult)
+async def import_messages(request: Request, db: AsyncSession = Depends(get_db)):
+    """Bulk insert from an NDJSON body, one message per line
+
+    Lines are read as they arrive and inserted BULK_IMPORT_BATCH_SIZE at a
+    time, each batch in its own transaction. Invalid lines and messages
+    for unknown conversations are skipped and reported by line number.
+    """
+    result = ImportResult(inserted=0, skipped=0)
+
+    def skip(line_number: int, detail: str):
+        result.skipped += 1
+        if len(result.errors) < MAX_IMPORT_ERRORS:
+            result.errors.append(ImportLineError(line=line_number, detail=detail))
+
+    batch: List[MessageImport] = []
+    line_numbers: List[int] = []
+
+    async def flush():
+        skipped = await chat_repository.create_messages_bulk(db, batch)
+        for i in skipped:
+            skip(line_numbers[i], "Conversation not found")
+        result.inserted += len(batch) - len(skipped)
+        batch.clear()
+        line_numbers.clear()
+
+    async for line_number, line in iter_lines(request.stream()):
+        try:
+            batch.append(MessageImport.model_validate_json(line))
+        except ValidationError as exc:
+            skip(line_number, exc.errors()[0]["msg"])
+            continue
+        line_numbers.append(line_number)
+        if len(batch) >= settings.BULK_IMPORT_BATCH_SIZE:
+            await flush()
+    if batch:
+        await flush()
+    return result
+
+@router.get("/export/conversations")
+async def export_conversations(since: Optional[datetime] = None):
+    """Stream every conversation and its messages as NDJSON
+
+    Each conversation line ({"type": "conversation", ...}) is followed by
+    its message lines ({"type": "message", ...}, the fields of Message).
+    Message lines can be posted back to /import/messages.
+    """
+    async def lines():
+        # Its own session: the response body is produced after the
+        # request's dependencies have been cleaned up
+        async with SessionLocal() as db:
+            chunk = bytearray()
+            async for record in chat_repository.stream_export(db, since, settings.EXPORT_FETCH_SIZE):
+                chunk += dumps_line(record)
+                if len(chunk) >= EXPORT_CHUNK_BYTES:
+                    yield bytes(chunk)
+                    chunk.clear()
+            if chunk:
+                yield bytes(chunk)
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
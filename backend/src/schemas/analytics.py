@@ -0,0 +1,11 @@
+from pydantic import BaseModel
+from datetime import datetime
+
+class ActivityBucket(BaseModel):
+    bucket: datetime  # UTC start of the hour or day
+    sessions_started: int
+    active_sessions: int  # distinct sessions that started or sent messages
+    messages: int
+    user_messages: int
+    bot_messages: int
+    devices: int  # distinct device_info of the active sessions
@@ -30,4 +30,30 @@ class Conversation(ConversationBase):
     messages: List[Message] = []
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True 
+class MessageSearchHit(Message):
+    session_id: Optional[int] = None
+    rank: float  # higher is more relevant
+    snippet: str  # matching terms wrapped in [ ]
+
+class MessageImport(MessageBase):
+    """One NDJSON line of a bulk import; exported message lines are accepted as-is"""
+    conversation_id: int
+    timestamp: Optional[datetime] = None
+
+class ImportLineError(BaseModel):
+    line: int
+    detail: str
+
+class ImportResult(BaseModel):
+    inserted: int
+    skipped: int
+    errors: List[ImportLineError] = []
+
+class ChatRequest(BaseModel):
+    prompt: str
+
+class ChatResponse(BaseModel):
+    user_message: Message
+    assistant_message: Message
+    source_documents: List[str] = []
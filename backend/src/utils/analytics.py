@@ -0,0 +1,373 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Set, Tuple
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from src.config import settings
+from src.config.database import SessionLocal
+from src.models.analytics import DAY, GRANULARITIES, ActivityRollup, ActivityRollupMember
+from src.models.chat import Conversation, Message
+from src.models.session import Session
+
+logger = logging.getLogger(__name__)
+
+# Member kinds behind the distinct counts
+SESSION = "session"
+DEVICE = "device"
+
+COUNT_COLUMNS = ("sessions_started", "active_sessions", "user_messages", "bot_messages", "devices")
+
+def to_utc_naive(timestamp: datetime) -> datetime:
+    """Timestamps are stored as naive UTC"""
+    if timestamp.tzinfo is not None:
+        return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+def bucket_start(granularity: str, timestamp: datetime) -> datetime:
+    timestamp = to_utc_naive(timestamp).replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0) if granularity == DAY else timestamp
+
+def device_key(device_info) -> Optional[str]:
+    """Short, stable fingerprint of a session's device_info"""
+    if not device_info:
+        return None
+    return hashlib.sha1(json.dumps(device_info, sort_keys=True).encode()).hexdigest()[:16]
+
+@dataclass
+class PendingBucket:
+    sessions_started: int = 0
+    user_messages: int = 0
+    bot_messages: int = 0
+    sessions: Set[int] = field(default_factory=set)
+
+    def merge(self, other: "PendingBucket"):
+        self.sessions_started += other.sessions_started
+        self.user_messages += other.user_messages
+        self.bot_messages += other.bot_messages
+        self.sessions |= other.sessions
+
+class RollupBatch:
+    """Activity not yet in the rollups, split into its hour and day buckets"""
+
+    def __init__(self):
+        self.buckets: Dict[Tuple[str, datetime], PendingBucket] = {}
+        # session id -> device fingerprint, where the caller already knows it
+        self.devices: Dict[int, Optional[str]] = {}
+        self.messages = 0
+
+    def __bool__(self) -> bool:
+        return bool(self.buckets)
+
+    def _buckets(self, timestamp: datetime):
+        for granularity in GRANULARITIES:
+            yield self.buckets.setdefault((granularity, bucket_start(granularity, timestamp)), PendingBucket())
+
+    def add_session(self, session_id: int, started_at: datetime, device_info=None) -> "RollupBatch":
+        for bucket in self._buckets(started_at):
+            bucket.sessions_started += 1
+            bucket.sessions.add(session_id)
+        self.devices[session_id] = device_key(device_info)
+        return self
+
+    def add_message(self, session_id: Optional[int], is_user: str, timestamp: datetime) -> "RollupBatch":
+        for bucket in self._buckets(timestamp):
+            if is_user == "true":
+                bucket.user_messages += 1
+            else:
+                bucket.bot_messages += 1
+            if session_id is not None:
+                bucket.sessions.add(session_id)
+        self.messages += 1
+        return self
+
+    def merge(self, other: "RollupBatch"):
+        for key, bucket in other.buckets.items():
+            self.buckets.setdefault(key, PendingBucket()).merge(bucket)
+        self.devices.update(other.devices)
+        self.messages += other.messages
+
+def _insert(conn):
+    # Upserts are spelled per dialect; search already limits us to these two
+    return postgresql.insert if conn.dialect.name == "postgresql" else sqlite.insert
+
+async def write_rollups(conn, batch: RollupBatch) -> int:
+    """Add a batch to the rollup tables in the connection's transaction
+
+    Three statements however big the batch: device_info of the sessions
+    not already known, one INSERT of (bucket, session/device) members that
+    skips pairs already counted and returns the new ones, and one upsert
+    that adds the counts to each bucket. Rows are sorted so concurrent
+    writers lock buckets in the same order. Returns the buckets touched.
+    """
+    if not batch:
+        return 0
+    devices = dict(batch.devices)
+    unknown = {s for bucket in batch.buckets.values() for s in bucket.sessions} - devices.keys()
+    if unknown:
+        result = await conn.execute(select(Session.id, Session.device_info).where(Session.id.in_(unknown)))
+        devices.update({row.id: device_key(row.device_info) for row in result})
+
+    keys = sorted(batch.buckets)
+    members = set()
+    for granularity, bucket in keys:
+        for session_id in batch.buckets[granularity, bucket].sessions:
+            members.add((granularity, bucket, SESSION, str(session_id)))
+            if devices.get(session_id):
+                members.add((granularity, bucket, DEVICE, devices[session_id]))
+    added = Counter()
+    if members:
+        table = ActivityRollupMember.__table__
+        statement = (
+            _insert(conn)(table)
+            .on_conflict_do_nothing()
+            .returning(table.c.granularity, table.c.bucket, table.c.kind)
+        )
+        result = await conn.execute(
+            statement,
+            [{"granularity": g, "bucket": b, "kind": kind, "key": key} for g, b, kind, key in sorted(members)],
+        )
+        added = Counter((row.granularity, row.bucket, row.kind) for row in result)
+
+    table = ActivityRollup.__table__
+    statement = _insert(conn)(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.granularity, table.c.bucket],
+        set_={name: table.c[name] + statement.excluded[name] for name in COUNT_COLUMNS},
+    )
+    await conn.execute(statement, [
+        {
+            "granularity": granularity,
+            "bucket": bucket,
+            "sessions_started": batch.buckets[granularity, bucket].sessions_started,
+            "active_sessions": added[granularity, bucket, SESSION],
+            "user_messages": batch.buckets[granularity, bucket].user_messages,
+            "bot_messages": batch.buckets[granularity, bucket].bot_messages,
+            "devices": added[granularity, bucket, DEVICE],
+        }
+        for granularity, bucket in keys
+    ])
+    return len(keys)
+
+async def prune_members(conn, before: datetime) -> int:
+    """Delete the member rows of buckets starting before `before`; returns the rows deleted"""
+    table = ActivityRollupMember.__table__
+    result = await conn.execute(delete(table).where(table.c.bucket < before))
+    return result.rowcount
+
+class ActivityRollupBuffer:
+    """Accumulates rollup counts in memory and writes them in batches
+
+    Works like SessionAnalyticsBuffer: counts are flushed every
+    `flush_interval` seconds, as soon as `max_pending` messages are
+    waiting, and on shutdown. Activity is merged per bucket first, so a
+    thousand messages in the same hour update two rollup rows.
+    `max_pending=0` disables buffering and callers write the counts in
+    their own transaction.
+
+    Every `prune_interval` seconds the member rows of days older than
+    `member_retention_days` are deleted. Activity that arrives later for
+    those days (e.g. imported history) may count its sessions and devices
+    again; backfill_rollups rebuilds the exact figures.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        flush_interval: float = 5.0,
+        max_pending: int = 1000,
+        enabled: bool = True,
+        member_retention_days: float = 2.0,
+        prune_interval: float = 3600.0,
+    ):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.enabled = enabled
+        self.member_retention_days = member_retention_days
+        self.prune_interval = prune_interval
+        self.flushes = 0
+        self.buckets_flushed = 0
+        self.flush_errors = 0
+        self.members_pruned = 0
+        self._next_prune = 0.0
+        self._pending = RollupBatch()
+        self._flush_requested = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def write_through(self) -> bool:
+        return self.max_pending <= 0
+
+    @property
+    def pending_messages(self) -> int:
+        return self._pending.messages
+
+    def add(self, batch: RollupBatch):
+        self._pending.merge(batch)
+        if self._pending.messages >= self.max_pending:
+            self._flush_requested.set()
+
+    async def flush(self) -> int:
+        """Write all pending counts; returns the number of buckets updated"""
+        async with self._flush_lock:
+            pending, self._pending = self._pending, RollupBatch()
+            if not pending:
+                return 0
+            try:
+                async with self.session_factory() as db:
+                    conn = await db.connection()
+                    buckets = await write_rollups(conn, pending)
+                    await db.commit()
+            except Exception:
+                # Put the counts back so the next flush retries them
+                self.flush_errors += 1
+                pending.merge(self._pending)
+                self._pending = pending
+                raise
+            self.flushes += 1
+            self.buckets_flushed += buckets
+            return buckets
+
+    async def prune(self, now: Optional[datetime] = None) -> int:
+        """Delete member rows of days older than `member_retention_days`; returns the rows deleted"""
+        if self.member_retention_days <= 0:
+            return 0
+        # Whole days only, so a day bucket is never pruned while it is current
+        cutoff = bucket_start(DAY, (now or datetime.utcnow()) - timedelta(days=self.member_retention_days))
+        async with self.session_factory() as db:
+            pruned = await prune_members(await db.connection(), cutoff)
+            await db.commit()
+        self.members_pruned += pruned
+        return pruned
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Activity rollup flush failed; will retry")
+            if time.monotonic() >= self._next_prune:
+                self._next_prune = time.monotonic() + self.prune_interval
+                try:
+                    await self.prune()
+                except Exception:
+                    logger.exception("Activity rollup member pruning failed")
+
+    def start(self):
+        """Start the periodic flush on the running event loop"""
+        if self._task is not None:
+            return
+        self._flush_requested = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        # Write-through mode has nothing to flush but still prunes
+        if self.enabled:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the periodic flush and write whatever is still pending"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def snapshot(self) -> dict:
+        return {
+            "pending_buckets": len(self._pending.buckets),
+            "pending_messages": self._pending.messages,
+            "flushes": self.flushes,
+            "buckets_flushed": self.buckets_flushed,
+            "flush_errors": self.flush_errors,
+            "members_pruned": self.members_pruned,
+        }
+
+activity_rollups = ActivityRollupBuffer(
+    SessionLocal,
+    flush_interval=settings.ANALYTICS_FLUSH_INTERVAL,
+    max_pending=settings.ANALYTICS_MAX_PENDING,
+    enabled=settings.ANALYTICS_ROLLUPS_ENABLED,
+    member_retention_days=settings.ANALYTICS_MEMBER_RETENTION_DAYS,
+)
+
+async def record_activity(db, batch: RollupBatch):
+    """Count activity in the hourly and daily rollups
+
+    Buffered and written in batches (see ActivityRollupBuffer). With
+    buffering disabled it is written in the caller's transaction, which
+    the caller commits.
+    """
+    if not activity_rollups.enabled or not batch:
+        return
+    if activity_rollups.write_through:
+        await write_rollups(await db.connection(), batch)
+        return
+    activity_rollups.add(batch)
+
+async def backfill_rollups(session_factory, until: Optional[datetime] = None, batch_size: int = 10000) -> dict:
+    """Rebuild the rollups from the sessions and messages tables
+
+    Buckets before `until` (everything when None) are cleared, then
+    sessions and messages are read in id order, `batch_size` rows at a
+    time, and replayed through write_rollups, so the result is the same as
+    if every row had been counted as it was written. `until` should be a
+    day boundary. All of it is one transaction: readers see the old
+    rollups until it commits.
+
+    Activity buffered by a running API is counted again when it flushes,
+    so run it with the API stopped, or with `until` no later than the day
+    the rollups were switched on.
+    """
+    rollups, members = ActivityRollup.__table__, ActivityRollupMember.__table__
+    totals = {"sessions": 0, "messages": 0}
+    async with session_factory() as db:
+        conn = await db.connection()
+        for table in (rollups, members):
+            statement = delete(table)
+            if until is not None:
+                statement = statement.where(table.c.bucket < until)
+            await conn.execute(statement)
+
+        queries = {
+            "sessions": select(Session.id, Session.started_at, Session.device_info)
+            .where(Session.started_at.is_not(None)),
+            "messages": select(Message.id, Message.timestamp, Message.is_user, Conversation.session_id)
+            .outerjoin(Conversation, Conversation.id == Message.conversation_id)
+            .where(Message.timestamp.is_not(None)),
+        }
+        for name, query in queries.items():
+            id_column, time_column = query.selected_columns[0], query.selected_columns[1]
+            if until is not None:
+                query = query.where(time_column < until)
+            last_id = 0
+            while True:
+                # Keyset pages rather than a cursor, so writes can share the connection
+                rows = (await conn.execute(query.where(id_column > last_id).order_by(id_column).limit(batch_size))).all()
+                if not rows:
+                    break
+                batch = RollupBatch()
+                for row in rows:
+                    if name == "sessions":
+                        batch.add_session(row.id, row.started_at, row.device_info)
+                    else:
+                        batch.add_message(row.session_id, row.is_user, row.timestamp)
+                await write_rollups(conn, batch)
+                totals[name] += len(rows)
+                last_id = rows[-1].id
+        await db.commit()
+        totals["buckets"] = (await db.execute(select(func.count()).select_from(rollups))).scalar_one()
+    return totals
@@ -0,0 +1,33 @@
+import json
+from datetime import datetime
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:  # the standard library produces the same bytes, only slower
+    orjson = None
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def dumps(content) -> bytes:
+    """Compact UTF-8 JSON, matching what FastAPI sends for the same data
+
+    Naive datetimes are written in ISO 8601 like Pydantic writes them.
+    """
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(Response):
+    """JSON response for plain rows (dicts, lists, datetimes) that skips Pydantic
+
+    Used by list endpoints that select columns rather than ORM objects;
+    the route's `response_model` still documents the shape.
+    """
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -0,0 +1,181 @@
+import asyncio
+import hashlib
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import httpx
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Upstream statuses worth another attempt (Modal returns these while scaling)
+RETRY_STATUSES = (502, 503, 504)
+# Failures before the request reached the model, so retrying is safe
+RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError)
+# Statuses the service sheds load with; with a Retry-After header they are
+# passed on to the client instead of retried
+OVERLOADED_STATUSES = (429, 503)
+# Cookie the LLM service uses to share its queue fairly between sessions
+SESSION_COOKIE = "session_id"
+
+class LLMServiceError(Exception):
+    def __init__(self, message: str, timeout: bool = False, status: Optional[int] = None, retry_after: Optional[str] = None):
+        super().__init__(message)
+        self.timeout = timeout
+        self.status = status
+        self.retry_after = retry_after
+
+def history_payload(messages) -> List[dict]:
+    """Stored messages in the shape the LLM service expects"""
+    return [
+        {"content": m.content, "is_user": m.is_user == "true", "timestamp": m.timestamp.isoformat()}
+        for m in messages
+    ]
+
+@dataclass
+class LLMReply:
+    response: str
+    source_documents: List[str] = field(default_factory=list)
+
+class LLMClient:
+    """Calls the LLM service's chat endpoint over a shared keep-alive client
+
+    Identical requests (same prompt and history) that arrive while one is
+    already in flight wait for that call instead of making their own.
+    Conversation summaries go to the service's separate `summary_url`.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        timeout: float = 60.0,
+        connect_timeout: float = 5.0,
+        max_retries: int = 2,
+        max_connections: int = 20,
+        retry_backoff: float = 0.2,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        summary_url: Optional[str] = None,
+    ):
+        self.url = url
+        self.summary_url = summary_url
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.max_connections = max_connections
+        self.retry_backoff = retry_backoff
+        self.transport = transport
+        self.upstream_calls = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.rejected = 0
+        self._client: Optional[httpx.AsyncClient] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                transport=self.transport,
+            )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @staticmethod
+    def _key(payload: dict) -> str:
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+    async def chat(
+        self,
+        prompt: str,
+        history: Optional[List[dict]] = None,
+        summary: Optional[str] = None,
+        session_id: Optional[str] = None,
+    ) -> LLMReply:
+        payload = {"prompt": prompt, "history": history or []}
+        if summary:
+            payload["summary"] = summary
+        key = self._key(payload)
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            cookies = {SESSION_COOKIE: session_id} if session_id else None
+            future = asyncio.ensure_future(self._post(payload, cookies))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # A cancelled caller must not cancel the call other callers wait on
+        return await asyncio.shield(future)
+
+    async def summarize(self, messages: List[dict], summary: Optional[str] = None) -> str:
+        """Fold `messages` into `summary` (the previous one, if any)"""
+        body = await self._request(self.summary_url, {"messages": messages, "summary": summary})
+        return body.get("summary") or ""
+
+    async def _post(self, payload: dict, cookies: Optional[Dict[str, str]] = None) -> LLMReply:
+        body = await self._request(self.url, payload, cookies)
+        return LLMReply(body.get("response", ""), body.get("source_documents") or [])
+
+    async def _request(self, url: str, payload: dict, cookies: Optional[Dict[str, str]] = None) -> dict:
+        await self.start()
+        headers = None
+        if cookies:
+            headers = {"Cookie": "; ".join(f"{name}={value}" for name, value in cookies.items())}
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.retries += 1
+                await asyncio.sleep(self.retry_backoff * 2 ** (attempt - 1))
+            self.upstream_calls += 1
+            try:
+                response = await self._client.post(url, json=payload, headers=headers)
+            except RETRY_ERRORS as exc:
+                error = LLMServiceError(f"LLM service unreachable: {exc!r}")
+                continue
+            except httpx.TimeoutException as exc:
+                raise LLMServiceError(f"LLM service timed out: {exc!r}", timeout=True) from exc
+            except httpx.HTTPError as exc:
+                raise LLMServiceError(f"LLM request failed: {exc!r}") from exc
+
+            retry_after = response.headers.get("Retry-After")
+            if response.status_code in OVERLOADED_STATUSES and retry_after is not None:
+                self.rejected += 1
+                raise LLMServiceError(
+                    f"LLM service busy ({response.status_code})", status=response.status_code, retry_after=retry_after
+                )
+            if response.status_code in RETRY_STATUSES:
+                error = LLMServiceError(f"LLM service returned {response.status_code}")
+                continue
+            if response.status_code >= 400:
+                raise LLMServiceError(f"LLM service returned {response.status_code}")
+            body = response.json()
+            if body.get("error"):
+                raise LLMServiceError(f"LLM service error: {body['error']}")
+            return body
+
+        logger.warning("LLM call failed after %d attempts: %s", self.max_retries + 1, error)
+        raise error
+
+    def snapshot(self) -> dict:
+        return {
+            "in_flight": len(self._inflight),
+            "upstream_calls": self.upstream_calls,
+            "coalesced": self.coalesced,
+            "retries": self.retries,
+            "rejected": self.rejected,
+        }
+
+llm_client = LLMClient(
+    settings.LLM_API_URL,
+    timeout=settings.LLM_TIMEOUT,
+    connect_timeout=settings.LLM_CONNECT_TIMEOUT,
+    max_retries=settings.LLM_MAX_RETRIES,
+    max_connections=settings.LLM_MAX_CONNECTIONS,
+    summary_url=settings.LLM_SUMMARY_URL,
+)
@@ -0,0 +1,182 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from threading import Lock
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Prometheus text exposition format, as served by GET /metrics
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._lock = Lock()
+        # label values -> [per-bucket counts..., +Inf count], sum
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *label_values: str):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = ([0] * (len(self.buckets) + 1), [0.0])
+                self._series[label_values] = series
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1][0] += value
+
+    def count(self, *label_values: str) -> int:
+        series = self._series.get(label_values)
+        return sum(series[0]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    labels = _format_labels(self.label_names, label_values, f'le="{le}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.label_names, label_values)
+                lines.append(f"{self.name}_sum{labels} {total[0]}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Time to handle an HTTP request", ["method", "route", "status"],
+))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "http_request_stage_duration_seconds", "Time spent per request in database and LLM calls", ["route", "stage"],
+))
+
+class RequestTimer:
+    def __init__(self):
+        self.start = time.perf_counter()
+        # stage -> accumulated seconds, in first-seen order
+        self.stages: Dict[str, float] = {}
+
+    def record(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def span(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def server_timing(self) -> str:
+        entries = [f"{stage};dur={1000 * seconds:.2f}" for stage, seconds in self.stages.items()]
+        entries.append(f"app;dur={1000 * (time.perf_counter() - self.start):.2f}")
+        return ", ".join(entries)
+
+_current_timer: ContextVar[Optional[RequestTimer]] = ContextVar("request_timer", default=None)
+_NULL_SPAN = nullcontext()
+
+def span(stage: str):
+    """Time a block as `stage` of the current request; a no-op outside one"""
+    timer = _current_timer.get()
+    return timer.span(stage) if timer is not None else _NULL_SPAN
+
+def _route_template(scope) -> str:
+    """Matched route as a template, e.g. /api/conversations/{conversation_id}
+
+    Templates rather than raw paths keep label cardinality bounded. Newer
+    FastAPI versions report included routes without the router prefix, so
+    the prefix is recovered from the request path when it is missing.
+    """
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if template is None:
+        return "unmatched"
+    path = scope["path"]
+    regex = getattr(route, "path_regex", None)
+    if regex is None or regex.match(path):
+        return template
+    for i, char in enumerate(path):
+        if char == "/" and regex.match(path[i:]):
+            return path[:i] + template
+    return template
+
+class MetricsMiddleware:
+    """Times every HTTP request and reports its stages in `Server-Timing`
+
+    The header is added when the response starts, so it covers the handler
+    and its database and LLM calls but not the streaming of the body.
+    """
+
+    def __init__(self, app, enabled: bool = True):
+        self.app = app
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timer = RequestTimer()
+        token = _current_timer.set(timer)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timer.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_timer.reset(token)
+            route = _route_template(scope)
+            REQUEST_SECONDS.observe(time.perf_counter() - timer.start, scope["method"], route, str(status))
+            for stage, seconds in timer.stages.items():
+                STAGE_SECONDS.observe(seconds, route, stage)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_timer.get() is not None:
+        # Statements on one connection run one at a time
+        conn.info["query_start"] = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timer = _current_timer.get()
+    start = conn.info.pop("query_start", None)
+    if timer is not None and start is not None:
+        timer.record("db", time.perf_counter() - start)
+
+def instrument_engine(engine):
+    """Add time spent executing SQL to the current request's "db" stage"""
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
@@ -0,0 +1,31 @@
+import json
+from datetime import datetime
+from typing import AsyncIterator, Tuple
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def dumps_line(record: dict) -> bytes:
+    """One NDJSON line; datetimes are written the way the JSON API writes them"""
+    return (json.dumps(record, default=_default, separators=(",", ":")) + "\n").encode()
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, bytes]]:
+    """(line number, line) from a byte stream, without reading it all into memory
+
+    Blank lines are skipped but still counted, so numbers match the file.
+    """
+    buffer = b""
+    line_number = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                yield line_number, line
+    if buffer.strip():
+        yield line_number + 1, buffer
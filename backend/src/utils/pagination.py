@@ -0,0 +1,44 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+# Response header carrying the cursor for the next page; absent on the last page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(*values) -> str:
+    """Opaque, URL-safe cursor for the sort key of the last row on a page"""
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+def _decode(cursor: str) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as exc:
+        raise InvalidCursor(cursor) from exc
+    if not isinstance(values, list):
+        raise InvalidCursor(cursor)
+    return values
+
+def decode_id_cursor(cursor: Optional[str]) -> Optional[int]:
+    if cursor is None:
+        return None
+    values = _decode(cursor)
+    if len(values) != 1 or not isinstance(values[0], int):
+        raise InvalidCursor(cursor)
+    return values[0]
+
+def decode_timestamp_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    if cursor is None:
+        return None
+    values = _decode(cursor)
+    if len(values) != 2 or not isinstance(values[0], str) or not isinstance(values[1], int):
+        raise InvalidCursor(cursor)
+    try:
+        return datetime.fromisoformat(values[0]), values[1]
+    except ValueError as exc:
+        raise InvalidCursor(cursor) from exc
@@ -1,26 +1,36 @@
 import uuid
 from datetime import datetime
-from typing import Optional, Dict
+from typing import Optional
 from fastapi import Request
-from sqlalchemy.orm import Session as DBSession
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.models.session import Session
-import json
+from src.utils.analytics import RollupBatch, record_activity
+from src.utils.session_cache import CachedSession, session_analytics, session_cache
 
-def create_or_get_session(
-    db: DBSession,
+async def create_or_get_session(
+    db: AsyncSession,
     request: Request,
     cookie_id: Optional[str] = None
-) -> Session:
+) -> CachedSession:
     """Create a new session or retrieve existing one based on cookie"""
     
     if cookie_id:
-        # Try to find existing session
-        existing_session = db.query(Session).filter(Session.cookie_id == cookie_id).first()
-        if existing_session:
+        # Try the in-process cache, then the database
+        cached = session_cache.get(cookie_id)
+        if cached is None:
+            result = await db.execute(
+                select(Session.id, Session.session_id, Session.cookie_id).where(Session.cookie_id == cookie_id)
+            )
+            row = result.first()
+            if row is not None:
+                cached = CachedSession(id=row.id, session_id=row.session_id, cookie_id=row.cookie_id)
+                session_cache.put(cached)
+        if cached is not None:
             # Update last activity
-            existing_session.last_activity = datetime.utcnow()
-            db.commit()
-            return existing_session
+            await update_session_analytics(db, cached.id, messages=0, interactions=0)
+            await db.commit()
+            return cached
 
     # Create new session
     device_info = {
@@ -29,23 +39,45 @@ def create_or_get_session(
         "mobile": request.headers.get("sec-ch-ua-mobile", ""),
     }
 
+    now = datetime.utcnow()
     new_session = Session(
         session_id=str(uuid.uuid4()),
         cookie_id=cookie_id or str(uuid.uuid4()),
         ip_address=request.client.host,
         user_agent=request.headers.get("user-agent", ""),
         device_info=device_info,
+        started_at=now,
+        last_activity=now,
+        messages_count=0,
+        total_interactions=0,
     )
 
     db.add(new_session)
-    db.commit()
-    db.refresh(new_session)
-    
-    return new_session
+    # The id is needed for the rollups, which may be written in this transaction
+    await db.flush()
+    await record_activity(db, RollupBatch().add_session(new_session.id, now, device_info))
+    await db.commit()
+
+    cached = CachedSession(id=new_session.id, session_id=new_session.session_id, cookie_id=new_session.cookie_id)
+    session_cache.put(cached)
+    return cached
 
-def update_session_analytics(db: DBSession, session: Session):
-    """Update session analytics"""
-    session.messages_count += 1
-    session.total_interactions += 1
-    session.last_activity = datetime.utcnow()
-    db.commit() 
\ No newline at end of file
+async def update_session_analytics(db: AsyncSession, session_id: int, messages: int = 1, interactions: int = 1):
+    """Count activity against a session
+
+    Buffered in memory and written in batches (see session_cache). With
+    buffering disabled it is a single UPDATE that the caller commits
+    together with its own changes.
+    """
+    if not session_analytics.write_through:
+        session_analytics.add(session_id, messages=messages, interactions=interactions)
+        return
+    await db.execute(
+        update(Session)
+        .where(Session.id == session_id)
+        .values(
+            messages_count=Session.messages_count + messages,
+            total_interactions=Session.total_interactions + interactions,
+            last_activity=datetime.utcnow(),
+        )
+    )
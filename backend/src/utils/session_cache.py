@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+from sqlalchemy import bindparam, update
+from src.config import settings
+from src.config.database import SessionLocal
+from src.models.session import Session
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class CachedSession:
+    """The parts of a Session row the request path needs"""
+    id: int
+    session_id: str
+    cookie_id: str
+
+class SessionCache:
+    """Cookie id -> session lookup with a TTL and LRU eviction
+
+    Sessions are never deleted, so the TTL only bounds how long an entry
+    stays in memory without being used.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        # cookie_id -> (stored_at, session), in LRU order
+        self._entries: "OrderedDict[str, Tuple[float, CachedSession]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, cookie_id: str) -> Optional[CachedSession]:
+        entry = self._entries.get(cookie_id)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl_seconds:
+            self._entries.move_to_end(cookie_id)
+            self.hits += 1
+            return entry[1]
+        if entry is not None:
+            del self._entries[cookie_id]
+        self.misses += 1
+        return None
+
+    def put(self, session: CachedSession):
+        if self.max_entries <= 0:
+            return
+        self._entries[session.cookie_id] = (time.monotonic(), session)
+        self._entries.move_to_end(session.cookie_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def snapshot(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+@dataclass
+class PendingActivity:
+    messages: int = 0
+    interactions: int = 0
+    last_activity: Optional[datetime] = None
+
+    def merge(self, other: "PendingActivity"):
+        self.messages += other.messages
+        self.interactions += other.interactions
+        if other.last_activity and (self.last_activity is None or other.last_activity > self.last_activity):
+            self.last_activity = other.last_activity
+
+_sessions = Session.__table__
+
+# One statement executed for every buffered session (executemany)
+FLUSH_STATEMENT = (
+    update(_sessions)
+    .where(_sessions.c.id == bindparam("b_id"))
+    .values(
+        messages_count=_sessions.c.messages_count + bindparam("b_messages"),
+        total_interactions=_sessions.c.total_interactions + bindparam("b_interactions"),
+        last_activity=bindparam("b_last_activity"),
+    )
+)
+
+class SessionAnalyticsBuffer:
+    """Accumulates session counters in memory and writes them in batches
+
+    Counts are flushed every `flush_interval` seconds, as soon as
+    `max_pending` messages are waiting, and on shutdown. A crash loses at
+    most what is pending, so `max_pending` is the acceptable loss;
+    `max_pending=0` disables buffering and callers write each count in
+    their own transaction.
+    """
+
+    def __init__(self, session_factory, flush_interval: float = 5.0, max_pending: int = 1000):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.flushes = 0
+        self.rows_flushed = 0
+        self.flush_errors = 0
+        self._pending: Dict[int, PendingActivity] = {}
+        self._pending_messages = 0
+        self._flush_requested = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def write_through(self) -> bool:
+        return self.max_pending <= 0
+
+    @property
+    def pending_messages(self) -> int:
+        return self._pending_messages
+
+    def add(self, session_id: int, messages: int = 0, interactions: int = 0):
+        activity = self._pending.setdefault(session_id, PendingActivity())
+        activity.merge(PendingActivity(messages, interactions, datetime.utcnow()))
+        self._pending_messages += messages
+        if self._pending_messages >= self.max_pending:
+            self._flush_requested.set()
+
+    async def flush(self) -> int:
+        """Write all pending counts; returns the number of sessions updated"""
+        async with self._flush_lock:
+            pending, self._pending = self._pending, {}
+            self._pending_messages = 0
+            if not pending:
+                return 0
+            rows = [
+                {
+                    "b_id": session_id,
+                    "b_messages": activity.messages,
+                    "b_interactions": activity.interactions,
+                    "b_last_activity": activity.last_activity,
+                }
+                for session_id, activity in pending.items()
+            ]
+            try:
+                async with self.session_factory() as db:
+                    conn = await db.connection()
+                    await conn.execute(FLUSH_STATEMENT, rows)
+                    await db.commit()
+            except Exception:
+                # Put the counts back so the next flush retries them
+                self.flush_errors += 1
+                for session_id, activity in pending.items():
+                    self._pending.setdefault(session_id, PendingActivity()).merge(activity)
+                    self._pending_messages += activity.messages
+                raise
+            self.flushes += 1
+            self.rows_flushed += len(rows)
+            return len(rows)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Session analytics flush failed; will retry")
+
+    def start(self):
+        """Start the periodic flush on the running event loop"""
+        if self._task is not None:
+            return
+        self._flush_requested = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        if not self.write_through:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the periodic flush and write whatever is still pending"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def snapshot(self) -> dict:
+        return {
+            "pending_sessions": len(self._pending),
+            "pending_messages": self._pending_messages,
+            "flushes": self.flushes,
+            "rows_flushed": self.rows_flushed,
+            "flush_errors": self.flush_errors,
+        }
+
+session_cache = SessionCache(settings.SESSION_CACHE_SIZE, settings.SESSION_CACHE_TTL)
+session_analytics = SessionAnalyticsBuffer(
+    SessionLocal,
+    flush_interval=settings.SESSION_ANALYTICS_FLUSH_INTERVAL,
+    max_pending=settings.SESSION_ANALYTICS_MAX_PENDING,
+)
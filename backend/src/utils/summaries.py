@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional, Sequence
+from src.config import settings
+from src.config.database import SessionLocal
+from src.repository import chat as chat_repository
+from src.utils.llm_client import LLMServiceError, history_payload, llm_client
+from src.utils.metrics import REGISTRY, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Rough token estimate for English text; the model's own count is only
+# known inside the LLM service
+CHARS_PER_TOKEN = 4
+
+SUMMARY_SECONDS = REGISTRY.register(Histogram(
+    "conversation_summary_duration_seconds", "Time to fold older turns into a conversation summary", ["outcome"],
+))
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+class ConversationSummarizer:
+    """Folds the older turns of long conversations into a stored summary
+
+    The chat route calls `maybe_schedule` after saving an exchange; when
+    the history it sent is over the trigger, a background task asks the
+    LLM service to fold everything but the last `keep_messages` into the
+    conversation's summary. Later requests send the summary plus the
+    messages after it, so prompts stop growing with the conversation. At
+    most one run per conversation is in flight; a failed run leaves the
+    history as it was and is retried after the next exchange.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        client,
+        trigger_tokens: int = 800,
+        keep_messages: int = 4,
+        history_limit: int = 10,
+        enabled: bool = True,
+    ):
+        self.session_factory = session_factory
+        self.client = client
+        self.trigger_tokens = trigger_tokens
+        self.keep_messages = keep_messages
+        self.history_limit = history_limit
+        self.enabled = enabled
+        self.runs = 0
+        self.failures = 0
+        self.conflicts = 0
+        self.messages_folded = 0
+        # Estimated tokens of the folded messages (plus the old summary)
+        # against the summary that replaced them
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    def needs_summary(self, summary: Optional[str], history: Sequence[str]) -> bool:
+        """Whether the history sent with a request (plus the new exchange) is over the trigger
+
+        A full history window also triggers a run, since older turns would
+        otherwise fall out of the prompt without being summarised.
+        """
+        if len(history) <= self.keep_messages:
+            return False
+        tokens = sum(estimate_tokens(content) for content in history)
+        if summary:
+            tokens += estimate_tokens(summary)
+        return tokens >= self.trigger_tokens or len(history) > self.history_limit
+
+    def maybe_schedule(self, conversation_id: int, summary: Optional[str], history: Sequence[str]) -> bool:
+        if not self.enabled or not self.needs_summary(summary, history):
+            return False
+        return self.schedule(conversation_id)
+
+    def schedule(self, conversation_id: int) -> bool:
+        """Start a summary run unless one is already in flight for the conversation"""
+        if conversation_id in self._tasks:
+            return False
+        task = asyncio.create_task(self._run(conversation_id))
+        self._tasks[conversation_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(conversation_id, None))
+        return True
+
+    async def _run(self, conversation_id: int):
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            outcome = await self.summarize(conversation_id)
+        except LLMServiceError as exc:
+            self.failures += 1
+            logger.warning("Summary of conversation %d failed: %s", conversation_id, exc)
+        except Exception:
+            self.failures += 1
+            logger.exception("Summary of conversation %d failed", conversation_id)
+        finally:
+            SUMMARY_SECONDS.observe(time.perf_counter() - start, outcome)
+
+    async def summarize(self, conversation_id: int) -> str:
+        """Fold all but the last `keep_messages` unsummarised messages; returns the outcome"""
+        async with self.session_factory() as db:
+            state = await chat_repository.get_unsummarized_messages(db, conversation_id)
+            # No connection is held while the model writes the summary
+            await db.commit()
+        if state is None:
+            return "missing"
+        previous, previous_until_id, messages = state
+        fold = messages[: len(messages) - self.keep_messages]
+        if not fold:
+            return "skipped"
+
+        self.runs += 1
+        summary = await self.client.summarize(history_payload(fold), previous)
+        if not summary.strip():
+            raise LLMServiceError("LLM service returned an empty summary")
+        async with self.session_factory() as db:
+            stored = await chat_repository.store_summary(db, conversation_id, previous_until_id, summary, fold[-1])
+        if not stored:
+            self.conflicts += 1
+            return "conflict"
+        self.messages_folded += len(fold)
+        self.tokens_before += sum(estimate_tokens(m.content) for m in fold) + (estimate_tokens(previous) if previous else 0)
+        self.tokens_after += estimate_tokens(summary)
+        return "stored"
+
+    async def drain(self):
+        """Wait for the runs in flight"""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks.values()), return_exceptions=True)
+
+    async def stop(self):
+        """Cancel the runs in flight; their conversations are summarised after the next exchange"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def snapshot(self) -> dict:
+        return {
+            "in_flight": len(self._tasks),
+            "runs": self.runs,
+            "failures": self.failures,
+            "conflicts": self.conflicts,
+            "messages_folded": self.messages_folded,
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+        }
+
+summarizer = ConversationSummarizer(
+    SessionLocal,
+    llm_client,
+    trigger_tokens=settings.SUMMARY_TRIGGER_TOKENS,
+    keep_messages=settings.SUMMARY_KEEP_MESSAGES,
+    history_limit=settings.CHAT_HISTORY_MESSAGES,
+    enabled=settings.SUMMARY_ENABLED,
+)
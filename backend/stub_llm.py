@@ -0,0 +1,102 @@
+"""Stand-in for the Modal chat endpoint, for local development and tests
+
+Answers immediately (or after --latency seconds) with a canned response
+that echoes the prompt and the number of history messages received.
+POST /summarize answers with a canned summary naming how many messages
+it folded:
+
+    python stub_llm.py --port 8001 --latency 0.5
+    LLM_API_URL=http://localhost:8001/ python run.py
+
+Tests mount `create_stub_app()` in-process through httpx.ASGITransport.
+"""
+import argparse
+import asyncio
+from typing import List, Optional
+
+from fastapi import FastAPI, Request, Response
+from pydantic import BaseModel
+
+
+class StubMessage(BaseModel):
+    content: str
+    is_user: bool
+    timestamp: Optional[str] = None
+
+
+class StubChatRequest(BaseModel):
+    prompt: str
+    history: Optional[List[StubMessage]] = None
+    summary: Optional[str] = None
+
+
+class StubSummaryRequest(BaseModel):
+    messages: List[StubMessage]
+    summary: Optional[str] = None
+
+
+class StubState:
+    def __init__(self, latency: float = 0.0, fail_first: int = 0, fail_status: int = 503, retry_after: Optional[int] = None):
+        self.latency = latency
+        # The first `fail_first` requests get `fail_status`, to exercise
+        # retries; with `retry_after` they are load shedding instead
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.retry_after = retry_after
+        self.requests: List[StubChatRequest] = []
+        self.session_ids: List[Optional[str]] = []
+        self.summary_requests: List[StubSummaryRequest] = []
+
+
+def create_stub_app(
+    latency: float = 0.0, fail_first: int = 0, fail_status: int = 503, retry_after: Optional[int] = None
+) -> FastAPI:
+    app = FastAPI(title="Stub LLM")
+    app.state.stub = StubState(latency, fail_first, fail_status, retry_after)
+
+    @app.post("/")
+    async def chat(request: StubChatRequest, http_request: Request, response: Response):
+        state: StubState = app.state.stub
+        state.requests.append(request)
+        state.session_ids.append(http_request.cookies.get("session_id"))
+        if len(state.requests) <= state.fail_first:
+            response.status_code = state.fail_status
+            if state.retry_after is not None:
+                response.headers["Retry-After"] = str(state.retry_after)
+            return {"detail": "stub failure"}
+        if state.latency:
+            await asyncio.sleep(state.latency)
+        history = request.history or []
+        return {
+            "response": f"Stub answer to: {request.prompt} ({len(history)} previous messages)",
+            "source_documents": ["https://www.hull.ac.uk/stub"],
+            "error": None,
+        }
+
+    @app.post("/summarize")
+    async def summarize(request: StubSummaryRequest):
+        state: StubState = app.state.stub
+        state.summary_requests.append(request)
+        if state.latency:
+            await asyncio.sleep(state.latency)
+        summary = f"{len(request.messages)} messages"
+        if request.summary:
+            summary = f"{request.summary}; {summary}"
+        return {"summary": summary, "error": None}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a stub LLM chat endpoint")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before answering")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    uvicorn.run(create_stub_app(latency=args.latency), host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
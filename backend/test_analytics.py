@@ -0,0 +1,236 @@
+"""Activity rollup checks: incremental counts, the analytics endpoints and backfill
+
+    cd backend
+    python test_analytics.py
+"""
+import asyncio
+import json
+import os
+import tempfile
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp.name}/test_analytics.db")
+
+import httpx
+from sqlalchemy import event, select
+
+from src.config.database import SessionLocal, engine
+from src.main import app, lifespan
+from src.models.analytics import ActivityRollup, ActivityRollupMember
+from src.utils.analytics import RollupBatch, activity_rollups, backfill_rollups, bucket_start, write_rollups
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+
+def run_with_client(scenario):
+    async def run():
+        async with lifespan(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await scenario(client)
+
+    return asyncio.run(run())
+
+
+async def new_session(client, user_agent):
+    client.cookies.clear()
+    response = await client.post("/api/conversations/", headers={"user-agent": user_agent})
+    return response.json()["id"]
+
+
+async def post(client, conversation_id, is_user="true"):
+    response = await client.post(
+        f"/api/conversations/{conversation_id}/messages/", json={"content": "hello", "is_user": is_user}
+    )
+    assert response.status_code == 200
+
+
+async def current_hour(client):
+    rows = (await client.get("/api/analytics/hourly", params={"since": datetime.utcnow().isoformat()})).json()
+    return rows[-1] if rows else {}
+
+
+def test_activity_is_rolled_up_by_hour_and_day():
+    async def scenario(client):
+        await activity_rollups.flush()
+        before = await current_hour(client)
+        phone, laptop = f"phone-{uuid.uuid4()}", f"laptop-{uuid.uuid4()}"
+        conversations = [await new_session(client, agent) for agent in (phone, phone, laptop)]
+        for conversation_id in conversations[:2]:
+            await post(client, conversation_id, "true")
+            await post(client, conversation_id, "false")
+        await post(client, conversations[0], "true")
+        pending = activity_rollups.snapshot()
+        with count_queries() as statements:
+            await activity_rollups.flush()
+        after = await current_hour(client)
+        today = (await client.get("/api/analytics/daily")).json()[-1]
+        return pending, statements, before, after, today
+
+    pending, statements, before, after, today = run_with_client(scenario)
+    assert pending["pending_messages"] == 5 and pending["pending_buckets"] == 2
+    # Member insert and bucket upsert, however many messages; the sessions
+    # were new, so their devices were already known
+    assert len(statements) == 2, statements
+    delta = {key: after[key] - before.get(key, 0) for key in after if key != "bucket"}
+    assert delta == {
+        "sessions_started": 3,
+        "active_sessions": 3,
+        "messages": 5,
+        "user_messages": 3,
+        "bot_messages": 2,
+        "devices": 2,
+    }
+    assert today["bucket"] == bucket_start("day", datetime.utcnow()).isoformat()
+    assert today["messages"] >= after["messages"] and today["devices"] >= after["devices"]
+
+
+def test_imported_history_lands_in_its_own_buckets():
+    async def scenario(client):
+        conversation_id = await new_session(client, "importer")
+        start = datetime(2001, 2, 3, 22, 30)
+        lines = [
+            {"conversation_id": conversation_id, "content": f"old {i}", "is_user": "true" if i % 2 == 0 else "false",
+             "timestamp": (start + timedelta(minutes=20 * i)).isoformat()}
+            for i in range(6)
+        ]
+        body = "".join(json.dumps(line) + "\n" for line in lines)
+        assert (await client.post("/api/import/messages", content=body)).json()["inserted"] == 6
+        await activity_rollups.flush()
+        hourly = (await client.get("/api/analytics/hourly", params={"since": "2001-02-03T00:00", "until": "2001-02-05T00:00"})).json()
+        daily = (await client.get("/api/analytics/daily", params={"since": "2001-02-01", "until": "2001-02-10"})).json()
+        too_long = await client.get("/api/analytics/hourly", params={"since": "2001-01-01", "until": "2002-01-01"})
+        return hourly, daily, too_long
+
+    hourly, daily, too_long = run_with_client(scenario)
+    assert [(row["bucket"], row["messages"], row["active_sessions"]) for row in hourly] == [
+        ("2001-02-03T22:00:00", 2, 1),
+        ("2001-02-03T23:00:00", 3, 1),
+        ("2001-02-04T00:00:00", 1, 1),
+    ]
+    assert [(row["bucket"], row["user_messages"], row["bot_messages"], row["sessions_started"]) for row in daily] == [
+        ("2001-02-03T00:00:00", 3, 2, 0),
+        ("2001-02-04T00:00:00", 0, 1, 0),
+    ]
+    assert too_long.status_code == 400
+
+
+def test_write_through_mode():
+    async def scenario(client):
+        activity_rollups.max_pending = 0
+        try:
+            before = await current_hour(client)
+            conversation_id = await new_session(client, f"tablet-{uuid.uuid4()}")
+            await post(client, conversation_id)
+            return activity_rollups.pending_messages, before, await current_hour(client)
+        finally:
+            activity_rollups.max_pending = 1000
+
+    pending, before, after = run_with_client(scenario)
+    assert pending == 0
+    assert after["messages"] - before.get("messages", 0) == 1
+    assert after["devices"] - before.get("devices", 0) == 1
+
+
+def test_backfill_rebuilds_the_same_rollups():
+    async def rollups():
+        async with SessionLocal() as db:
+            result = await db.execute(select(ActivityRollup.__table__).order_by(ActivityRollup.granularity, ActivityRollup.bucket))
+            return [tuple(row) for row in result]
+
+    async def run():
+        incremental = await rollups()
+        totals = await backfill_rollups(SessionLocal, batch_size=7)
+        rebuilt = await rollups()
+        # Rebuilding only the old days leaves today's buckets alone
+        await backfill_rollups(SessionLocal, until=datetime(2001, 2, 4))
+        partial = await rollups()
+        return incremental, totals, rebuilt, partial
+
+    def populate():
+        async def scenario(client):
+            conversation_id = await new_session(client, "backfill")
+            await post(client, conversation_id)
+            await post(client, conversation_id, "false")
+        run_with_client(scenario)
+
+    populate()
+    incremental, totals, rebuilt, partial = asyncio.run(run())
+    assert totals["messages"] >= 2 and totals["buckets"] == len(incremental)
+    assert rebuilt == incremental
+    assert partial == incremental
+
+
+def test_old_members_are_pruned():
+    # Long before any other test's activity, so only these rows are in reach
+    now = datetime(1985, 6, 15, 12, 30)
+
+    async def scenario(client):
+        batch = RollupBatch()
+        batch.add_session(900001, now - timedelta(days=3), {"user_agent": "old"})
+        batch.add_session(900002, now, {"user_agent": "new"})
+        async with SessionLocal() as db:
+            await write_rollups(await db.connection(), batch)
+            await db.commit()
+        pruned = await activity_rollups.prune(now=now)
+        async with SessionLocal() as db:
+            members = (await db.execute(
+                select(ActivityRollupMember.bucket).where(ActivityRollupMember.bucket < datetime(1986, 1, 1))
+            )).scalars().all()
+            rollups = (await db.execute(
+                select(ActivityRollup.bucket).where(ActivityRollup.bucket < datetime(1986, 1, 1))
+            )).scalars().all()
+        return pruned, members, rollups
+
+    pruned, members, rollups = run_with_client(scenario)
+    # Members of days before the retention cutoff go; the counts stay
+    assert pruned == 4
+    assert len(members) == 4 and min(members) >= datetime(1985, 6, 13)
+    assert len(rollups) == 4
+
+
+def test_batches_merge_per_bucket():
+    batch = RollupBatch()
+    moment = datetime(2024, 5, 6, 7, 8, 9)
+    batch.add_session(1, moment, {"user_agent": "a"})
+    for _ in range(3):
+        batch.add_message(1, "true", moment)
+    other = RollupBatch().add_message(2, "false", moment + timedelta(hours=1))
+    batch.merge(other)
+    assert batch.messages == 4
+    assert sorted(batch.buckets) == [
+        ("day", datetime(2024, 5, 6)),
+        ("hour", datetime(2024, 5, 6, 7)),
+        ("hour", datetime(2024, 5, 6, 8)),
+    ]
+    day = batch.buckets["day", datetime(2024, 5, 6)]
+    assert (day.sessions_started, day.user_messages, day.bot_messages, day.sessions) == (1, 3, 1, {1, 2})
+
+
+def run_test_suite():
+    test_activity_is_rolled_up_by_hour_and_day()
+    test_imported_history_lands_in_its_own_buckets()
+    test_write_through_mode()
+    test_backfill_rebuilds_the_same_rollups()
+    test_old_members_are_pruned()
+    test_batches_merge_per_bucket()
+    print(f"Analytics tests passed ({activity_rollups.snapshot()})")
+
+
+if __name__ == "__main__":
+    run_test_suite()
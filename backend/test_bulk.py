@@ -0,0 +1,149 @@
+"""Bulk NDJSON import and streaming export checks
+
+    cd backend
+    python test_bulk.py
+"""
+import asyncio
+import json
+import os
+import tempfile
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp.name}/test_bulk.db")
+
+import httpx
+from sqlalchemy import event
+
+from src.config import settings
+from src.config.database import engine
+from src.main import app, lifespan
+from src.utils.session_cache import session_analytics
+
+
+def run_with_client(scenario):
+    async def run():
+        async with lifespan(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await scenario(client)
+
+    return asyncio.run(run())
+
+
+def ndjson(records):
+    return "".join(json.dumps(record) + "\n" for record in records).encode()
+
+
+async def new_conversation(client):
+    client.cookies.clear()
+    return (await client.post("/api/conversations/")).json()["id"]
+
+
+def test_import_inserts_in_batches_and_reports_bad_lines():
+    async def scenario(client):
+        conversation_id = await new_conversation(client)
+        lines = [
+            {"conversation_id": conversation_id, "content": f"message {i}", "is_user": "true" if i % 2 else "false",
+             "timestamp": f"2024-01-01T10:{i // 60:02d}:{i % 60:02d}"}
+            for i in range(250)
+        ]
+        body = ndjson(lines[:100]) + b"not json\n\n" + ndjson(
+            [{"conversation_id": 999999, "content": "lost", "is_user": "true"}] + lines[100:]
+        )
+
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement.split()[0])
+
+        settings.BULK_IMPORT_BATCH_SIZE = 100
+        event.listen(engine.sync_engine, "before_cursor_execute", record)
+        try:
+            response = await client.post("/api/import/messages", content=body)
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", record)
+            settings.BULK_IMPORT_BATCH_SIZE = 1000
+        messages = (await client.get(f"/api/conversations/{conversation_id}/messages/", params={"limit": 500})).json()
+        await session_analytics.flush()
+        async with engine.connect() as conn:
+            result = await conn.exec_driver_sql(
+                "SELECT s.messages_count FROM sessions s JOIN conversations c ON c.session_id = s.id WHERE c.id = ?",
+                (conversation_id,),
+            )
+            messages_count = result.scalar_one()
+        return response.json(), statements, messages, messages_count
+
+    result, statements, messages, messages_count = run_with_client(scenario)
+    assert result["inserted"] == 250 and result["skipped"] == 2
+    assert result["errors"][0]["line"] == 101
+    assert result["errors"][1] == {"line": 103, "detail": "Conversation not found"}
+    # Three batches, each one SELECT, one INSERT and one UPDATE whatever its size
+    assert statements.count("INSERT") == 3
+    assert statements.count("SELECT") == 3
+    assert [m["content"] for m in messages] == [f"message {i}" for i in range(250)]
+    assert messages[0]["timestamp"] == "2024-01-01T10:00:00"
+    assert messages_count == 250
+
+
+def test_export_streams_conversations_with_their_messages():
+    async def scenario(client):
+        ids = [await new_conversation(client) for _ in range(3)]
+        for conversation_id in ids[:2]:
+            for i in range(3):
+                await client.post(
+                    f"/api/conversations/{conversation_id}/messages/",
+                    json={"content": f"{conversation_id}-{i}", "is_user": "true"},
+                )
+
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement.split()[0])
+
+        event.listen(engine.sync_engine, "before_cursor_execute", record)
+        try:
+            response = await client.get("/api/export/conversations")
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", record)
+        return ids, response, statements
+
+    ids, response, statements = run_with_client(scenario)
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert statements == ["SELECT"]
+    records = [json.loads(line) for line in response.text.splitlines()]
+    exported = [r for r in records if r["type"] == "conversation" and r["id"] in ids]
+    assert [r["id"] for r in exported] == ids
+    # Each conversation's messages follow it, in order
+    start = records.index(exported[0])
+    assert [r.get("content") for r in records[start:start + 4]] == [None] + [f"{ids[0]}-{i}" for i in range(3)]
+    assert records[start + 8]["id"] == ids[2]
+
+
+def test_exported_messages_can_be_imported_again():
+    async def scenario(client):
+        source = await new_conversation(client)
+        for i in range(5):
+            await client.post(f"/api/conversations/{source}/messages/", json={"content": f"copy {i}", "is_user": "true"})
+        target = await new_conversation(client)
+        exported = (await client.get("/api/export/conversations")).text
+        lines = [json.loads(line) for line in exported.splitlines()]
+        moved = [{**r, "conversation_id": target} for r in lines if r["type"] == "message" and r["conversation_id"] == source]
+        result = (await client.post("/api/import/messages", content=ndjson(moved))).json()
+        original = (await client.get(f"/api/conversations/{source}/messages/")).json()
+        copied = (await client.get(f"/api/conversations/{target}/messages/")).json()
+        return result, original, copied
+
+    result, original, copied = run_with_client(scenario)
+    assert result == {"inserted": 5, "skipped": 0, "errors": []}
+    assert [(m["content"], m["timestamp"]) for m in copied] == [(m["content"], m["timestamp"]) for m in original]
+
+
+def run_test_suite():
+    test_import_inserts_in_batches_and_reports_bad_lines()
+    test_export_streams_conversations_with_their_messages()
+    test_exported_messages_can_be_imported_again()
+    print("Bulk import/export tests passed")
+
+
+if __name__ == "__main__":
+    run_test_suite()
@@ -0,0 +1,176 @@
+"""Chat proxy checks against the in-process stub LLM service
+
+    cd backend
+    python test_chat_proxy.py
+"""
+import asyncio
+import os
+import tempfile
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp.name}/test_chat_proxy.db")
+
+import httpx
+from sqlalchemy import event
+
+from src.config import settings
+from src.config.database import engine
+from src.main import app, lifespan
+from src.utils.llm_client import llm_client
+from stub_llm import create_stub_app
+
+
+def run_with_stub(scenario, **stub_options):
+    stub = create_stub_app(**stub_options)
+
+    async def run():
+        llm_client.url = "http://stub-llm/"
+        llm_client.summary_url = "http://stub-llm/summarize"
+        llm_client.transport = httpx.ASGITransport(app=stub)
+        llm_client.retry_backoff = 0.01
+        async with lifespan(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await scenario(client)
+
+    return asyncio.run(run()), stub.state.stub
+
+
+async def new_conversation(client):
+    client.cookies.clear()
+    return (await client.post("/api/conversations/")).json()["id"]
+
+
+def test_chat_uses_stored_history_and_saves_both_messages():
+    async def scenario(client):
+        conversation_id = await new_conversation(client)
+        for content, is_user in [("Where is the library?", "true"), ("Next to the lake.", "false")]:
+            await client.post(
+                f"/api/conversations/{conversation_id}/messages/",
+                json={"content": content, "is_user": is_user},
+            )
+
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement.split()[0])
+
+        event.listen(engine.sync_engine, "before_cursor_execute", record)
+        try:
+            response = await client.post(
+                f"/api/conversations/{conversation_id}/chat", json={"prompt": "When does it open?"}
+            )
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", record)
+        messages = (await client.get(f"/api/conversations/{conversation_id}/messages/")).json()
+        return response, messages, statements
+
+    (response, messages, statements), stub = run_with_stub(scenario)
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["assistant_message"]["content"] == "Stub answer to: When does it open? (2 previous messages)"
+    assert body["source_documents"] == ["https://www.hull.ac.uk/stub"]
+    assert [m.content for m in stub.requests[0].history] == ["Where is the library?", "Next to the lake."]
+    assert [m.is_user for m in stub.requests[0].history] == [True, False]
+
+    assert [m["content"] for m in messages][-2:] == ["When does it open?", body["assistant_message"]["content"]]
+    assert [m["is_user"] for m in messages][-2:] == ["true", "false"]
+    # History and conversation in one SELECT; both messages written together
+    assert statements.count("SELECT") == 1, statements
+
+
+def test_history_is_limited_to_recent_messages():
+    async def scenario(client):
+        conversation_id = await new_conversation(client)
+        for i in range(settings.CHAT_HISTORY_MESSAGES + 5):
+            await client.post(
+                f"/api/conversations/{conversation_id}/messages/",
+                json={"content": f"message {i}", "is_user": "true"},
+            )
+        return await client.post(f"/api/conversations/{conversation_id}/chat", json={"prompt": "hello"})
+
+    response, stub = run_with_stub(scenario)
+    assert response.status_code == 200
+    history = [m.content for m in stub.requests[0].history]
+    assert len(history) == settings.CHAT_HISTORY_MESSAGES
+    assert history[-1] == f"message {settings.CHAT_HISTORY_MESSAGES + 4}"
+
+
+def test_identical_prompts_share_one_upstream_call():
+    async def scenario(client):
+        conversations = [await new_conversation(client) for _ in range(5)]
+        responses = await asyncio.gather(*(
+            client.post(f"/api/conversations/{c}/chat", json={"prompt": "What courses are offered?"})
+            for c in conversations
+        ))
+        saved = [len((await client.get(f"/api/conversations/{c}/messages/")).json()) for c in conversations]
+        return responses, saved
+
+    (responses, saved), stub = run_with_stub(scenario, latency=0.2)
+    assert all(r.status_code == 200 for r in responses)
+    assert len(stub.requests) == 1
+    assert saved == [2] * 5
+
+
+def test_upstream_errors_are_retried():
+    async def scenario(client):
+        conversation_id = await new_conversation(client)
+        return await client.post(f"/api/conversations/{conversation_id}/chat", json={"prompt": "hi there"})
+
+    response, stub = run_with_stub(scenario, fail_first=2)
+    assert response.status_code == 200
+    assert len(stub.requests) == 3
+
+
+def test_failed_upstream_saves_nothing():
+    async def scenario(client):
+        conversation_id = await new_conversation(client)
+        response = await client.post(f"/api/conversations/{conversation_id}/chat", json={"prompt": "hi there"})
+        messages = (await client.get(f"/api/conversations/{conversation_id}/messages/")).json()
+        return response, messages
+
+    (response, messages), stub = run_with_stub(scenario, fail_first=10)
+    assert response.status_code == 502
+    assert len(stub.requests) == llm_client.max_retries + 1
+    assert messages == []
+
+
+def test_load_shedding_is_passed_on_with_retry_after():
+    async def scenario(client):
+        conversation_id = await new_conversation(client)
+        response = await client.post(f"/api/conversations/{conversation_id}/chat", json={"prompt": "busy?"})
+        messages = (await client.get(f"/api/conversations/{conversation_id}/messages/")).json()
+        return response, messages, client.cookies.get("session_id")
+
+    (response, messages, session_id), stub = run_with_stub(scenario, fail_first=1, retry_after=7)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "7"
+    # Not retried: the service asked for time, and retrying would add load
+    assert len(stub.requests) == 1
+    assert messages == []
+    # The session cookie is forwarded for per-session fairness
+    assert stub.session_ids == [session_id] and session_id
+
+
+def test_unknown_conversation_is_404():
+    async def scenario(client):
+        return await client.post("/api/conversations/999999/chat", json={"prompt": "hi"})
+
+    response, stub = run_with_stub(scenario)
+    assert response.status_code == 404
+    assert stub.requests == []
+
+
+def run_test_suite():
+    test_chat_uses_stored_history_and_saves_both_messages()
+    test_history_is_limited_to_recent_messages()
+    test_identical_prompts_share_one_upstream_call()
+    test_upstream_errors_are_retried()
+    test_failed_upstream_saves_nothing()
+    test_load_shedding_is_passed_on_with_retry_after()
+    test_unknown_conversation_is_404()
+    print(f"Chat proxy tests passed ({llm_client.snapshot()})")
+
+
+if __name__ == "__main__":
+    run_test_suite()
@@ -0,0 +1,241 @@
+"""Query-count and pagination checks for the chat API
+
+Runs the app in-process against a throwaway SQLite database:
+
+    cd backend
+    python test_chat_queries.py
+"""
+import asyncio
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import List
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp.name}/test_chat.db"
+
+import httpx
+from pydantic import TypeAdapter
+from sqlalchemy import event, inspect
+
+from src.config.database import SessionLocal, engine
+from src.main import app, lifespan
+from src.repository import chat as chat_repository
+from src.schemas import chat as schemas
+from src.utils import json_response
+from src.utils.pagination import NEXT_CURSOR_HEADER
+from src.utils.session_cache import session_analytics
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+
+def run_with_client(scenario):
+    async def run():
+        async with lifespan(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await scenario(client)
+
+    return asyncio.run(run())
+
+
+async def create_conversation_with_messages(client, message_count):
+    conversation = (await client.post("/api/conversations/")).json()
+    for i in range(message_count):
+        response = await client.post(
+            f"/api/conversations/{conversation['id']}/messages/",
+            json={"content": f"message {i}", "is_user": "true" if i % 2 == 0 else "false"},
+        )
+        assert response.status_code == 200
+    return conversation["id"]
+
+
+def test_endpoint_query_counts():
+    async def scenario(client):
+        for _ in range(20):
+            conversation_id = await create_conversation_with_messages(client, 2)
+
+        counts = {}
+        with count_queries() as statements:
+            response = await client.get("/api/conversations/")
+        assert response.status_code == 200 and len(response.json()) >= 20
+        counts["read_conversations"] = len(statements)
+
+        with count_queries() as statements:
+            response = await client.get(f"/api/conversations/{conversation_id}")
+        assert len(response.json()["messages"]) == 2
+        counts["read_conversation"] = len(statements)
+
+        with count_queries() as statements:
+            response = await client.post(
+                f"/api/conversations/{conversation_id}/messages/",
+                json={"content": "one more", "is_user": "true"},
+            )
+        assert response.status_code == 200
+        counts["create_message"] = len(statements)
+
+        with count_queries() as statements:
+            response = await client.get(f"/api/conversations/{conversation_id}/messages/")
+        assert len(response.json()) == 3
+        counts["read_messages"] = len(statements)
+        return counts
+
+    counts = run_with_client(scenario)
+    # Independent of how many conversations or messages are returned
+    assert counts["read_conversations"] == 2, counts
+    assert counts["read_conversation"] == 2, counts
+    # SELECT conversation, INSERT message, UPDATE conversation; session
+    # counters are buffered
+    assert counts["create_message"] == 3, counts
+    assert counts["read_messages"] == 2, counts
+
+
+def test_message_updates_session_analytics():
+    async def scenario(client):
+        conversation_id = await create_conversation_with_messages(client, 3)
+        await session_analytics.flush()
+        async with engine.connect() as conn:
+            result = await conn.exec_driver_sql(
+                "SELECT s.messages_count, s.total_interactions FROM sessions s "
+                "JOIN conversations c ON c.session_id = s.id WHERE c.id = ?",
+                (conversation_id,),
+            )
+            return result.one()
+
+    messages_count, total_interactions = run_with_client(scenario)
+    assert messages_count == 3
+    assert total_interactions == 3
+
+
+def test_missing_conversation_is_404():
+    async def scenario(client):
+        posted = await client.post("/api/conversations/999999/messages/", json={"content": "x", "is_user": "true"})
+        listed = await client.get("/api/conversations/999999/messages/")
+        return posted.status_code, listed.status_code
+
+    assert run_with_client(scenario) == (404, 404)
+
+
+def test_keyset_pagination_walks_every_message_once():
+    async def scenario(client):
+        conversation_id = await create_conversation_with_messages(client, 25)
+        url = f"/api/conversations/{conversation_id}/messages/"
+        everything = (await client.get(url)).json()
+
+        pages = []
+        cursor = None
+        while True:
+            params = {"limit": 10}
+            if cursor:
+                params["cursor"] = cursor
+            response = await client.get(url, params=params)
+            pages.append(response.json())
+            cursor = response.headers.get(NEXT_CURSOR_HEADER)
+            if cursor is None:
+                break
+        bad = await client.get(url, params={"cursor": "not-a-cursor"})
+        return everything, pages, bad.status_code
+
+    everything, pages, bad_status = run_with_client(scenario)
+    assert [len(page) for page in pages] == [10, 10, 5]
+    assert [m["id"] for page in pages for m in page] == [m["id"] for m in everything]
+    assert bad_status == 400
+
+
+def test_keyset_pagination_of_conversations():
+    async def scenario(client):
+        for _ in range(7):
+            await client.post("/api/conversations/")
+        everything = (await client.get("/api/conversations/", params={"limit": 1000})).json()
+
+        seen = []
+        cursor = None
+        while True:
+            params = {"limit": 3}
+            if cursor:
+                params["cursor"] = cursor
+            response = await client.get("/api/conversations/", params=params)
+            seen.extend(c["id"] for c in response.json())
+            cursor = response.headers.get(NEXT_CURSOR_HEADER)
+            if cursor is None:
+                break
+        return everything, seen
+
+    everything, seen = run_with_client(scenario)
+    assert seen == [c["id"] for c in everything]
+
+
+def pydantic_json(schema, objects) -> bytes:
+    """What FastAPI sends for ORM objects through `response_model`"""
+    adapter = TypeAdapter(List[schema])
+    content = adapter.dump_python(adapter.validate_python(objects, from_attributes=True), mode="json")
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def test_list_responses_match_the_schema_serialization():
+    async def scenario(client):
+        conversation_id = await create_conversation_with_messages(client, 2)
+        lines = [
+            {"conversation_id": conversation_id, "content": 'Caf\u00e9 "quoted" \u2603\n', "is_user": "false",
+             "timestamp": "2030-01-01T10:00:00.120000"},
+            {"conversation_id": conversation_id, "content": "on the second", "is_user": "true",
+             "timestamp": "2030-01-01T10:00:01"},
+        ]
+        await client.post("/api/import/messages", content="".join(json.dumps(line) + "\n" for line in lines))
+        messages = await client.get(f"/api/conversations/{conversation_id}/messages/")
+        conversations = await client.get("/api/conversations/", params={"limit": 1000})
+
+        async with SessionLocal() as db:
+            orm_messages = await chat_repository.get_messages(db, conversation_id)
+            orm_conversations = await chat_repository.get_conversations(db, limit=1000)
+            rows = await chat_repository.get_message_rows(db, conversation_id)
+        return messages, conversations, orm_messages, orm_conversations, rows
+
+    messages, conversations, orm_messages, orm_conversations, rows = run_with_client(scenario)
+    assert messages.headers["content-type"] == "application/json"
+    assert messages.content == pydantic_json(schemas.Message, orm_messages)
+    assert conversations.content == pydantic_json(schemas.Conversation, orm_conversations)
+    # The standard-library fallback writes the same bytes as orjson
+    fast = json_response.orjson
+    json_response.orjson = None
+    try:
+        assert json_response.dumps(rows) == messages.content
+    finally:
+        json_response.orjson = fast
+
+
+def test_message_index_exists():
+    async def scenario(client):
+        async with engine.connect() as conn:
+            return await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_indexes("messages"))
+
+    indexes = run_with_client(scenario)
+    assert any(index["column_names"] == ["conversation_id", "timestamp"] for index in indexes)
+
+
+def run_test_suite():
+    test_endpoint_query_counts()
+    test_message_updates_session_analytics()
+    test_missing_conversation_is_404()
+    test_keyset_pagination_walks_every_message_once()
+    test_keyset_pagination_of_conversations()
+    test_list_responses_match_the_schema_serialization()
+    test_message_index_exists()
+    print("Chat query tests passed")
+
+
+if __name__ == "__main__":
+    run_test_suite()
@@ -0,0 +1,102 @@
+"""Server-Timing header and /metrics checks
+
+    cd backend
+    python test_metrics.py
+"""
+import asyncio
+import os
+import tempfile
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp.name}/test_metrics.db")
+
+import httpx
+from fastapi import FastAPI
+
+from src.main import app, lifespan
+from src.utils.llm_client import llm_client
+from src.utils.metrics import REQUEST_SECONDS, MetricsMiddleware
+from stub_llm import create_stub_app
+
+
+def run_with_client(scenario, asgi_app=app):
+    async def run():
+        llm_client.url = "http://stub-llm/"
+        llm_client.summary_url = "http://stub-llm/summarize"
+        llm_client.transport = httpx.ASGITransport(app=create_stub_app(latency=0.05))
+        async with lifespan(app):
+            transport = httpx.ASGITransport(app=asgi_app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await scenario(client)
+
+    return asyncio.run(run())
+
+
+def server_timing(response) -> dict:
+    entries = {}
+    for entry in response.headers["server-timing"].split(", "):
+        name, duration = entry.split(";dur=")
+        entries[name] = float(duration)
+    return entries
+
+
+def test_server_timing_reports_db_and_llm_time():
+    async def scenario(client):
+        client.cookies.clear()
+        created = await client.post("/api/conversations/")
+        conversation_id = created.json()["id"]
+        chat = await client.post(f"/api/conversations/{conversation_id}/chat", json={"prompt": "hello"})
+        return created, chat
+
+    created, chat = run_with_client(scenario)
+    assert set(server_timing(created)) == {"db", "app"}
+    timings = server_timing(chat)
+    assert set(timings) == {"db", "llm", "app"}
+    assert timings["llm"] >= 50
+    assert timings["app"] >= timings["llm"] + timings["db"] - 1
+
+
+def test_metrics_endpoint_groups_by_route_template():
+    async def scenario(client):
+        client.cookies.clear()
+        conversation_id = (await client.post("/api/conversations/")).json()["id"]
+        await client.get(f"/api/conversations/{conversation_id}/messages/")
+        return await client.get("/metrics")
+
+    route = "/api/conversations/{conversation_id}/messages/"
+    before = REQUEST_SECONDS.count("GET", route, "200")
+    response = run_with_client(scenario)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert REQUEST_SECONDS.count("GET", route, "200") == before + 1
+    assert f'http_request_duration_seconds_count{{method="GET",route="{route}",status="200"}}' in response.text
+    assert f'http_request_stage_duration_seconds_count{{route="{route}",stage="db"}}' in response.text
+
+
+def test_disabled_middleware_adds_nothing():
+    bare = FastAPI()
+
+    @bare.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    async def run():
+        transport = httpx.ASGITransport(app=MetricsMiddleware(bare, enabled=False))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/ping")
+
+    response = asyncio.run(run())
+    assert response.status_code == 200
+    assert "server-timing" not in response.headers
+    assert REQUEST_SECONDS.count("GET", "/ping", "200") == 0
+
+
+def run_test_suite():
+    test_server_timing_reports_db_and_llm_time()
+    test_metrics_endpoint_groups_by_route_template()
+    test_disabled_middleware_adds_nothing()
+    print("Metrics tests passed")
+
+
+if __name__ == "__main__":
+    run_test_suite()
@@ -0,0 +1,155 @@
+"""Full-text message search checks (SQLite FTS5)
+
+    cd backend
+    python test_search.py
+"""
+import asyncio
+import json
+import os
+import tempfile
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp.name}/test_search.db")
+
+import httpx
+from sqlalchemy import event
+
+from src.config.database import engine
+from src.main import app, lifespan
+from src.utils.pagination import NEXT_CURSOR_HEADER
+
+
+def run_with_client(scenario):
+    async def run():
+        async with lifespan(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await scenario(client)
+
+    return asyncio.run(run())
+
+
+async def new_conversation(client):
+    client.cookies.clear()
+    conversation = (await client.post("/api/conversations/")).json()
+    return conversation["id"]
+
+
+async def post(client, conversation_id, content, is_user="true"):
+    response = await client.post(
+        f"/api/conversations/{conversation_id}/messages/", json={"content": content, "is_user": is_user}
+    )
+    return response.json()
+
+
+def test_new_messages_are_searchable_and_ranked():
+    async def scenario(client):
+        conversation_id = await new_conversation(client)
+        await post(client, conversation_id, "The orangery opens at 9am on weekdays")
+        await post(client, conversation_id, "Orangery, orangery: the orangery is by the lake")
+        await post(client, conversation_id, "Accommodation fees are due in September")
+        return (await client.get("/api/search/messages", params={"q": "ORANGERY"})).json()
+
+    hits = run_with_client(scenario)
+    assert [hit["content"] for hit in hits[:2]] == [
+        "Orangery, orangery: the orangery is by the lake",
+        "The orangery opens at 9am on weekdays",
+    ]
+    assert hits[0]["rank"] > hits[1]["rank"]
+    assert "[orangery]" in hits[1]["snippet"].lower()
+
+
+def test_terms_are_stemmed_and_all_required():
+    async def scenario(client):
+        conversation_id = await new_conversation(client)
+        await post(client, conversation_id, "Applying for scholarships opens in March")
+        await post(client, conversation_id, "Scholarship deadlines vary by faculty")
+        both = (await client.get("/api/search/messages", params={"q": "scholarships apply"})).json()
+        # FTS5 query syntax in user input is ignored rather than an error
+        odd = await client.get("/api/search/messages", params={"q": '"scholarship* -('})
+        empty = await client.get("/api/search/messages", params={"q": "?!"})
+        return both, odd, empty
+
+    both, odd, empty = run_with_client(scenario)
+    assert [hit["content"] for hit in both] == ["Applying for scholarships opens in March"]
+    assert odd.status_code == 200 and len(odd.json()) >= 2
+    assert empty.status_code == 400
+
+
+def test_filters_and_pagination():
+    async def scenario(client):
+        first = await new_conversation(client)
+        second = await new_conversation(client)
+        for i in range(5):
+            await post(client, first, f"parking permit question {i}")
+        await post(client, second, "parking permit for visitors")
+        session_id = (await client.get("/api/export/conversations")).text
+        sessions = {r["id"]: r["session_id"] for r in map(json.loads, session_id.splitlines()) if r["type"] == "conversation"}
+
+        only_second = (await client.get(
+            "/api/search/messages", params={"q": "parking permit", "session_id": sessions[second]}
+        )).json()
+        future = (await client.get(
+            "/api/search/messages", params={"q": "parking permit", "since": "2999-01-01T00:00:00"}
+        )).json()
+
+        pages, cursor = [], None
+        while True:
+            params = {"q": "parking permit", "session_id": sessions[first], "limit": 2}
+            if cursor:
+                params["cursor"] = cursor
+            response = await client.get("/api/search/messages", params=params)
+            pages.append([hit["id"] for hit in response.json()])
+            cursor = response.headers.get(NEXT_CURSOR_HEADER)
+            if cursor is None:
+                break
+        return second, only_second, future, pages
+
+    second, only_second, future, pages = run_with_client(scenario)
+    assert [hit["conversation_id"] for hit in only_second] == [second]
+    assert future == []
+    ids = [i for page in pages for i in page]
+    assert len(ids) == 5 and len(set(ids)) == 5
+    assert [len(page) for page in pages] == [2, 2, 1]
+
+
+def test_search_uses_the_fts_index():
+    async def scenario(client):
+        conversation_id = await new_conversation(client)
+        await post(client, conversation_id, "Graduation ceremonies take place in July")
+        imported = json.dumps({"conversation_id": conversation_id, "content": "Graduation gowns are hired online", "is_user": "false"})
+        await client.post("/api/import/messages", content=imported.encode())
+
+        plans = []
+
+        def explain(conn, cursor, statement, parameters, context, executemany):
+            if "MATCH" in statement and not statement.startswith("EXPLAIN"):
+                plans.extend(row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters))
+
+        event.listen(engine.sync_engine, "after_cursor_execute", explain)
+        try:
+            hits = (await client.get("/api/search/messages", params={"q": "graduation"})).json()
+        finally:
+            event.remove(engine.sync_engine, "after_cursor_execute", explain)
+        return hits, plans
+
+    hits, plans = run_with_client(scenario)
+    assert {hit["content"] for hit in hits} >= {
+        "Graduation ceremonies take place in July",
+        "Graduation gowns are hired online",
+    }
+    # The FTS index finds the rows; messages are then fetched by primary key
+    assert any(plan.startswith("SCAN messages_fts VIRTUAL TABLE INDEX") for plan in plans)
+    assert "SEARCH messages USING INTEGER PRIMARY KEY (rowid=?)" in plans
+
+
+def run_test_suite():
+    test_new_messages_are_searchable_and_ranked()
+    test_terms_are_stemmed_and_all_required()
+    test_filters_and_pagination()
+    test_search_uses_the_fts_index()
+    print("Search tests passed")
+
+
+if __name__ == "__main__":
+    run_test_suite()
@@ -0,0 +1,208 @@
+"""Session cache and write-behind analytics checks
+
+    cd backend
+    python test_session_cache.py
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp.name}/test_sessions.db")
+
+import httpx
+from sqlalchemy import event
+
+from src.config.database import engine
+from src.main import app, lifespan
+from src.utils.session_cache import CachedSession, SessionCache, session_analytics, session_cache
+
+
+def run_with_client(scenario):
+    async def run():
+        async with lifespan(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await scenario(client)
+
+    return asyncio.run(run())
+
+
+async def session_counts(conversation_id):
+    async with engine.connect() as conn:
+        result = await conn.exec_driver_sql(
+            "SELECT s.messages_count, s.total_interactions FROM sessions s "
+            "JOIN conversations c ON c.session_id = s.id WHERE c.id = ?",
+            (conversation_id,),
+        )
+        return tuple(result.one())
+
+
+async def post_messages(client, conversation_id, count):
+    for i in range(count):
+        response = await client.post(
+            f"/api/conversations/{conversation_id}/messages/",
+            json={"content": f"message {i}", "is_user": "true"},
+        )
+        assert response.status_code == 200
+
+
+def test_cache_ttl_and_eviction():
+    cache = SessionCache(max_entries=2, ttl_seconds=0.05)
+    for i in range(3):
+        cache.put(CachedSession(id=i, session_id=f"s{i}", cookie_id=f"c{i}"))
+    assert len(cache) == 2
+    assert cache.get("c0") is None
+    assert cache.get("c2").id == 2
+    time.sleep(0.06)
+    assert cache.get("c2") is None
+    assert len(cache) == 1
+
+
+def test_known_cookie_skips_session_lookup():
+    async def scenario(client):
+        first = await client.post("/api/conversations/")
+        assert "session_id" in client.cookies
+
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine.sync_engine, "before_cursor_execute", record)
+        try:
+            second = await client.post("/api/conversations/")
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", record)
+        return first.json(), second.json(), statements
+
+    first, second, statements = run_with_client(scenario)
+    assert first["id"] != second["id"]
+    # Only the conversation INSERT; the session comes from the cache
+    assert [s.split()[0] for s in statements] == ["INSERT"], statements
+
+
+def test_counts_are_buffered_and_flushed_in_one_batch():
+    async def scenario(client):
+        conversations = []
+        for _ in range(3):
+            client.cookies.clear()  # a new session each time
+            conversations.append((await client.post("/api/conversations/")).json()["id"])
+        for conversation_id in conversations:
+            await post_messages(client, conversation_id, 2)
+        before = [await session_counts(c) for c in conversations]
+        flushes = session_analytics.flushes
+
+        batches = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith("UPDATE sessions"):
+                batches.append(len(parameters) if executemany else 1)
+
+        event.listen(engine.sync_engine, "before_cursor_execute", record)
+        try:
+            await session_analytics.flush()
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", record)
+        after = [await session_counts(c) for c in conversations]
+        return before, after, batches, session_analytics.flushes - flushes
+
+    before, after, batches, flushes = run_with_client(scenario)
+    assert before == [(0, 0)] * 3
+    assert after == [(2, 2)] * 3
+    assert batches == [3]
+    assert flushes == 1
+
+
+def test_reaching_max_pending_triggers_flush():
+    async def scenario(client):
+        conversation_id = (await client.post("/api/conversations/")).json()["id"]
+        session_analytics.max_pending = 3
+        flushes = session_analytics.flushes
+        try:
+            await post_messages(client, conversation_id, 3)
+            for _ in range(50):
+                if session_analytics.flushes > flushes:
+                    break
+                await asyncio.sleep(0.01)
+            return await session_counts(conversation_id)
+        finally:
+            session_analytics.max_pending = 1000
+
+    assert run_with_client(scenario) == (3, 3)
+
+
+def test_shutdown_flushes_pending_counts():
+    holder = {}
+
+    async def scenario(client):
+        holder["id"] = (await client.post("/api/conversations/")).json()["id"]
+        await post_messages(client, holder["id"], 4)
+        assert session_analytics.pending_messages == 4
+
+    run_with_client(scenario)
+
+    async def check():
+        try:
+            return await session_counts(holder["id"])
+        finally:
+            await engine.dispose()
+
+    assert asyncio.run(check()) == (4, 4)
+
+
+def test_failed_flush_keeps_counts():
+    class BrokenSession:
+        async def __aenter__(self):
+            raise RuntimeError("database unavailable")
+
+        async def __aexit__(self, *exc):
+            return False
+
+    async def scenario(client):
+        conversation_id = (await client.post("/api/conversations/")).json()["id"]
+        await post_messages(client, conversation_id, 2)
+        factory = session_analytics.session_factory
+        session_analytics.session_factory = BrokenSession
+        try:
+            await session_analytics.flush()
+        except RuntimeError:
+            pass
+        finally:
+            session_analytics.session_factory = factory
+        pending = session_analytics.pending_messages
+        await session_analytics.flush()
+        return pending, await session_counts(conversation_id)
+
+    pending, counts = run_with_client(scenario)
+    assert pending == 2
+    assert counts == (2, 2)
+
+
+def test_write_through_mode():
+    async def scenario(client):
+        session_analytics.max_pending = 0
+        try:
+            conversation_id = (await client.post("/api/conversations/")).json()["id"]
+            await post_messages(client, conversation_id, 2)
+            return session_analytics.pending_messages, await session_counts(conversation_id)
+        finally:
+            session_analytics.max_pending = 1000
+
+    assert run_with_client(scenario) == (0, (2, 2))
+
+
+def run_test_suite():
+    test_cache_ttl_and_eviction()
+    test_known_cookie_skips_session_lookup()
+    test_counts_are_buffered_and_flushed_in_one_batch()
+    test_reaching_max_pending_triggers_flush()
+    test_shutdown_flushes_pending_counts()
+    test_failed_flush_keeps_counts()
+    test_write_through_mode()
+    print(f"Session cache tests passed (shared cache: {session_cache.snapshot()})")
+
+
+if __name__ == "__main__":
+    run_test_suite()
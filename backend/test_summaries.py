@@ -0,0 +1,130 @@
+"""Rolling conversation summary checks against the in-process stub LLM service
+
+    cd backend
+    python test_summaries.py
+"""
+import asyncio
+import os
+import tempfile
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp.name}/test_summaries.db")
+
+import httpx
+from sqlalchemy import create_engine, inspect
+
+from src.config.database import _add_missing_columns
+from src.main import app, lifespan
+from src.utils.llm_client import llm_client
+from src.utils.summaries import estimate_tokens, summarizer
+from stub_llm import create_stub_app
+
+
+def run_with_stub(scenario, summary_url="http://stub-llm/summarize", **stub_options):
+    stub = create_stub_app(**stub_options)
+
+    async def run():
+        llm_client.url = "http://stub-llm/"
+        llm_client.summary_url = summary_url
+        llm_client.transport = httpx.ASGITransport(app=stub)
+        llm_client.retry_backoff = 0.01
+        summarizer.trigger_tokens, summarizer.keep_messages = 100, 2
+        try:
+            async with lifespan(app):
+                transport = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    return await scenario(client)
+        finally:
+            summarizer.trigger_tokens, summarizer.keep_messages = 800, 4
+
+    return asyncio.run(run()), stub.state.stub
+
+
+async def new_conversation(client):
+    client.cookies.clear()
+    return (await client.post("/api/conversations/")).json()["id"]
+
+
+async def chat(client, conversation_id, prompt):
+    response = await client.post(f"/api/conversations/{conversation_id}/chat", json={"prompt": prompt})
+    assert response.status_code == 200, response.text
+    return response
+
+
+def test_long_conversations_send_a_summary_and_recent_turns():
+    async def scenario(client):
+        conversation_id = await new_conversation(client)
+        in_flight = []
+        for i in range(6):
+            await chat(client, conversation_id, f"Question {i} about halls of residence " + "and fees " * 10)
+            # The answer comes back before the summary is written
+            in_flight.append(summarizer.snapshot()["in_flight"])
+            await summarizer.drain()
+        messages = (await client.get(f"/api/conversations/{conversation_id}/messages/")).json()
+        return in_flight, messages
+
+    (in_flight, messages), stub = run_with_stub(scenario, latency=0.02)
+    assert in_flight[0] == 0 and 1 in in_flight
+    # Every message is still stored; only the prompt history is shortened
+    assert len(messages) == 12
+    first, second = stub.summary_requests[:2]
+    assert first.summary is None
+    assert second.summary == f"{len(first.messages)} messages"
+
+    history_sizes = [len(request.history) for request in stub.requests]
+    assert history_sizes[:2] == [0, 2]
+    assert max(history_sizes) <= 4
+    last = stub.requests[-1]
+    assert last.summary is not None and last.summary.startswith(f"{len(first.messages)} messages")
+    # Before the last chat, folded and kept messages covered the conversation
+    # exactly once (the last summary run came after it)
+    folded = sum(len(request.messages) for request in stub.summary_requests[:-1])
+    assert folded + len(last.history) == 10
+    assert [m.content for m in last.history] == [m["content"] for m in messages[folded:10]]
+
+
+def test_failed_summaries_leave_the_history_alone():
+    async def scenario(client):
+        conversation_id = await new_conversation(client)
+        failures = summarizer.failures
+        for i in range(3):
+            await chat(client, conversation_id, f"Question {i} about parking " + "permits " * 20)
+            await summarizer.drain()
+        return summarizer.failures - failures
+
+    failures, stub = run_with_stub(scenario, summary_url="http://stub-llm/missing")
+    assert failures >= 1
+    assert [len(request.history) for request in stub.requests] == [0, 2, 4]
+    assert all(request.summary is None for request in stub.requests)
+
+
+def test_short_conversations_are_not_summarised():
+    assert not summarizer.needs_summary(None, ["hi", "hello", "where is the library?"])
+    assert summarizer.needs_summary(None, ["word " * 1000] * 5)
+    assert summarizer.needs_summary(None, ["hi"] * (summarizer.history_limit + 1))
+    assert estimate_tokens("x" * 400) == 101
+
+
+def test_existing_tables_get_the_new_columns():
+    engine = create_engine(f"sqlite:///{_tmp.name}/old_schema.db")
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE conversations (id INTEGER PRIMARY KEY, session_id INTEGER, created_at DATETIME, updated_at DATETIME)"
+        )
+        conn.exec_driver_sql("INSERT INTO conversations (id) VALUES (1)")
+        _add_missing_columns(conn)
+    columns = {column["name"] for column in inspect(engine).get_columns("conversations")}
+    engine.dispose()
+    assert {"summary", "summary_until_timestamp", "summary_until_id"} <= columns
+
+
+def run_test_suite():
+    test_long_conversations_send_a_summary_and_recent_turns()
+    test_failed_summaries_leave_the_history_alone()
+    test_short_conversations_are_not_summarised()
+    test_existing_tables_get_the_new_columns()
+    print(f"Summary tests passed ({summarizer.snapshot()})")
+
+
+if __name__ == "__main__":
+    run_test_suite()
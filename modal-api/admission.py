@@ -0,0 +1,247 @@
+"""Admission control in front of generation
+
+Without a limit, every chat request that reaches the container waits for
+the model, and under a traffic spike the queue (and latency) grows until
+clients time out. `AdmissionController` lets `max_concurrency` requests
+generate at once and queues at most `max_queue` more. A request is
+rejected straight away when the queue is full or when its estimated wait
+already exceeds the deadline. It is also rejected if it has waited in the
+queue for as long as the deadline allows. Rejections carry an HTTP status
+and a `Retry-After` estimate, so clients back off instead of piling up.
+
+With `fair_sessions`, waiting requests are admitted round-robin across
+sessions, so one busy client cannot starve the others. A session that
+already has `session_limit` requests in flight gets 429.
+"""
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Iterator, Optional
+
+from timing import REGISTRY, Counter, Gauge, Histogram
+
+ADMISSION_REJECTED = REGISTRY.register(Counter(
+    "chat_admission_rejected_total", "Chat requests turned away by admission control", ["reason"],
+))
+ADMISSION_QUEUE_SECONDS = REGISTRY.register(Histogram(
+    "chat_admission_queue_seconds", "Time admitted chat requests waited for a generation slot",
+))
+
+# reason -> HTTP status of the rejection
+REJECTION_STATUS = {"queue_full": 503, "deadline": 503, "timeout": 503, "session_limit": 429}
+
+
+class Rejected(Exception):
+    """The request cannot be served in time; `retry_after` is in whole seconds"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"Server busy ({reason}), retry in {math.ceil(retry_after)}s")
+        self.reason = reason
+        self.status = REJECTION_STATUS[reason]
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+@dataclass
+class Ticket:
+    """A generation slot; `release()` it when the request is done (from any thread)"""
+    controller: "AdmissionController"
+    session: Optional[str]
+    loop: asyncio.AbstractEventLoop
+    queue_wait: float = 0.0
+    admitted_at: float = field(default_factory=time.perf_counter)
+    released: bool = False
+
+    def release(self):
+        try:
+            on_loop = asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self.controller._release(self)
+        else:
+            # Streaming responses finish in a worker thread
+            self.loop.call_soon_threadsafe(self.controller._release, self)
+
+
+@dataclass
+class _Waiter:
+    session: Optional[str]
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class AdmissionController:
+    """Bounded concurrency and queue with a per-request deadline
+
+    The wait estimate uses a moving average of how long admitted requests
+    hold their slot, starting from `service_time`.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_queue: int = 32,
+        deadline: float = 20.0,
+        fair_sessions: bool = False,
+        session_limit: int = 2,
+        service_time: float = 1.0,
+        smoothing: float = 0.2,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self.fair_sessions = fair_sessions
+        self.session_limit = session_limit
+        self.service_time = service_time
+        self.smoothing = smoothing
+        self.running = 0
+        self.admitted = 0
+        self.completed = 0
+        self.rejected: Dict[str, int] = {reason: 0 for reason in REJECTION_STATUS}
+        self.max_queue_depth_seen = 0
+        # session -> its waiting requests, in round-robin order
+        self._queues: "OrderedDict[Optional[str], Deque[_Waiter]]" = OrderedDict()
+        self._queued = 0
+        self._in_flight: Dict[Optional[str], int] = {}
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queued
+
+    def estimated_wait(self) -> float:
+        """Seconds a request arriving now would wait for a slot"""
+        if self.running < self.max_concurrency and not self._queued:
+            return 0.0
+        return math.ceil((self._queued + 1) / self.max_concurrency) * self.service_time
+
+    def _reject(self, reason: str, retry_after: float):
+        self.rejected[reason] += 1
+        ADMISSION_REJECTED.inc(reason)
+        raise Rejected(reason, retry_after)
+
+    def _session_key(self, session: Optional[str]) -> Optional[str]:
+        return session if self.fair_sessions else None
+
+    def _admit(self, session: Optional[str], queue_wait: float) -> Ticket:
+        self.running += 1
+        self.admitted += 1
+        key = self._session_key(session)
+        self._in_flight[key] = self._in_flight.get(key, 0) + 1
+        ADMISSION_QUEUE_SECONDS.observe(queue_wait)
+        return Ticket(self, key, asyncio.get_running_loop(), queue_wait)
+
+    async def acquire(self, session: Optional[str] = None) -> Ticket:
+        """Wait for a generation slot or raise `Rejected`"""
+        key = self._session_key(session)
+        if key is not None and self._in_flight.get(key, 0) >= self.session_limit:
+            self._reject("session_limit", self.service_time)
+        if self.running < self.max_concurrency and not self._queued:
+            return self._admit(session, 0.0)
+        wait = self.estimated_wait()
+        if self._queued >= self.max_queue:
+            self._reject("queue_full", wait)
+        if wait + self.service_time > self.deadline:
+            self._reject("deadline", wait)
+
+        waiter = _Waiter(key, asyncio.get_running_loop().create_future())
+        self._queues.setdefault(key, deque()).append(waiter)
+        self._queued += 1
+        self._in_flight[key] = self._in_flight.get(key, 0) + 1
+        self.max_queue_depth_seen = max(self.max_queue_depth_seen, self._queued)
+        try:
+            # Leave time to generate once admitted
+            await asyncio.wait_for(asyncio.shield(waiter.future), max(self.deadline - self.service_time, 0.0))
+        except asyncio.TimeoutError:
+            if not waiter.future.done():
+                self._forget(waiter)
+                self._reject("timeout", self.estimated_wait())
+        except asyncio.CancelledError:
+            # The client went away: give back the slot or the queue place
+            if waiter.future.done():
+                waiter.future.result().release()
+            else:
+                self._forget(waiter)
+            raise
+        return waiter.future.result()
+
+    def _forget(self, waiter: _Waiter):
+        queue = self._queues.get(waiter.session)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            self._queued -= 1
+            if not queue:
+                del self._queues[waiter.session]
+        self._leave(waiter.session)
+
+    def _leave(self, key: Optional[str]):
+        self._in_flight[key] -= 1
+        if not self._in_flight[key]:
+            del self._in_flight[key]
+
+    def _release(self, ticket: Ticket):
+        if ticket.released:
+            return
+        ticket.released = True
+        held = time.perf_counter() - ticket.admitted_at
+        self.service_time += self.smoothing * (held - self.service_time)
+        self.running -= 1
+        self.completed += 1
+        self._leave(ticket.session)
+        self._wake()
+
+    def _wake(self):
+        """Hand free slots to waiting requests, one session at a time"""
+        while self.running < self.max_concurrency and self._queues:
+            key, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            self._queued -= 1
+            if queue:
+                self._queues.move_to_end(key)
+            else:
+                del self._queues[key]
+            self.running += 1
+            self.admitted += 1
+            queue_wait = time.perf_counter() - waiter.enqueued_at
+            ADMISSION_QUEUE_SECONDS.observe(queue_wait)
+            waiter.future.set_result(Ticket(self, key, asyncio.get_running_loop(), queue_wait))
+
+    @asynccontextmanager
+    async def admit(self, session: Optional[str] = None):
+        ticket = await self.acquire(session)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    def snapshot(self) -> dict:
+        return {
+            "running": self.running,
+            "queue_depth": self._queued,
+            "max_queue_depth": self.max_queue_depth_seen,
+            "admitted": self.admitted,
+            "completed": self.completed,
+            "rejected": dict(self.rejected),
+            "estimated_wait_ms": 1000 * self.estimated_wait(),
+            "avg_service_ms": 1000 * self.service_time,
+        }
+
+
+def register_gauges(controller: AdmissionController):
+    """Expose the controller's queue depth and running count on /metrics"""
+    REGISTRY.register(Gauge(
+        "chat_admission_queue_depth", "Chat requests waiting for a generation slot", lambda: controller.queue_depth,
+    ))
+    REGISTRY.register(Gauge(
+        "chat_admission_running", "Chat requests holding a generation slot", lambda: controller.running,
+    ))
+
+
+def release_after(events: Iterator, ticket: Ticket) -> Iterator:
+    """Hold `ticket` until a streamed response has been sent"""
+    try:
+        yield from events
+    finally:
+        ticket.release()
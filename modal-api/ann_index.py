@@ -0,0 +1,172 @@
+"""FAISS index types for dense retrieval, with their metric recorded on disk
+
+`build_rag_index.py` writes `faiss_index.bin` plus `faiss_index.json`, an
+`IndexSpec` saying which index type and metric the scores come from and
+whether the vectors were normalised. Retrieval uses it to turn FAISS
+distances into "higher is better" similarities before thresholding, so
+an L2 index is never compared against the inner-product threshold.
+
+Supported types:
+
+    flat      exact search (the default, and what older RAG dirs contain)
+    hnsw      graph search; `ef_search` trades recall for latency
+    ivf_flat  inverted lists over full vectors; `nprobe` lists are scanned
+    ivf_pq    inverted lists over product-quantised vectors (smallest)
+
+RAG directories without `faiss_index.json` get a spec inferred from the
+index itself.
+"""
+import json
+import math
+import os
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+METRICS = ("ip", "l2")
+SPEC_FILENAME = "faiss_index.json"
+
+
+@dataclass
+class IndexSpec:
+    index_type: str = "flat"
+    metric: str = "ip"
+    # Vectors were L2-normalised, so scores map onto cosine similarity
+    normalized: bool = True
+    nlist: Optional[int] = None  # IVF lists; default 4 * sqrt(n)
+    pq_m: int = 48  # IVF-PQ sub-quantizers; must divide the dimension
+    pq_nbits: int = 8
+    hnsw_m: int = 32
+    ef_construction: int = 200
+    # Search-time defaults, overridable per retriever
+    nprobe: int = 16
+    ef_search: int = 64
+
+    def __post_init__(self):
+        if self.index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type {self.index_type!r}; expected one of {INDEX_TYPES}")
+        if self.metric not in METRICS:
+            raise ValueError(f"Unknown metric {self.metric!r}; expected one of {METRICS}")
+
+    @property
+    def is_ivf(self) -> bool:
+        return self.index_type.startswith("ivf")
+
+    def to_similarity(self, distances):
+        """FAISS scores as similarities where higher is better
+
+        Inner products already are. Squared L2 distances between unit
+        vectors become cosine similarity (1 - d/2); unnormalised L2
+        distances are negated.
+        """
+        if self.metric == "ip":
+            return distances
+        if self.normalized:
+            return 1.0 - distances / 2.0
+        return -distances
+
+    def search_params(self, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+        """Per-call FAISS search parameters, or None for flat indexes"""
+        import faiss
+
+        if self.is_ivf:
+            return faiss.SearchParametersIVF(nprobe=nprobe or self.nprobe)
+        if self.index_type == "hnsw":
+            return faiss.SearchParametersHNSW(efSearch=ef_search or self.ef_search)
+        return None
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump(asdict(self), f, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> "IndexSpec":
+        with open(path) as f:
+            return cls(**json.load(f))
+
+    @classmethod
+    def from_index(cls, index) -> "IndexSpec":
+        """Best guess for indexes built before specs were written"""
+        import faiss
+
+        index = faiss.downcast_index(index)
+        metric = "ip" if index.metric_type == faiss.METRIC_INNER_PRODUCT else "l2"
+        name = type(index).__name__
+        if name.startswith("IndexHNSW"):
+            return cls("hnsw", metric)
+        if name == "IndexIVFPQ":
+            return cls("ivf_pq", metric, nlist=index.nlist)
+        if name.startswith("IndexIVF"):
+            return cls("ivf_flat", metric, nlist=index.nlist)
+        return cls("flat", metric)
+
+
+def _largest_divisor(n: int, limit: int) -> int:
+    return max(d for d in range(1, min(n, limit) + 1) if n % d == 0)
+
+
+def build_ann_index(vectors, spec: IndexSpec):
+    """Build (and train, for IVF) an index of `spec`'s type over `vectors`
+
+    Parameters that do not fit the data (more lists than vectors, a PQ
+    size that does not divide the dimension) are adjusted, and `spec` is
+    updated to what was actually built.
+    """
+    import faiss
+
+    n, dim = vectors.shape
+    metric = faiss.METRIC_INNER_PRODUCT if spec.metric == "ip" else faiss.METRIC_L2
+    if spec.index_type == "flat":
+        index = faiss.IndexFlatIP(dim) if spec.metric == "ip" else faiss.IndexFlatL2(dim)
+    elif spec.index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, spec.hnsw_m, metric)
+        index.hnsw.efConstruction = spec.ef_construction
+    else:
+        # k-means needs at least one point per list (and per PQ centroid)
+        nlist = max(1, min(spec.nlist or int(4 * math.sqrt(n)), n))
+        spec.nlist = nlist
+        quantizer = faiss.IndexFlatIP(dim) if spec.metric == "ip" else faiss.IndexFlatL2(dim)
+        if spec.index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, metric)
+        else:
+            spec.pq_m = _largest_divisor(dim, spec.pq_m)
+            spec.pq_nbits = max(1, min(spec.pq_nbits, int(math.log2(max(n, 2)))))
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, spec.pq_m, spec.pq_nbits, metric)
+        index.train(vectors)
+    if n:
+        index.add(vectors)
+    return index
+
+
+def save_index(index, spec: IndexSpec, directory: str, name: str = "faiss_index.bin"):
+    import faiss
+
+    faiss.write_index(index, os.path.join(directory, name))
+    spec.save(os.path.join(directory, SPEC_FILENAME))
+
+
+def load_index(directory: str, name: str = "faiss_index.bin", mmap: bool = True):
+    """Return (index, spec); the index is memory-mapped read-only when possible"""
+    import faiss
+
+    path = os.path.join(directory, name)
+    index = None
+    if mmap:
+        try:
+            index = faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            # Not every index type can be memory-mapped
+            pass
+    if index is None:
+        index = faiss.read_index(path)
+
+    spec_path = os.path.join(directory, SPEC_FILENAME)
+    spec = IndexSpec.load(spec_path) if os.path.exists(spec_path) else IndexSpec.from_index(index)
+    return index, spec
+
+
+def index_memory_bytes(index) -> int:
+    """Size of the serialised index, a close proxy for its resident memory"""
+    import faiss
+
+    return int(faiss.serialize_index(index).nbytes)
@@ -0,0 +1,186 @@
+import asyncio
+import copy
+import time
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+from timing import record_generation
+
+
+class HFBatchGenerator:
+    """Runs one left-padded `model.generate` call for a list of prompts
+
+    A lone prompt goes through `assisted` (speculative decoding with a draft
+    model) when given; assisted generation only handles one sequence.
+    """
+
+    def __init__(self, model, tokenizer, prefix_cache=None, assisted=None, **generation_kwargs):
+        self.model = model
+        # Decoder-only models need left padding so every row ends at the
+        # same position and new tokens are appended directly after it. A
+        # private copy keeps that from leaking into the tokenizer the rest
+        # of the pipeline shares (the padding_side call argument only
+        # exists in recent transformers releases)
+        self.tokenizer = copy.deepcopy(tokenizer)
+        self.tokenizer.padding_side = "left"
+        self.prefix_cache = prefix_cache
+        self.assisted = assisted
+        self.generation_kwargs = generation_kwargs
+
+    def __call__(self, prompts: List[str]) -> List[str]:
+        # A lone prompt has no padding, so it can start from the shared
+        # system-prompt cache
+        if len(prompts) == 1 and self.prefix_cache is not None:
+            inputs = self.prefix_cache.prepare(prompts[0])
+        else:
+            inputs = self.tokenizer(prompts, return_tensors="pt", padding=True).to(self.model.device)
+        generate = self.assisted.generate if self.assisted is not None and len(prompts) == 1 else self.model.generate
+        start = time.perf_counter()
+        outputs = generate(**inputs, **self.generation_kwargs)
+        elapsed = time.perf_counter() - start
+        new_tokens = outputs[:, inputs["input_ids"].shape[1]:]
+        self._record(inputs, new_tokens, elapsed)
+        return self.tokenizer.batch_decode(new_tokens, skip_special_tokens=True)
+
+    def _record(self, inputs, new_tokens, elapsed: float):
+        prompt_lengths = inputs["attention_mask"].sum(dim=1).tolist()
+        generated = (new_tokens != self.generation_kwargs.get("pad_token_id", -1)).sum(dim=1).tolist()
+        for prompt_tokens, new_count in zip(prompt_lengths, generated):
+            record_generation(int(prompt_tokens), int(new_count), elapsed)
+
+
+class StubBatchGenerator:
+    """CPU stand-in for a batched generate call
+
+    Costs `batch_latency` seconds per call regardless of batch size, which
+    is roughly how a single GPU forward pass behaves for small batches.
+    """
+
+    def __init__(self, batch_latency: float = 0.05):
+        self.batch_latency = batch_latency
+        self.batch_sizes: List[int] = []
+
+    def __call__(self, prompts: List[str]) -> List[str]:
+        self.batch_sizes.append(len(prompts))
+        time.sleep(self.batch_latency)
+        return [f"Answer to: {prompt}" for prompt in prompts]
+
+
+@dataclass
+class _PendingRequest:
+    prompt: str
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+@dataclass
+class BatchMetrics:
+    requests: int = 0
+    batches: int = 0
+    max_batch_size_seen: int = 0
+    total_queue_wait: float = 0.0
+    max_queue_wait: float = 0.0
+    total_generate_time: float = 0.0
+    started_at: float = field(default_factory=time.perf_counter)
+
+    def record(self, queue_waits: List[float], generate_time: float):
+        self.requests += len(queue_waits)
+        self.batches += 1
+        self.max_batch_size_seen = max(self.max_batch_size_seen, len(queue_waits))
+        self.total_queue_wait += sum(queue_waits)
+        self.max_queue_wait = max(self.max_queue_wait, max(queue_waits))
+        self.total_generate_time += generate_time
+
+    def snapshot(self) -> dict:
+        elapsed = time.perf_counter() - self.started_at
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "avg_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size_seen,
+            "avg_queue_wait_ms": 1000 * self.total_queue_wait / self.requests if self.requests else 0.0,
+            "max_queue_wait_ms": 1000 * self.max_queue_wait,
+            "avg_generate_ms": 1000 * self.total_generate_time / self.batches if self.batches else 0.0,
+            "throughput_rps": self.requests / elapsed if elapsed else 0.0,
+        }
+
+
+class BatchScheduler:
+    """Groups concurrent prompts into batched generate calls
+
+    Waits up to `max_wait_ms` after the first pending prompt (or until
+    `max_batch_size` prompts are queued), runs `generate_batch` once in a
+    worker thread, and resolves each caller's future with its own output.
+    """
+
+    def __init__(
+        self,
+        generate_batch: Callable[[List[str]], List[str]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 20.0,
+    ):
+        self.generate_batch = generate_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.metrics = BatchMetrics()
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, prompt: str) -> str:
+        """Queue a prompt and wait for its generated text"""
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_PendingRequest(prompt, future))
+        return await future
+
+    async def _collect_batch(self) -> List[_PendingRequest]:
+        batch = [await self._queue.get()]
+        deadline = batch[0].enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            # Requests that queued up while the previous batch was running
+            # are taken immediately, even if their window has passed
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect_batch()
+            started = time.perf_counter()
+            queue_waits = [started - request.enqueued_at for request in batch]
+            try:
+                outputs = await asyncio.to_thread(
+                    self.generate_batch, [request.prompt for request in batch]
+                )
+            except Exception as e:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                continue
+
+            self.metrics.record(queue_waits, time.perf_counter() - started)
+            for request, output in zip(batch, outputs):
+                if not request.future.done():
+                    request.future.set_result(output)
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
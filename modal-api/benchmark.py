@@ -0,0 +1,488 @@
+"""Offline benchmarks for retrieval and generation
+
+Runs the real `ChatPipeline` code on CPU against a synthetic corpus:
+chunks of generated text, a FAISS inner-product index over hashed
+bag-of-words embeddings, a BM25 index, and the tiny random Llama from
+tiny_llm.py. Nothing is downloaded, so runs are reproducible anywhere.
+
+    python benchmark.py --output bench.json
+    python benchmark.py --output new.json --baseline bench.json --max-regression 0.2
+    python benchmark.py --skip-generation --embeddings sentence-transformers/all-MiniLM-L6-v2
+
+With --baseline, latencies (`*_ms`) that grew and throughputs (`rps`) that
+dropped by more than --max-regression are reported and the exit status is 1.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import sys
+import time
+import zlib
+from typing import Dict, List
+
+from chat_pipeline import ChatPipeline
+from chunk_store import JsonChunkLookup
+from evaluate_retrieval import percentile
+from hybrid_retrieval import BM25Index, RETRIEVAL_MODES
+
+DOMAIN_WORDS = [
+    "library", "course", "accommodation", "fees", "campus", "student", "exam",
+    "module", "lecture", "research", "scholarship", "graduation", "enrolment",
+    "placement", "timetable", "support", "wellbeing", "careers", "sport", "hours",
+]
+
+
+class HashingEmbedder:
+    """Deterministic bag-of-words embeddings with the MiniLM interface
+
+    Each token maps to a fixed random unit vector (seeded by its CRC32), and
+    a text is the normalised sum of its token vectors. Texts sharing words
+    land close together, which is all a latency benchmark needs.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self._token_vectors: Dict[str, object] = {}
+
+    def _token_vector(self, token: str):
+        import numpy as np
+
+        vector = self._token_vectors.get(token)
+        if vector is None:
+            rng = np.random.default_rng(zlib.crc32(token.encode("utf-8")))
+            vector = rng.standard_normal(self.dim).astype(np.float32)
+            self._token_vectors[token] = vector
+        return vector
+
+    def encode(self, texts: List[str]):
+        import numpy as np
+
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in text.lower().split():
+                vectors[row] += self._token_vector(token)
+            norm = np.linalg.norm(vectors[row])
+            if norm:
+                vectors[row] /= norm
+        return vectors
+
+
+def synthetic_corpus(num_chunks: int, words_per_chunk: int = 150, seed: int = 0) -> List[dict]:
+    rng = random.Random(seed)
+    syllables = ["ka", "lo", "mi", "ren", "tu", "sha", "vor", "el", "dan", "qui", "bro", "ne"]
+    vocabulary = DOMAIN_WORDS + [
+        "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) for _ in range(3000)
+    ]
+    return [
+        {
+            "text": " ".join(rng.choice(vocabulary) for _ in range(words_per_chunk)),
+            "source_document": f"https://www.hull.ac.uk/synthetic/{i // 4}",
+        }
+        for i in range(num_chunks)
+    ]
+
+
+def synthetic_queries(chunks: List[dict], count: int, seed: int = 1) -> List[str]:
+    """Questions built from words of random chunks, so every query has hits"""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        words = rng.choice(chunks)["text"].split()
+        queries.append("What about " + " ".join(rng.sample(words, 5)) + "?")
+    return queries
+
+
+def build_pipeline(num_chunks: int, seed: int = 0) -> ChatPipeline:
+    import faiss
+
+    chunks = synthetic_corpus(num_chunks, seed=seed)
+    embedder = HashingEmbedder()
+    embeddings = embedder.encode([chunk["text"] for chunk in chunks])
+    faiss_index = faiss.IndexFlatIP(embedder.dim)
+    faiss_index.add(embeddings)
+
+    pipeline = ChatPipeline()
+    bm25_index = BM25Index.build((i, chunk["text"]) for i, chunk in enumerate(chunks))
+    pipeline.attach_rag(embedder, faiss_index, JsonChunkLookup({str(i): c for i, c in enumerate(chunks)}), bm25_index)
+    # Every benchmark query must take the full path, never the answer cache
+    pipeline.answer_cache.threshold = float("inf")
+    return pipeline
+
+
+def summarize(latencies: List[float], elapsed: float) -> dict:
+    """Latency percentiles in ms and throughput for a list of durations in seconds"""
+    return {
+        "count": len(latencies),
+        "mean_ms": 1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+        "p50_ms": 1000 * percentile(latencies, 50),
+        "p95_ms": 1000 * percentile(latencies, 95),
+        "p99_ms": 1000 * percentile(latencies, 99),
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+    }
+
+
+def bench_retrieval(pipeline: ChatPipeline, queries: List[str], k: int = 5) -> dict:
+    results = {}
+    default_mode = pipeline.retriever.mode
+    for mode in RETRIEVAL_MODES:
+        pipeline.retriever.mode = mode
+        pipeline.retrieve_context(queries[0], k)  # warm-up
+        latencies = []
+        start = time.perf_counter()
+        for query in queries:
+            query_start = time.perf_counter()
+            pipeline.retrieve_context(query, k)
+            latencies.append(time.perf_counter() - query_start)
+        results[mode] = summarize(latencies, time.perf_counter() - start)
+    pipeline.retriever.mode = default_mode
+    return results
+
+
+def bench_generate(pipeline: ChatPipeline, prompts: List[str], concurrency: int) -> dict:
+    pipeline.generate(prompts[0])  # warm-up
+    latencies = []
+    start = time.perf_counter()
+    for prompt in prompts:
+        prompt_start = time.perf_counter()
+        pipeline.generate(prompt)
+        latencies.append(time.perf_counter() - prompt_start)
+    results = {"sequential": summarize(latencies, time.perf_counter() - start)}
+
+    async def run_concurrent():
+        queue = list(prompts)
+        async_latencies = []
+
+        async def worker():
+            while queue:
+                prompt = queue.pop()
+                prompt_start = time.perf_counter()
+                await pipeline.generate_async(prompt)
+                async_latencies.append(time.perf_counter() - prompt_start)
+
+        concurrent_start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - concurrent_start
+        await pipeline.scheduler.close()
+        return async_latencies, elapsed
+
+    async_latencies, elapsed = asyncio.run(run_concurrent())
+    results[f"batched_concurrency_{concurrency}"] = summarize(async_latencies, elapsed)
+    results["batching"] = pipeline.scheduler.metrics.snapshot()
+    return results
+
+
+def bench_embeddings(model_id: str, queries: List[str], concurrency: int) -> dict:
+    """fp32 vs int8 MiniLM on CPU: per-query latency, concurrent throughput, agreement"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    from embedding_engine import MiniLMEncoder, QueryEmbeddingEngine, embedding_agreement
+
+    fp32 = MiniLMEncoder.from_pretrained(model_id, quantize=False)
+    encoders = {"fp32": fp32, "int8": fp32.quantize()}
+    results = {"int8_min_cosine": embedding_agreement(fp32, encoders["int8"], queries)}
+    for name, encoder in encoders.items():
+        encoder(queries[:1])  # warm-up
+        latencies = []
+        start = time.perf_counter()
+        for query in queries:
+            query_start = time.perf_counter()
+            encoder([query])
+            latencies.append(time.perf_counter() - query_start)
+        results[f"{name}_single"] = summarize(latencies, time.perf_counter() - start)
+
+        # Concurrent single-query requests through the batching engine, no cache
+        engine = QueryEmbeddingEngine(encoder, cache_size=0)
+        engine_latencies = []
+
+        def embed(query):
+            query_start = time.perf_counter()
+            engine.encode([query])
+            engine_latencies.append(time.perf_counter() - query_start)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(embed, queries))
+        results[f"{name}_batched_concurrency_{concurrency}"] = summarize(engine_latencies, time.perf_counter() - start)
+    return results
+
+
+def bench_speculative(prompts: List[str], max_new_tokens: int = 64, seed: int = 0) -> dict:
+    """Plain vs assisted decoding of a larger tiny model on CPU
+
+    The weights are random, so no real draft model exists: an exact copy
+    of the main model shows the best case (every draft accepted, but the
+    draft costs as much as the main model), and a small random model the
+    worst (nothing accepted). Real speedups depend on a draft that is both
+    much cheaper and usually right, and sit between the two.
+    """
+    import copy
+
+    from speculative import AssistedDecoding
+    from tiny_llm import build_tiny_model
+
+    model, tokenizer = build_tiny_model(hidden_size=256, num_hidden_layers=8, seed=seed)
+    drafts = {"copy": copy.deepcopy(model), "small": build_tiny_model(seed=seed + 1)[0]}
+    kwargs = dict(max_new_tokens=max_new_tokens, min_new_tokens=max_new_tokens, do_sample=False)
+
+    def run(generate) -> dict:
+        generate(**tokenizer(prompts[0]), **kwargs)  # warm-up
+        latencies = []
+        start = time.perf_counter()
+        for prompt in prompts:
+            prompt_start = time.perf_counter()
+            generate(**tokenizer(prompt), **kwargs)
+            latencies.append(time.perf_counter() - prompt_start)
+        return summarize(latencies, time.perf_counter() - start)
+
+    results = {"plain": run(model.generate)}
+    for name, draft in drafts.items():
+        assisted = AssistedDecoding(model, draft, confidence_threshold=0)
+        results[f"draft_{name}"] = run(assisted.generate)
+        results[f"draft_{name}"]["p50_speedup"] = results["plain"]["p50_ms"] / results[f"draft_{name}"]["p50_ms"]
+        # Back to back on the same prompts, so the wall-clock speedup
+        # is measured rather than inferred from the acceptance rate
+        results[f"draft_{name}"].update(assisted.compare([tokenizer(prompt) for prompt in prompts], **kwargs))
+    return results
+
+
+def bench_summaries(pipeline: ChatPipeline, prompts: List[str], turns: int = 20, keep: int = 4) -> dict:
+    """Prompt size and generate latency: full history vs summary + recent turns
+
+    Each prompt follows a `turns`-message conversation. The full request
+    sends the most recent MAX_HISTORY_MESSAGES turns; the summarised one
+    sends one summary of the older turns (written once, as the chat
+    backend does in the background) and the last `keep` messages. The
+    token budget is lifted so that neither prompt is trimmed: the tiny
+    model's byte tokenizer would otherwise cut both to the same size.
+    """
+    from chat_pipeline import Message
+
+    rng = random.Random(0)
+    words = next(iter(pipeline.document_lookup.lookup.values()))["text"].split()
+    history = [
+        Message(content=" ".join(rng.choices(words, k=20)), is_user=i % 2 == 0)
+        for i in range(turns)
+    ]
+    start = time.perf_counter()
+    summary = pipeline.summarize_messages(history[:-keep])
+    summarize_ms = 1000 * (time.perf_counter() - start)
+
+    budget, pipeline.packer.budget = pipeline.packer.budget, 1 << 16
+
+    def run(**kwargs) -> dict:
+        pipeline.generate(prompts[0], **kwargs)  # warm-up
+        latencies, prompt_tokens = [], []
+        start = time.perf_counter()
+        for prompt in prompts:
+            text, _ = pipeline.prepare_prompt(prompt, **kwargs)
+            prompt_tokens.append(len(pipeline.tokenizer.encode(text or "")))
+            prompt_start = time.perf_counter()
+            pipeline.generate(prompt, **kwargs)
+            latencies.append(time.perf_counter() - prompt_start)
+        return {**summarize(latencies, time.perf_counter() - start), "prompt_tokens": sum(prompt_tokens) / len(prompt_tokens)}
+
+    try:
+        results = {
+            "full_history": run(history=history),
+            "summary": run(history=history[-keep:], summary=summary),
+        }
+    finally:
+        pipeline.packer.budget = budget
+    results["summary"]["prompt_reduction"] = 1 - results["summary"]["prompt_tokens"] / results["full_history"]["prompt_tokens"]
+    results["summary"]["speedup"] = results["full_history"]["p50_ms"] / results["summary"]["p50_ms"]
+    results["summarize_ms"] = summarize_ms
+    return results
+
+
+def bench_overload(
+    rate: float,
+    duration: float = 5.0,
+    batch_latency: float = 0.1,
+    max_batch_size: int = 4,
+    max_queue: int = 16,
+    deadline: float = 1.0,
+) -> dict:
+    """Open-loop arrivals at `rate` req/s on a stub model, with and without admission control
+
+    The stub generates a batch of up to `max_batch_size` prompts in
+    `batch_latency` seconds, so rates above about max_batch_size /
+    batch_latency overload it. Without admission control every request is
+    eventually served and latency grows for as long as the overload lasts;
+    with it, the excess is rejected and served requests stay within
+    `deadline`.
+    """
+    from admission import AdmissionController, Rejected
+    from batching import BatchScheduler, StubBatchGenerator
+
+    async def run(controller) -> dict:
+        scheduler = BatchScheduler(StubBatchGenerator(batch_latency), max_batch_size=max_batch_size, max_wait_ms=10)
+        latencies, rejected = [], 0
+
+        async def request(i: int):
+            nonlocal rejected
+            start = time.perf_counter()
+            try:
+                if controller is None:
+                    await scheduler.submit(f"question {i}")
+                else:
+                    async with controller.admit():
+                        await scheduler.submit(f"question {i}")
+            except Rejected:
+                rejected += 1
+                return
+            latencies.append(time.perf_counter() - start)
+
+        tasks = []
+        start = time.perf_counter()
+        for i in range(int(rate * duration)):
+            await asyncio.sleep(max(0.0, start + i / rate - time.perf_counter()))
+            tasks.append(asyncio.create_task(request(i)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+        await scheduler.close()
+        result = {**summarize(latencies, elapsed), "offered": len(tasks), "rejected": rejected}
+        if controller is not None:
+            result["max_queue_depth"] = controller.snapshot()["max_queue_depth"]
+        return result
+
+    # Two batches' worth: one generating while the next is collected
+    controller = AdmissionController(
+        2 * max_batch_size, max_queue=max_queue, deadline=deadline, service_time=batch_latency
+    )
+    return {
+        "no_admission_control": asyncio.run(run(None)),
+        "admission_control": asyncio.run(run(controller)),
+        "capacity_rps": max_batch_size / batch_latency,
+    }
+
+
+def find_regressions(
+    baseline, current, max_regression: float, min_delta_ms: float = 1.0, path: str = ""
+) -> List[str]:
+    """Metrics that got worse by more than `max_regression` (0.2 = 20%)
+
+    Latency changes under `min_delta_ms` are ignored as timer noise.
+    """
+    regressions = []
+    for key, new in current.items():
+        old = baseline.get(key) if isinstance(baseline, dict) else None
+        name = f"{path}.{key}" if path else key
+        if isinstance(new, dict) and isinstance(old, dict):
+            regressions.extend(find_regressions(old, new, max_regression, min_delta_ms, name))
+        elif not isinstance(new, (int, float)) or not isinstance(old, (int, float)) or not old:
+            continue
+        elif key.endswith("_ms") and new > old * (1 + max_regression) and new - old >= min_delta_ms:
+            regressions.append(f"{name}: {old:.2f} -> {new:.2f} ms")
+        elif key == "rps" and new < old * (1 - max_regression):
+            regressions.append(f"{name}: {old:.1f} -> {new:.1f} req/s")
+    return regressions
+
+
+def print_table(title: str, results: Dict[str, dict]):
+    print(f"\n{title}")
+    print(f"{'':<26} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9}")
+    for name, stats in results.items():
+        if isinstance(stats, dict) and "p50_ms" in stats:
+            print(
+                f"{name:<26} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} "
+                f"{stats['p99_ms']:>9.2f} {stats['rps']:>9.1f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline retrieval and generation benchmarks")
+    parser.add_argument("--chunks", type=int, default=5000, help="Synthetic corpus size")
+    parser.add_argument("--queries", type=int, default=200, help="Retrieval queries per mode")
+    parser.add_argument("--prompts", type=int, default=16, help="Generation prompts")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent batched generations")
+    parser.add_argument("--skip-generation", action="store_true")
+    parser.add_argument("--embeddings", metavar="MODEL_ID", help="Also compare fp32 and int8 query embeddings (downloads the model)")
+    parser.add_argument("--speculative", action="store_true", help="Also compare plain and assisted decoding")
+    parser.add_argument("--overload", type=float, metavar="RATE", help="Also offer RATE req/s to a stub model, with and without admission control")
+    parser.add_argument("--overload-seconds", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--baseline", help="Earlier results JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="Ignore smaller latency changes")
+    args = parser.parse_args()
+
+    import torch
+
+    build_start = time.perf_counter()
+    pipeline = build_pipeline(args.chunks, seed=args.seed)
+    build_s = time.perf_counter() - build_start
+    queries = synthetic_queries(list(pipeline.document_lookup.lookup.values()), args.queries, seed=args.seed + 1)
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "machine": platform.machine(),
+            "args": vars(args),
+            "index_build_s": build_s,
+        },
+        "retrieve_context": bench_retrieval(pipeline, queries),
+    }
+    print_table(f"retrieve_context over {args.chunks} chunks", results["retrieve_context"])
+
+    if args.embeddings:
+        results["embed_query"] = bench_embeddings(args.embeddings, queries, args.concurrency)
+        print_table("embed_query (CPU)", results["embed_query"])
+        print(f"int8 vs fp32 lowest cosine: {results['embed_query']['int8_min_cosine']:.4f}")
+
+    if not args.skip_generation:
+        from tiny_llm import build_tiny_model
+
+        torch.manual_seed(args.seed)
+        pipeline.setup_generation(*build_tiny_model(seed=args.seed))
+        results["generate"] = bench_generate(pipeline, queries[: args.prompts], args.concurrency)
+        print_table("generate (tiny model, CPU)", results["generate"])
+        results["summaries"] = bench_summaries(pipeline, queries[: args.prompts])
+        print_table("long conversations (tiny model, CPU)", results["summaries"])
+        stats = results["summaries"]["summary"]
+        print(f"summary: {stats['prompt_reduction']:.0%} fewer prompt tokens, {stats['speedup']:.2f}x faster; "
+              f"writing it took {results['summaries']['summarize_ms']:.0f} ms (off the request path)")
+
+    if args.speculative:
+        results["speculative"] = bench_speculative(queries[: args.prompts], seed=args.seed)
+        print_table("assisted decoding (tiny models, CPU)", results["speculative"])
+        for name in ("draft_copy", "draft_small"):
+            stats = results["speculative"][name]
+            print(
+                f"{name}: acceptance {stats['acceptance_rate']:.2f}, "
+                f"{stats['tokens_per_main_pass']:.2f} tokens per main pass, "
+                f"{stats['speedup']:.2f}x wall-clock vs plain generate "
+                f"({stats['plain_ms']:.0f} ms -> {stats['assisted_ms']:.0f} ms)"
+            )
+
+    if args.overload:
+        results["overload"] = bench_overload(args.overload, args.overload_seconds)
+        print_table(f"{args.overload:.0f} req/s offered to a stub model ({results['overload']['capacity_rps']:.0f} req/s capacity)", results["overload"])
+        for name in ("no_admission_control", "admission_control"):
+            stats = results["overload"][name]
+            print(f"{name}: served {stats['count']} of {stats['offered']}, rejected {stats['rejected']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        baseline.pop("meta", None)
+        current = {key: value for key, value in results.items() if key != "meta"}
+        regressions = find_regressions(baseline, current, args.max_regression, args.min_delta_ms)
+        if regressions:
+            print(f"\nRegressions beyond {args.max_regression:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.max_regression:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
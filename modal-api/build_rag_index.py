@@ -0,0 +1,265 @@
+"""Build `faiss_index.bin` and the chunk lookup from source documents
+
+Documents are streamed from a directory of `.txt`/`.md`/`.html` files and/or
+JSONL files with `{"source_document": ..., "text": ...}` records, split
+into overlapping chunks and content-hashed. Embeddings are cached by chunk
+hash next to the output, so a rebuild only embeds chunks that are new or
+changed; those are embedded in batches across a process pool.
+
+The output directory gets the files `ChatPipeline.load_rag` reads:
+
+    faiss_index.bin        index over normalised MiniLM vectors (flat inner product by default)
+    faiss_index.json       index type and metric of faiss_index.bin (see ann_index.py)
+    document_lookup.json   {faiss_id: {"text", "source_document"}}
+    document_chunks.bin    the same lookup as a memory-mapped chunk store
+    bm25_index.npz         sparse BM25 index over the same chunks
+
+Usage:
+
+    python build_rag_index.py pages/ scraped.jsonl --output rag/
+    python build_rag_index.py pages/ --output rag/ --index-type hnsw
+"""
+import argparse
+import hashlib
+import html
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ann_index import INDEX_TYPES, METRICS, IndexSpec, build_ann_index, save_index
+from chunk_store import write_chunk_store
+from hybrid_retrieval import BM25Index
+
+EMBEDDING_MODEL_ID = "all-MiniLM-L6-v2"
+CACHE_FILENAME = "embedding_cache.npz"
+TEXT_EXTENSIONS = (".txt", ".md", ".html", ".htm")
+
+
+@dataclass
+class Chunk:
+    text: str
+    source_document: str
+    content_hash: str
+
+
+def iter_documents(paths: List[str]) -> Iterator[Tuple[str, str]]:
+    """Yield `(source_document, text)` pairs one document at a time"""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in sorted(os.walk(path)):
+                for name in sorted(files):
+                    file_path = os.path.join(root, name)
+                    if name.endswith(".jsonl"):
+                        yield from iter_documents([file_path])
+                    elif name.endswith(TEXT_EXTENSIONS):
+                        with open(file_path, "r", encoding="utf-8") as f:
+                            text = f.read()
+                        if name.endswith((".html", ".htm")):
+                            text = html.unescape(re.sub(r"<[^>]+>", " ", text))
+                        yield os.path.relpath(file_path, path), text
+        elif path.endswith(".jsonl"):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        yield record["source_document"], record["text"]
+        else:
+            raise ValueError(f"Unsupported source: {path}")
+
+
+def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
+    """Split text into whitespace-aligned chunks of roughly `chunk_size` chars"""
+    words = text.split()
+    chunks = []
+    start = 0
+    while start < len(words):
+        length = 0
+        end = start
+        while end < len(words) and length + len(words[end]) + 1 <= chunk_size:
+            length += len(words[end]) + 1
+            end += 1
+        end = max(end, start + 1)
+        chunks.append(" ".join(words[start:end]))
+        if end >= len(words):
+            break
+
+        # Step back so consecutive chunks share about `overlap` characters
+        back = 0
+        next_start = end
+        while next_start > start + 1 and back < overlap:
+            next_start -= 1
+            back += len(words[next_start]) + 1
+        start = next_start
+    return chunks
+
+
+def iter_chunks(documents: Iterable[Tuple[str, str]], chunk_size: int, overlap: int) -> Iterator[Chunk]:
+    for source_document, text in documents:
+        for piece in chunk_text(text, chunk_size, overlap):
+            digest = hashlib.sha256(piece.encode("utf-8")).hexdigest()
+            yield Chunk(piece, source_document, digest)
+
+
+def load_embedding_cache(path: str) -> Dict[str, "object"]:
+    import numpy as np
+
+    if not os.path.exists(path):
+        return {}
+    data = np.load(path)
+    return dict(zip(data["hashes"].tolist(), data["vectors"]))
+
+
+def save_embedding_cache(path: str, cache: Dict[str, "object"]):
+    import numpy as np
+
+    hashes = sorted(cache)
+    vectors = np.stack([cache[h] for h in hashes]) if hashes else np.zeros((0, 0), dtype=np.float32)
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, hashes=np.array(hashes), vectors=vectors)
+    os.replace(tmp_path, path)
+
+
+_worker_model = None
+
+
+def _init_worker(model_id: str):
+    global _worker_model
+    from sentence_transformers import SentenceTransformer
+
+    _worker_model = SentenceTransformer(model_id, device="cpu")
+
+
+def _embed_batch(texts: List[str]):
+    return _worker_model.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+
+
+def embed_with_process_pool(
+    texts: List[str],
+    batch_size: int = 64,
+    workers: Optional[int] = None,
+    model_id: str = EMBEDDING_MODEL_ID,
+):
+    """Embed texts in batches, one SentenceTransformer per worker process"""
+    import numpy as np
+
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    workers = min(workers or os.cpu_count() or 1, len(batches))
+    if workers <= 1:
+        _init_worker(model_id)
+        results = [_embed_batch(batch) for batch in batches]
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(model_id,)) as pool:
+            results = list(pool.map(_embed_batch, batches))
+    return np.concatenate(results).astype("float32")
+
+
+def build_index(
+    sources: List[str],
+    output_dir: str,
+    chunk_size: int = 1000,
+    overlap: int = 200,
+    embed: Optional[Callable[[List[str]], "object"]] = None,
+    index_spec: Optional[IndexSpec] = None,
+) -> dict:
+    """Build the index and lookup, re-embedding only new or changed chunks
+
+    `embed` maps a list of texts to a float32 matrix; it defaults to
+    `embed_with_process_pool`. `index_spec` picks the FAISS index type
+    (flat inner product by default). Returns a summary of the build.
+    """
+    import faiss
+    import numpy as np
+
+    embed = embed or embed_with_process_pool
+    started = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    cache_path = os.path.join(output_dir, CACHE_FILENAME)
+    cache = load_embedding_cache(cache_path)
+
+    # Identical chunks (boilerplate repeated across pages) are kept once
+    chunks: List[Chunk] = []
+    seen = set()
+    for chunk in iter_chunks(iter_documents(sources), chunk_size, overlap):
+        key = (chunk.content_hash, chunk.source_document)
+        if key not in seen:
+            seen.add(key)
+            chunks.append(chunk)
+
+    missing = list({chunk.content_hash: chunk.text for chunk in chunks if chunk.content_hash not in cache}.items())
+    if missing:
+        vectors = embed([text for _, text in missing])
+        for (content_hash, _), vector in zip(missing, vectors):
+            cache[content_hash] = vector
+
+    # Drop cache entries for chunks that no longer exist
+    live_hashes = {chunk.content_hash for chunk in chunks}
+    cache = {h: v for h, v in cache.items() if h in live_hashes}
+    save_embedding_cache(cache_path, cache)
+
+    index_spec = index_spec or IndexSpec()
+    if chunks:
+        matrix = np.stack([cache[chunk.content_hash] for chunk in chunks]).astype("float32")
+        faiss.normalize_L2(matrix)
+    else:
+        # Nothing to train an IVF index on
+        matrix = np.zeros((0, 384), dtype="float32")
+        index_spec = IndexSpec(metric=index_spec.metric)
+    save_index(build_ann_index(matrix, index_spec), index_spec, output_dir)
+    lookup = {
+        str(i): {"text": chunk.text, "source_document": chunk.source_document}
+        for i, chunk in enumerate(chunks)
+    }
+    with open(os.path.join(output_dir, "document_lookup.json"), "w") as f:
+        json.dump(lookup, f)
+    write_chunk_store(
+        os.path.join(output_dir, "document_chunks.bin"),
+        ((i, chunk.text, chunk.source_document) for i, chunk in enumerate(chunks)),
+    )
+
+    BM25Index.build((i, chunk.text) for i, chunk in enumerate(chunks)).save(
+        os.path.join(output_dir, "bm25_index.npz")
+    )
+
+    return {
+        "chunks": len(chunks),
+        "embedded": len(missing),
+        "reused": len(chunks) - len(missing),
+        "index": index_spec.index_type,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the RAG FAISS index and chunk lookup")
+    parser.add_argument("sources", nargs="+", help="Directories of text/HTML files or JSONL files")
+    parser.add_argument("--output", default="rag", help="Output directory (default: rag)")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--overlap", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=None, help="Embedding processes (default: CPU count)")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat")
+    parser.add_argument("--metric", choices=METRICS, default="ip")
+    parser.add_argument("--nlist", type=int, default=None, help="IVF lists (default: 4 * sqrt(chunks))")
+    parser.add_argument("--pq-m", type=int, default=48, help="IVF-PQ sub-quantizers")
+    parser.add_argument("--hnsw-m", type=int, default=32, help="HNSW neighbours per node")
+    args = parser.parse_args()
+
+    summary = build_index(
+        args.sources,
+        args.output,
+        chunk_size=args.chunk_size,
+        overlap=args.overlap,
+        embed=lambda texts: embed_with_process_pool(texts, args.batch_size, args.workers),
+        index_spec=IndexSpec(
+            args.index_type, args.metric, nlist=args.nlist, pq_m=args.pq_m, hnsw_m=args.hnsw_m
+        ),
+    )
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,677 @@
+"""RAG chat pipeline: intent routing, retrieval, prompt packing and generation
+
+Everything here is independent of Modal, so the same code serves the
+deployed `Model` in simple_llm.py and runs locally in tests and benchmarks
+with a tiny model and a synthetic index.
+"""
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from admission import AdmissionController
+from ann_index import load_index
+from batching import BatchScheduler, HFBatchGenerator
+from chunk_store import ChunkStore, JsonChunkLookup
+from hybrid_retrieval import BM25Index, HybridRetriever
+from embedding_engine import MiniLMEncoder, QueryEmbeddingEngine, embedding_agreement
+from intent_router import DEFAULT_INTENTS, IntentRouter
+from prefix_cache import PrefixKVCache
+from prompt_packer import HISTORY_HEADING, PromptPacker
+from semantic_cache import SemanticCache
+from speculative import AssistedDecoding
+from startup import StartupReport, load_concurrently, submit_loaders
+from streaming import HFGeneratorBackend, sse_event, stream_chat_events
+from timing import current_timer, record_generation, span
+
+# System prompt shared by every generation
+SYSTEM_PROMPT = (
+    "You are a University of Hull assistant. Your role is to:\n"
+    "1. Provide accurate information from the context\n"
+    "2. Give clear, direct answers without greetings or meta-language\n"
+    "3. Keep responses concise and relevant\n"
+    "4. Say 'No specific information available' when unsure\n"
+    "5. Present lists and steps in a clear format"
+)
+
+# Constant start of every prompt; its key/value cache is computed once in
+# load() and reused by each generation
+PROMPT_PREFIX = f"<s>[INST] <<SYS>>\n{SYSTEM_PROMPT}\n\nContext:\n"
+
+# Sampling settings used for both blocking and streaming generation
+GENERATION_KWARGS = {
+    "max_new_tokens": 150,
+    "min_new_tokens": 10,
+    "temperature": 0.1,
+    "do_sample": True,
+    "top_p": 0.9,
+    "repetition_penalty": 1.2,
+}
+
+# Assisted decoding: a small draft model with the same tokenizer proposes
+# NUM_ASSISTANT_TOKENS tokens at a time for the main model to verify.
+# Empty disables it.
+DRAFT_MODEL_ID = os.environ.get("DRAFT_MODEL_ID", "")
+NUM_ASSISTANT_TOKENS = int(os.environ.get("NUM_ASSISTANT_TOKENS", "5"))
+
+# A streamed generation that produces no text for this long is abandoned
+STREAM_TOKEN_TIMEOUT = float(os.environ.get("STREAM_TOKEN_TIMEOUT", "60"))
+
+# Dynamic batching: concurrent requests are grouped for up to BATCH_WINDOW_MS
+# or until BATCH_MAX_SIZE prompts are queued, then generated together
+BATCHING_ENABLED = os.environ.get("BATCHING_ENABLED", "1") == "1"
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", "8"))
+BATCH_WINDOW_MS = float(os.environ.get("BATCH_WINDOW_MS", "20"))
+
+# Admission control (see admission.py): ADMISSION_MAX_CONCURRENCY requests
+# generate at once and up to ADMISSION_MAX_QUEUE wait; the rest, and any
+# request that cannot start within ADMISSION_DEADLINE_SECONDS, get 503 with
+# Retry-After. ADMISSION_FAIR_SESSIONS admits waiting requests round-robin
+# by the backend's session cookie, at most ADMISSION_SESSION_LIMIT each.
+# The default concurrency is two batches: one generating while the next is
+# collected (with exactly one batch, slots free up in a staggered order and
+# batches run half full).
+ADMISSION_ENABLED = os.environ.get("ADMISSION_ENABLED", "1") == "1"
+ADMISSION_MAX_CONCURRENCY = int(
+    os.environ.get("ADMISSION_MAX_CONCURRENCY", str(2 * BATCH_MAX_SIZE if BATCHING_ENABLED else 1))
+)
+ADMISSION_MAX_QUEUE = int(os.environ.get("ADMISSION_MAX_QUEUE", "32"))
+ADMISSION_DEADLINE_SECONDS = float(os.environ.get("ADMISSION_DEADLINE_SECONDS", "20"))
+ADMISSION_FAIR_SESSIONS = os.environ.get("ADMISSION_FAIR_SESSIONS", "0") == "1"
+ADMISSION_SESSION_LIMIT = int(os.environ.get("ADMISSION_SESSION_LIMIT", "2"))
+SESSION_COOKIE = "session_id"
+
+# Semantic answer cache: near-duplicate questions (cosine similarity of their
+# MiniLM embeddings >= threshold) reuse a previous answer without generating
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_SIZE = int(os.environ.get("SEMANTIC_CACHE_SIZE", "1024"))
+SEMANTIC_CACHE_TTL = float(os.environ.get("SEMANTIC_CACHE_TTL", "3600"))
+
+# Query embeddings: "int8" (quantized MiniLM on CPU), "cpu" (fp32 on CPU) or
+# "sentence_transformers" (the library default device, usually the GPU).
+# int8 falls back to fp32 if it drifts below EMBEDDING_MIN_COSINE.
+EMBEDDING_ENGINE = os.environ.get("EMBEDDING_ENGINE", "int8")
+EMBEDDING_MIN_COSINE = float(os.environ.get("EMBEDDING_MIN_COSINE", "0.98"))
+EMBEDDING_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", "4096"))
+EMBEDDING_BATCH_MAX_SIZE = int(os.environ.get("EMBEDDING_BATCH_MAX_SIZE", "32"))
+EMBEDDING_BATCH_WINDOW_MS = float(os.environ.get("EMBEDDING_BATCH_WINDOW_MS", "2"))
+
+# Retrieval: "dense" (FAISS only), "sparse" (BM25 only) or "hybrid" (both,
+# merged with reciprocal rank fusion)
+RETRIEVAL_MODE = os.environ.get("RETRIEVAL_MODE", "hybrid")
+
+# Search-time tuning for IVF (lists scanned) and HNSW (candidate list size)
+# indexes; unset keeps the defaults stored with the index
+FAISS_NPROBE = int(os.environ.get("FAISS_NPROBE", "0")) or None
+FAISS_EF_SEARCH = int(os.environ.get("FAISS_EF_SEARCH", "0")) or None
+
+# Prompt packing: total prompt tokens, tokens for retrieved context, and the
+# most history messages considered
+PROMPT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", "1536"))
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "600"))
+MAX_HISTORY_MESSAGES = int(os.environ.get("MAX_HISTORY_MESSAGES", "10"))
+
+# Conversation summaries (the summarize endpoint): longest summary
+# generated, and the most tokens of earlier summary plus turns read
+SUMMARY_MAX_NEW_TOKENS = int(os.environ.get("SUMMARY_MAX_NEW_TOKENS", "160"))
+SUMMARY_INPUT_TOKENS = int(os.environ.get("SUMMARY_INPUT_TOKENS", "1536"))
+# Summaries take chat generation slots too; at most SUMMARY_MAX_CONCURRENCY
+# hold one at a time and SUMMARY_MAX_QUEUE wait, so a burst of them from the
+# backend cannot crowd chat out. The rest get 503 and are retried later.
+SUMMARY_MAX_CONCURRENCY = int(os.environ.get("SUMMARY_MAX_CONCURRENCY", "1"))
+SUMMARY_MAX_QUEUE = int(os.environ.get("SUMMARY_MAX_QUEUE", "4"))
+
+SUMMARY_INSTRUCTION = (
+    "Summarise this conversation between a student and the University of Hull "
+    "assistant in a few sentences. Keep the questions asked, the facts given "
+    "(names, dates, places, fees, deadlines) and anything still unresolved."
+)
+
+class Message(BaseModel):
+    content: str
+    is_user: bool
+    timestamp: Optional[str] = None
+
+class ChatRequest(BaseModel):
+    prompt: str
+    conversation_id: Optional[int] = None
+    history: Optional[List[Message]] = None
+    # Rolling summary of the turns before `history`
+    summary: Optional[str] = None
+
+class SummaryRequest(BaseModel):
+    summary: Optional[str] = None
+    messages: List[Message]
+
+class SummaryResponse(BaseModel):
+    summary: str
+    error: Optional[str] = None
+
+class ChatResponse(BaseModel):
+    response: str
+    error: Optional[str] = None
+    source_documents: List[str] = []
+
+    model_config = {
+        "json_schema_extra": {
+            "examples": [
+                {
+                    "response": "Example response",
+                    "error": None,
+                    "source_documents": ["https://example.com/doc1"]
+                }
+            ]
+        }
+    }
+
+def format_history_message(msg: Message) -> str:
+    role = "Previous User Question" if msg.is_user else "Previous Assistant Answer"
+    return f"{role}:\n{msg.content}\n"
+
+def format_chat_history(history: List[Message], max_messages: Optional[int] = 5) -> str:
+    """Format chat history into a string, limiting to recent messages that fit in context window"""
+    if max_messages is not None:
+        history = history[-max_messages:]
+    return "\n".join(format_history_message(msg) for msg in history)
+
+def build_prompt(
+    prompt: str,
+    context: str,
+    history: Optional[List[Message]] = None,
+    history_limit: Optional[int] = 5,
+    summary: Optional[str] = None,
+) -> str:
+    """Build the Llama-2 chat prompt from the retrieved context, history and question"""
+    chat_context = ""
+    if summary:
+        chat_context += f"\nSummary of the earlier conversation:\n{summary}\n"
+    if history:
+        chat_context += f"{HISTORY_HEADING}{format_chat_history(history, history_limit)}\n"
+
+    return PROMPT_PREFIX + f"""{context}
+
+{chat_context}
+Question: {prompt} [/INST]"""
+
+def build_summary_prompt(messages: List[Message], summary: Optional[str] = None) -> str:
+    """Prompt that folds `messages` into the earlier `summary`"""
+    earlier = f"Summary so far:\n{summary}\n\n" if summary else ""
+    turns = "\n".join(f"{'Student' if m.is_user else 'Assistant'}: {m.content}" for m in messages)
+    return f"<s>[INST] {SUMMARY_INSTRUCTION}\n\n{earlier}Conversation:\n{turns}\n\nSummary: [/INST]"
+
+def postprocess_response(output_text: str, source_docs: List[str]) -> tuple[str, List[str]]:
+    """Strip the prompt echo and special tokens, and reject digit-heavy output"""
+    if "[/INST]" in output_text:
+        assistant_response = output_text.split("[/INST]", 1)[1].strip()
+    else:
+        assistant_response = output_text.strip()
+
+    cleaned_response = assistant_response.replace("</s>", "").strip()
+
+    if sum(c.isdigit() for c in cleaned_response) > len(cleaned_response) * 0.3:
+        return "Error occurred. Please try again.", []
+
+    # Return only the most relevant source document
+    most_relevant_source = source_docs[0] if source_docs else []
+    return cleaned_response, [most_relevant_source] if most_relevant_source else []
+
+class ChatPipeline:
+    """Answers questions from the RAG index with a loaded causal LM
+
+    Call `setup_generation` with a model and tokenizer and `load_rag` (or
+    `attach_rag`) before generating.
+    """
+
+    draft_model_id = DRAFT_MODEL_ID
+    num_assistant_tokens = NUM_ASSISTANT_TOKENS
+
+    def __init__(self):
+        self.model = None
+        self.tokenizer = None
+        self.assisted = None
+        self.backend = None
+        self.faiss_index = None
+        self.document_lookup = None
+        self.embedding_model = None
+        self.retriever = None
+        self.intent_router = IntentRouter(DEFAULT_INTENTS)
+        self.scheduler = None
+        self.prefix_cache = None
+        self.packer = None
+        self.answer_cache = SemanticCache(
+            threshold=SEMANTIC_CACHE_THRESHOLD,
+            max_entries=SEMANTIC_CACHE_SIZE,
+            ttl_seconds=SEMANTIC_CACHE_TTL,
+        )
+        self.admission = AdmissionController(
+            ADMISSION_MAX_CONCURRENCY,
+            max_queue=ADMISSION_MAX_QUEUE,
+            deadline=ADMISSION_DEADLINE_SECONDS,
+            fair_sessions=ADMISSION_FAIR_SESSIONS,
+            session_limit=ADMISSION_SESSION_LIMIT,
+        )
+        self.summary_admission = AdmissionController(
+            SUMMARY_MAX_CONCURRENCY,
+            max_queue=SUMMARY_MAX_QUEUE,
+            deadline=ADMISSION_DEADLINE_SECONDS,
+        )
+
+    def setup_generation(self, model, tokenizer, draft_model=None):
+        """Prefix cache, streaming backend, prompt packer and batch scheduler for `model`
+
+        With a `draft_model`, single-sequence generation is speculative.
+        """
+        self.model = model
+        self.tokenizer = tokenizer
+        if self.tokenizer.pad_token_id is None:
+            self.tokenizer.pad_token_id = self.tokenizer.eos_token_id
+        if self.tokenizer.eos_token_id is None:
+            self.tokenizer.eos_token_id = self.tokenizer.convert_tokens_to_ids("</s>")
+
+        self.prefix_cache = PrefixKVCache(self.model, self.tokenizer)
+        self.prefix_cache.build(PROMPT_PREFIX)
+
+        if draft_model is not None:
+            self.assisted = AssistedDecoding(self.model, draft_model, self.num_assistant_tokens)
+        self.backend = HFGeneratorBackend(
+            self.model, self.tokenizer, self.prefix_cache, self.assisted, token_timeout=STREAM_TOKEN_TIMEOUT
+        )
+        self.packer = PromptPacker(
+            self.tokenizer,
+            # The packer already chose which history messages fit
+            render=lambda prompt, context, history, summary: build_prompt(
+                prompt, context, history, history_limit=None, summary=summary
+            ),
+            format_message=format_history_message,
+            budget=PROMPT_TOKEN_BUDGET,
+            max_context_tokens=CONTEXT_TOKEN_BUDGET,
+            max_history_messages=MAX_HISTORY_MESSAGES,
+        )
+        self.scheduler = BatchScheduler(
+            HFBatchGenerator(
+                self.model,
+                self.tokenizer,
+                prefix_cache=self.prefix_cache,
+                assisted=self.assisted,
+                **GENERATION_KWARGS,
+                eos_token_id=self.tokenizer.eos_token_id,
+                pad_token_id=self.tokenizer.pad_token_id,
+            ),
+            max_batch_size=BATCH_MAX_SIZE,
+            max_wait_ms=BATCH_WINDOW_MS,
+        )
+
+    def load_llm(self):
+        """Return (model, tokenizer); subclasses define where they come from"""
+        raise NotImplementedError
+
+    def load_draft_model(self):
+        """Return the draft model for assisted decoding, or None to decode normally"""
+        return None
+
+    def load_embedding_model(self):
+        if EMBEDDING_ENGINE == "sentence_transformers":
+            from sentence_transformers import SentenceTransformer
+
+            return SentenceTransformer('all-MiniLM-L6-v2')
+
+        encoder = MiniLMEncoder.from_pretrained(quantize=False)
+        if EMBEDDING_ENGINE == "int8":
+            quantized = encoder.quantize()
+            # The FAISS index was built with fp32 embeddings
+            agreement = embedding_agreement(encoder, quantized)
+            if agreement >= EMBEDDING_MIN_COSINE:
+                encoder = quantized
+            else:
+                print(f"int8 embeddings too far from fp32 (cosine {agreement:.4f}), using fp32")
+        return self.embedding_engine(encoder)
+
+    def embedding_engine(self, encoder) -> QueryEmbeddingEngine:
+        return QueryEmbeddingEngine(
+            encoder,
+            cache_size=EMBEDDING_CACHE_SIZE,
+            max_batch_size=EMBEDDING_BATCH_MAX_SIZE,
+            max_wait_ms=EMBEDDING_BATCH_WINDOW_MS,
+        )
+
+    def rag_loaders(self, rag_dir: str) -> Dict[str, Callable[[], object]]:
+        """Independent loaders for the files built by build_rag_index.py
+
+        The FAISS index is read with mmap when possible, and the chunk store
+        is memory-mapped; the JSON lookup is only parsed when it is missing.
+        """
+        def load_document_lookup():
+            chunks_path = os.path.join(rag_dir, "document_chunks.bin")
+            if os.path.exists(chunks_path):
+                return ChunkStore(chunks_path)
+            with open(os.path.join(rag_dir, "document_lookup.json"), "r") as f:
+                return JsonChunkLookup(json.load(f))
+
+        def load_intents():
+            # Intent definitions shipped with the RAG files override the defaults
+            intents_path = os.path.join(rag_dir, "intents.json")
+            if os.path.exists(intents_path):
+                return IntentRouter.from_file(intents_path)
+            return None
+
+        def load_bm25_index():
+            # Without it, attach_rag falls back to dense retrieval
+            bm25_path = os.path.join(rag_dir, "bm25_index.npz")
+            if RETRIEVAL_MODE != "dense" and os.path.exists(bm25_path):
+                return BM25Index.load(bm25_path)
+            return None
+
+        return {
+            "embedding_model": self.load_embedding_model,
+            "faiss_index": lambda: load_index(rag_dir),
+            "document_lookup": load_document_lookup,
+            "intents": load_intents,
+            "bm25_index": load_bm25_index,
+        }
+
+    def _attach_loaded_rag(self, components: dict):
+        if components["intents"] is not None:
+            self.intent_router = components["intents"]
+        faiss_index, index_spec = components["faiss_index"]
+        self.attach_rag(
+            components["embedding_model"],
+            faiss_index,
+            components["document_lookup"],
+            components["bm25_index"],
+            index_spec,
+        )
+
+    def load_rag(self, rag_dir: str, report: Optional[StartupReport] = None) -> StartupReport:
+        """Load the embedding model, indexes and chunks concurrently"""
+        report = report or StartupReport()
+        components = load_concurrently(self.rag_loaders(rag_dir), report)
+        with report.phase("attach_rag"):
+            self._attach_loaded_rag(components)
+        return report
+
+    def cold_start(self, rag_dir: str, max_workers: Optional[int] = None) -> StartupReport:
+        """Load the LLM and every RAG component at the same time
+
+        Retrieval is wired up as soon as its components are in, while the
+        LLM may still be loading; generation is set up last.
+        """
+        report = StartupReport()
+        loaders = {"llm": self.load_llm, "draft_model": self.load_draft_model, **self.rag_loaders(rag_dir)}
+        with ThreadPoolExecutor(max_workers=max_workers or len(loaders), thread_name_prefix="load") as pool:
+            futures = submit_loaders(pool, loaders, report)
+            components = {
+                name: future.result() for name, future in futures.items() if name not in ("llm", "draft_model")
+            }
+            with report.phase("attach_rag"):
+                self._attach_loaded_rag(components)
+            model, tokenizer = futures["llm"].result()
+            draft_model = futures["draft_model"].result()
+        with report.phase("setup_generation"):
+            self.setup_generation(model, tokenizer, draft_model)
+        return report
+
+    def attach_rag(self, embedding_model, faiss_index, document_lookup, bm25_index=None, index_spec=None):
+        """Use the given retrieval components
+
+        Without a BM25 index, sparse and hybrid modes fall back to dense
+        retrieval. The index is not built here: that would read every chunk
+        on the start-up path. `index_spec` describes the FAISS index's type
+        and metric, and is inferred from the index when not given.
+        """
+        self.embedding_model = embedding_model
+        self.faiss_index = faiss_index
+        self.document_lookup = document_lookup
+        if bm25_index is None and RETRIEVAL_MODE != "dense":
+            print(
+                f"No bm25_index.npz with the RAG files; using dense retrieval instead of {RETRIEVAL_MODE}. "
+                "Rebuild the index with build_rag_index.py to enable it."
+            )
+        self.retriever = HybridRetriever(
+            faiss_index,
+            bm25_index,
+            mode=RETRIEVAL_MODE,
+            index_spec=index_spec,
+            nprobe=FAISS_NPROBE,
+            ef_search=FAISS_EF_SEARCH,
+        )
+
+        # Cached answers were built from the previous index
+        self.answer_cache.invalidate()
+
+    def embed_query(self, query: str):
+        with span("embed"):
+            return self.embedding_model.encode([query])[0]
+
+    def _lookup_answer(self, prompt: str, history: Optional[List[Message]] = None, summary: Optional[str] = None):
+        """Answer from the intent router or the semantic cache if possible
+
+        Returns (query_vector, answer). Fast-path intents and rejections are
+        answered before anything is embedded. Follow-up questions are never
+        served from the semantic cache because their answer depends on the
+        history.
+        """
+        with span("intent_route"):
+            route = self.intent_router.route(prompt)
+        if route.bypasses_llm:
+            return None, (route.response, route.source_documents)
+        if history or summary:
+            return None, None
+        query_vector = self.embed_query(prompt)
+        with span("answer_cache"):
+            return query_vector, self.answer_cache.lookup(query_vector)
+
+    def _store_answer(self, query_vector, answer: tuple[str, List[str]]):
+        response, source_docs = answer
+        # Only cache grounded answers; errors and fallbacks carry no sources
+        if query_vector is not None and source_docs:
+            self.answer_cache.store(query_vector, response, source_docs)
+
+    def retrieve_chunks(self, query: str, k: int = 5, query_vector=None) -> List[dict]:
+        """Return the top-k chunks (`{text, source_document}`), best first"""
+        # Check if query is about non-university topics
+        if self.intent_router.route(query).action == "reject":
+            return []
+
+        # Encode query, unless the caller already has the embedding
+        if query_vector is None and self.retriever.mode != "sparse":
+            query_vector = self.embed_query(query)
+
+        # Rank chunks; dense hits under the very lenient 0.01 threshold are
+        # already dropped by the retriever
+        ranked_ids = self.retriever.rank(query, query_vector, k)
+        with span("chunk_lookup"):
+            chunks = (self.document_lookup.get(idx) for idx in ranked_ids)
+            return [chunk for chunk in chunks if chunk is not None]
+
+    def retrieve_context(self, query: str, k: int = 5, query_vector=None) -> tuple[str, List[str]]:
+        """Retrieved context capped at 2000 characters, with its sources"""
+        relevant_chunks = []
+        source_documents = []
+        total_chars = 0
+        max_chars = 2000
+
+        for chunk in self.retrieve_chunks(query, k, query_vector):
+            chunk_text = chunk['text']
+
+            if total_chars + len(chunk_text) > max_chars:
+                remaining_chars = max_chars - total_chars
+                if remaining_chars > 100:
+                    chunk_text = chunk_text[:remaining_chars] + "..."
+                    relevant_chunks.append(chunk_text)
+                    if 'source_document' in chunk:
+                        source_documents.append(chunk['source_document'])
+                break
+            
+            relevant_chunks.append(chunk_text)
+            if 'source_document' in chunk:
+                source_documents.append(chunk['source_document'])
+            total_chars += len(chunk_text)
+            
+            if total_chars >= max_chars:
+                break
+
+        if not relevant_chunks:
+            return "", []
+
+        # Format context; sources stay in rank order so the first is the best match
+        return "\n\n".join(relevant_chunks), list(dict.fromkeys(source_documents))
+
+    def prepare_prompt(
+        self, prompt: str, history: Optional[List[Message]] = None, query_vector=None, summary: Optional[str] = None
+    ):
+        """Retrieve context and pack it with the history into the token budget
+
+        Returns (formatted_prompt, source_docs); the prompt is None when no
+        relevant context was found.
+        """
+        chunks = self.retrieve_chunks(prompt, query_vector=query_vector)
+        if not chunks:
+            return None, []
+        with span("pack_prompt"):
+            packed = self.packer.pack(prompt, chunks, history, summary)
+        return packed.text or None, packed.source_documents
+
+    def generate(
+        self, prompt: str, history: Optional[List[Message]] = None, summary: Optional[str] = None
+    ) -> tuple[str, List[str]]:
+        query_vector, fast_answer = self._lookup_answer(prompt, history, summary)
+        if fast_answer:
+            return fast_answer
+
+        formatted_prompt, source_docs = self.prepare_prompt(prompt, history, query_vector, summary)
+
+        if formatted_prompt is None:
+            return "No specific information available", []
+
+        with span("tokenize"):
+            inputs = self.prefix_cache.prepare(formatted_prompt)
+        generate = self.assisted.generate if self.assisted is not None else self.model.generate
+        with span("generate"):
+            start = time.perf_counter()
+            outputs = generate(
+                **inputs,
+                **GENERATION_KWARGS,
+                eos_token_id=self.tokenizer.eos_token_id,
+                pad_token_id=self.tokenizer.pad_token_id,
+            )
+            elapsed = time.perf_counter() - start
+        prompt_tokens = inputs["input_ids"].shape[1]
+        record_generation(prompt_tokens, outputs.shape[1] - prompt_tokens, elapsed)
+        with span("decode"):
+            output_text = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+        with span("postprocess"):
+            answer = postprocess_response(output_text, source_docs)
+        self._store_answer(query_vector, answer)
+        return answer
+
+    async def generate_async(
+        self, prompt: str, history: Optional[List[Message]] = None, summary: Optional[str] = None
+    ) -> tuple[str, List[str]]:
+        """Same pipeline as `generate`, but generation goes through the batch scheduler"""
+        query_vector, fast_answer = await asyncio.to_thread(self._lookup_answer, prompt, history, summary)
+        if fast_answer:
+            return fast_answer
+
+        formatted_prompt, source_docs = await asyncio.to_thread(
+            self.prepare_prompt, prompt, history, query_vector, summary
+        )
+
+        if formatted_prompt is None:
+            return "No specific information available", []
+
+        with span("generate"):
+            output_text = await self.scheduler.submit(formatted_prompt)
+        answer = postprocess_response(output_text, source_docs)
+        self._store_answer(query_vector, answer)
+        return answer
+
+    def generate_stream(self, prompt: str, history: Optional[List[Message]] = None, summary: Optional[str] = None):
+        """Same pipeline as `generate`, but yields SSE events as tokens are decoded"""
+        query_vector, fast_answer = self._lookup_answer(prompt, history, summary)
+        if fast_answer:
+            response, source_docs = fast_answer
+            yield sse_event("token", {"text": response})
+            yield sse_event("done", {"source_documents": source_docs})
+            return
+
+        formatted_prompt, source_docs = self.prepare_prompt(prompt, history, query_vector, summary)
+
+        timer = current_timer()
+        start = time.perf_counter()
+        first_token = True
+        for event in stream_chat_events(
+            self.backend,
+            formatted_prompt,
+            source_docs,
+            on_complete=lambda response, docs: self._store_answer(query_vector, (response, docs)),
+            **GENERATION_KWARGS,
+            eos_token_id=self.tokenizer.eos_token_id,
+            pad_token_id=self.tokenizer.pad_token_id,
+        ):
+            if first_token:
+                timer.record("time_to_first_token", time.perf_counter() - start)
+                first_token = False
+            yield event
+        timer.record("generate", time.perf_counter() - start)
+
+    def compare_decoding(self, prompts: List[str], max_new_tokens: int = 128) -> dict:
+        """Plain vs assisted generation on the full prompts for `prompts`
+
+        See AssistedDecoding.compare; every run generates exactly
+        `max_new_tokens`, so the two sides do the same work.
+        """
+        if self.assisted is None:
+            raise ValueError("No draft model is loaded; set DRAFT_MODEL_ID")
+        inputs = []
+        for prompt in prompts:
+            formatted_prompt, _ = self.prepare_prompt(prompt)
+            if formatted_prompt is not None:
+                inputs.append(self.tokenizer(formatted_prompt, return_tensors="pt").to(self.model.device))
+        return self.assisted.compare(
+            inputs,
+            **{**GENERATION_KWARGS, "max_new_tokens": max_new_tokens, "min_new_tokens": max_new_tokens},
+            eos_token_id=self.tokenizer.eos_token_id,
+            pad_token_id=self.tokenizer.pad_token_id,
+        )
+
+    async def summarize_async(self, messages: List[Message], summary: Optional[str] = None) -> str:
+        """`summarize_messages` behind admission control; raises Rejected when busy
+
+        A summary first takes one of the few summary slots, then a chat
+        generation slot, so it counts against the same limit as chat.
+        """
+        if not ADMISSION_ENABLED:
+            return await asyncio.to_thread(self.summarize_messages, messages, summary)
+        async with self.summary_admission.admit():
+            async with self.admission.admit():
+                return await asyncio.to_thread(self.summarize_messages, messages, summary)
+
+    def summarize_messages(self, messages: List[Message], summary: Optional[str] = None) -> str:
+        """Fold `messages` into a conversation's rolling `summary`
+
+        The chat backend calls this off the request path once a conversation
+        outgrows its history budget, then sends the summary with only the
+        recent turns. The oldest messages are left out if the input would
+        exceed SUMMARY_INPUT_TOKENS.
+        """
+        messages = list(messages)
+        with span("summarize"):
+            prompt = build_summary_prompt(messages, summary)
+            while len(messages) > 1 and len(self.tokenizer.encode(prompt)) > SUMMARY_INPUT_TOKENS:
+                messages.pop(0)
+                prompt = build_summary_prompt(messages, summary)
+            inputs = self.tokenizer(prompt, return_tensors="pt").to(self.model.device)
+            outputs = self.model.generate(
+                **inputs,
+                max_new_tokens=SUMMARY_MAX_NEW_TOKENS,
+                do_sample=False,
+                repetition_penalty=GENERATION_KWARGS["repetition_penalty"],
+                eos_token_id=self.tokenizer.eos_token_id,
+                pad_token_id=self.tokenizer.pad_token_id,
+            )
+            new_tokens = outputs[0][inputs["input_ids"].shape[1]:]
+            return self.tokenizer.decode(new_tokens, skip_special_tokens=True).strip()
@@ -0,0 +1,173 @@
+"""Compact, memory-mapped store for RAG chunks
+
+Replaces `document_lookup.json` (a dict of `str(faiss_id) -> {text,
+source_document}`) with a single binary file addressed directly by FAISS
+integer id:
+
+    header     magic, version, chunk count, source count, section offsets
+    offsets    uint64[count + 1]  byte range of each chunk in the text blob
+    source_ids int32[count]       index into the sources table
+                                  (NO_SOURCE: chunk has none, MISSING: no chunk)
+    sources    UTF-8 JSON list of distinct source document URLs
+    text       UTF-8 blob of all chunk texts back to back
+
+Opening the store maps the file and decodes only the (small) sources
+table, so startup time does not grow with the corpus.
+
+Convert an existing lookup with:
+
+    python chunk_store.py rag/document_lookup.json rag/document_chunks.bin
+"""
+import json
+import mmap
+import struct
+import sys
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+MAGIC = b"HCHK"
+VERSION = 1
+HEADER = struct.Struct("<4sIQQQQQQ")
+NO_SOURCE = -1
+MISSING = -2
+
+
+def write_chunk_store(path: str, chunks: Iterable[Tuple[int, str, Optional[str]]]):
+    """Write `(faiss_id, text, source_document)` tuples to a chunk store file"""
+    by_id: Dict[int, Tuple[str, Optional[str]]] = {}
+    for idx, text, source in chunks:
+        by_id[int(idx)] = (text, source)
+    count = max(by_id) + 1 if by_id else 0
+
+    sources: List[str] = []
+    source_index: Dict[str, int] = {}
+    offsets = [0]
+    source_ids = []
+    blob = bytearray()
+    for idx in range(count):
+        if idx not in by_id:
+            source_ids.append(MISSING)
+            offsets.append(len(blob))
+            continue
+        text, source = by_id[idx]
+        blob.extend(text.encode("utf-8"))
+        offsets.append(len(blob))
+        if source is None:
+            source_ids.append(NO_SOURCE)
+        else:
+            if source not in source_index:
+                source_index[source] = len(sources)
+                sources.append(source)
+            source_ids.append(source_index[source])
+
+    sources_bytes = json.dumps(sources).encode("utf-8")
+    offsets_start = HEADER.size
+    source_ids_start = offsets_start + 8 * (count + 1)
+    sources_start = source_ids_start + 4 * count
+    text_start = sources_start + len(sources_bytes)
+
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(
+            MAGIC, VERSION, count, len(sources),
+            offsets_start, source_ids_start, sources_start, text_start,
+        ))
+        f.write(struct.pack(f"<{count + 1}Q", *offsets))
+        f.write(struct.pack(f"<{count}i", *source_ids))
+        f.write(sources_bytes)
+        f.write(blob)
+
+
+def convert_lookup_json(json_path: str, out_path: str) -> int:
+    """Convert a `document_lookup.json` file; returns the number of chunks"""
+    with open(json_path, "r") as f:
+        lookup = json.load(f)
+    write_chunk_store(
+        out_path,
+        ((int(idx), chunk["text"], chunk.get("source_document")) for idx, chunk in lookup.items()),
+    )
+    return len(lookup)
+
+
+class ChunkStore:
+    """Read-only view over a chunk store file, addressed by FAISS id"""
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        (
+            magic, version, self._count, _,
+            offsets_start, source_ids_start, sources_start, self._text_start,
+        ) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} chunk store")
+
+        view = memoryview(self._mm)
+        self._offsets = view[offsets_start:source_ids_start].cast("Q")
+        self._source_ids = view[source_ids_start:sources_start].cast("i")
+        self.sources: List[str] = json.loads(bytes(view[sources_start:self._text_start]))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, idx) -> bool:
+        idx = int(idx)
+        return 0 <= idx < self._count and self._source_ids[idx] != MISSING
+
+    def text(self, idx: int) -> str:
+        start = self._text_start + self._offsets[idx]
+        end = self._text_start + self._offsets[idx + 1]
+        return self._mm[start:end].decode("utf-8")
+
+    def source(self, idx: int) -> Optional[str]:
+        source_id = self._source_ids[idx]
+        return self.sources[source_id] if source_id >= 0 else None
+
+    def get(self, idx) -> Optional[dict]:
+        """Return the chunk as `{text, source_document}`, or None if absent"""
+        idx = int(idx)
+        if idx not in self:
+            return None
+        chunk = {"text": self.text(idx)}
+        source = self.source(idx)
+        if source is not None:
+            chunk["source_document"] = source
+        return chunk
+
+    def items(self) -> Iterator[Tuple[int, dict]]:
+        for idx in range(self._count):
+            chunk = self.get(idx)
+            if chunk is not None:
+                yield idx, chunk
+
+    def close(self):
+        self._offsets.release()
+        self._source_ids.release()
+        self._mm.close()
+        self._file.close()
+
+
+class JsonChunkLookup:
+    """`ChunkStore`-compatible wrapper around a parsed `document_lookup.json`"""
+
+    def __init__(self, lookup: dict):
+        self.lookup = lookup
+
+    def __len__(self) -> int:
+        return len(self.lookup)
+
+    def __contains__(self, idx) -> bool:
+        return str(idx) in self.lookup
+
+    def get(self, idx) -> Optional[dict]:
+        return self.lookup.get(str(idx))
+
+    def items(self) -> Iterator[Tuple[int, dict]]:
+        for idx, chunk in self.lookup.items():
+            yield int(idx), chunk
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python chunk_store.py <document_lookup.json> <document_chunks.bin>")
+        sys.exit(1)
+    converted = convert_lookup_json(sys.argv[1], sys.argv[2])
+    print(f"Converted {converted} chunks to {sys.argv[2]}")
@@ -0,0 +1,216 @@
+"""Query embeddings on CPU: int8 MiniLM, micro-batching and an exact-match cache
+
+`MiniLMEncoder` reproduces what SentenceTransformer('all-MiniLM-L6-v2')
+computes (mean pooling over the token embeddings, then L2
+normalisation) with the transformer's linear layers dynamically
+quantized to int8. That keeps the GPU free for generation. Cosine
+similarity to the fp32 embeddings stays around 0.99, so the FAISS index
+built with the fp32 model stays valid; `embedding_agreement` checks this
+at load time.
+
+`QueryEmbeddingEngine` has the same `encode(texts)` interface the
+pipeline already uses. Single queries from concurrent requests are
+grouped into one forward pass by `EmbeddingBatcher`, and exact repeats
+are answered from an LRU cache.
+"""
+import copy
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from queue import Empty, Queue
+from threading import Lock, Thread
+from typing import Callable, List, Optional
+
+from batching import BatchMetrics
+from semantic_cache import CacheStats
+
+EMBEDDING_MODEL_ID = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Sentences used to compare a quantized encoder against the fp32 one
+PROBE_TEXTS = [
+    "What are the library opening hours?",
+    "How do I apply for student accommodation?",
+    "When is the deadline for paying tuition fees?",
+    "Where can I find support for my mental health and wellbeing?",
+    "Which courses does the computer science department offer?",
+    "Is there parking on campus for visitors?",
+]
+
+
+class MiniLMEncoder:
+    """Mean-pooled, normalised sentence embeddings from a BERT-style encoder"""
+
+    def __init__(self, model, tokenizer, max_length: int = 256, quantized: bool = False):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+        self.quantized = quantized
+
+    @classmethod
+    def from_pretrained(cls, model_id: str = EMBEDDING_MODEL_ID, quantize: bool = True) -> "MiniLMEncoder":
+        from transformers import AutoModel, AutoTokenizer
+
+        model = AutoModel.from_pretrained(model_id).eval()
+        encoder = cls(model, AutoTokenizer.from_pretrained(model_id))
+        return encoder.quantize() if quantize else encoder
+
+    def quantize(self) -> "MiniLMEncoder":
+        """A copy with int8 dynamically quantized linear layers"""
+        import torch
+
+        model = torch.ao.quantization.quantize_dynamic(
+            copy.deepcopy(self.model), {torch.nn.Linear}, dtype=torch.qint8
+        )
+        return MiniLMEncoder(model, self.tokenizer, self.max_length, quantized=True)
+
+    def __call__(self, texts: List[str]):
+        import torch
+
+        inputs = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="pt"
+        )
+        with torch.inference_mode():
+            token_embeddings = self.model(**inputs).last_hidden_state
+            mask = inputs["attention_mask"].unsqueeze(-1).to(token_embeddings.dtype)
+            pooled = (token_embeddings * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+            embeddings = torch.nn.functional.normalize(pooled, p=2, dim=1)
+        return embeddings.float().numpy()
+
+
+def embedding_agreement(reference: Callable, candidate: Callable, texts: List[str] = PROBE_TEXTS) -> float:
+    """Lowest cosine similarity between two encoders' embeddings of `texts`"""
+    import numpy as np
+
+    a, b = reference(texts), candidate(texts)
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return float((a * b).sum(axis=1).min())
+
+
+@dataclass
+class _PendingQuery:
+    text: str
+    future: Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class EmbeddingBatcher:
+    """Groups single-query embeddings from concurrent threads into one call
+
+    The thread-based counterpart of `batching.BatchScheduler`: callers
+    block in `embed`, and a worker thread waits up to `max_wait_ms` after
+    the first pending query (or until `max_batch_size` are queued) before
+    running `encode_batch` once for all of them.
+    """
+
+    def __init__(self, encode_batch: Callable, max_batch_size: int = 32, max_wait_ms: float = 2.0):
+        self.encode_batch = encode_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.metrics = BatchMetrics()
+        self._queue: Queue = Queue()
+        self._worker: Optional[Thread] = None
+        self._lock = Lock()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+
+    def embed(self, text: str):
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put(_PendingQuery(text, future))
+        return future.result()
+
+    def _collect_batch(self) -> List[_PendingQuery]:
+        batch = [self._queue.get()]
+        deadline = batch[0].enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            # Queries that arrived during the previous batch are taken at once
+            timeout = max(deadline - time.perf_counter(), 0)
+            try:
+                batch.append(self._queue.get(timeout=timeout) if timeout else self._queue.get_nowait())
+            except Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            started = time.perf_counter()
+            queue_waits = [started - query.enqueued_at for query in batch]
+            try:
+                vectors = self.encode_batch([query.text for query in batch])
+            except Exception as e:
+                for query in batch:
+                    query.future.set_exception(e)
+                continue
+            self.metrics.record(queue_waits, time.perf_counter() - started)
+            for query, vector in zip(batch, vectors):
+                query.future.set_result(vector)
+
+
+class QueryEmbeddingEngine:
+    """`encode(texts)` with an exact-match LRU cache and cross-request batching"""
+
+    def __init__(
+        self,
+        encoder: Callable,
+        cache_size: int = 4096,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 2.0,
+    ):
+        self.encoder = encoder
+        self.cache_size = cache_size
+        self.batcher = EmbeddingBatcher(encoder, max_batch_size, max_wait_ms)
+        self.stats = CacheStats()
+        self._cache: "OrderedDict[str, object]" = OrderedDict()
+        self._lock = Lock()
+
+    def _cached(self, text: str):
+        with self._lock:
+            vector = self._cache.get(text)
+            if vector is None:
+                self.stats.misses += 1
+                return None
+            self._cache.move_to_end(text)
+            self.stats.hits += 1
+            return vector
+
+    def _store(self, text: str, vector):
+        if self.cache_size <= 0:
+            return
+        # Callers share cached arrays, so they must not be written to
+        vector.setflags(write=False)
+        with self._lock:
+            self._cache[text] = vector
+            self._cache.move_to_end(text)
+            self.stats.stores += 1
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+                self.stats.evictions += 1
+
+    def encode(self, texts: List[str]):
+        import numpy as np
+
+        vectors = [self._cached(text) for text in texts]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if len(missing) == 1:
+            # The common case, one query per request: batch across requests
+            vectors[missing[0]] = np.asarray(self.batcher.embed(texts[missing[0]]))
+        elif missing:
+            for i, vector in zip(missing, self.encoder([texts[i] for i in missing])):
+                vectors[i] = np.asarray(vector)
+        for i in missing:
+            self._store(texts[i], vectors[i])
+        return np.stack(vectors)
+
+    def snapshot(self) -> dict:
+        return {
+            "quantized": getattr(self.encoder, "quantized", False),
+            "cache": self.stats.snapshot(len(self._cache)),
+            "batching": self.batcher.metrics.snapshot(),
+        }
@@ -0,0 +1,118 @@
+"""Offline recall/latency comparison of dense, sparse and hybrid retrieval
+
+Labelled queries are JSONL records such as:
+
+    {"query": "Allam Medical Building opening hours",
+     "relevant_sources": ["https://www.hull.ac.uk/allam-medical-building"]}
+
+A query counts as recalled at k when any of its relevant source documents
+appears among the sources of the top-k chunks. Query embeddings are
+computed once up front, so the reported latency is retrieval only.
+
+Usage:
+
+    python evaluate_retrieval.py labelled_queries.jsonl --rag-dir rag/ --k 5
+"""
+import argparse
+import json
+import os
+import time
+from typing import List
+
+from chunk_store import ChunkStore, JsonChunkLookup
+from ann_index import load_index
+from hybrid_retrieval import RETRIEVAL_MODES, BM25Index, HybridRetriever
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def load_lookup(rag_dir: str):
+    chunks_path = os.path.join(rag_dir, "document_chunks.bin")
+    if os.path.exists(chunks_path):
+        return ChunkStore(chunks_path)
+    with open(os.path.join(rag_dir, "document_lookup.json"), "r") as f:
+        return JsonChunkLookup(json.load(f))
+
+
+def evaluate(retriever: HybridRetriever, lookup, queries: List[dict], query_vectors, k: int) -> dict:
+    """Score every retrieval mode on the labelled queries"""
+    results = {}
+    for mode in RETRIEVAL_MODES:
+        if mode != "dense" and retriever.bm25_index is None:
+            continue
+        hits = 0
+        reciprocal_ranks = []
+        latencies = []
+        for labelled, query_vector in zip(queries, query_vectors):
+            relevant = set(labelled["relevant_sources"])
+            start = time.perf_counter()
+            ranked_ids = retriever.rank(labelled["query"], query_vector, k, mode=mode)
+            latencies.append(1000 * (time.perf_counter() - start))
+
+            sources = []
+            for idx in ranked_ids:
+                chunk = lookup.get(idx)
+                if chunk is not None:
+                    sources.append(chunk.get("source_document"))
+            first_hit = next((rank for rank, source in enumerate(sources, 1) if source in relevant), None)
+            hits += first_hit is not None
+            reciprocal_ranks.append(1 / first_hit if first_hit else 0.0)
+
+        results[mode] = {
+            f"recall@{k}": hits / len(queries) if queries else 0.0,
+            "mrr": sum(reciprocal_ranks) / len(queries) if queries else 0.0,
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare dense, sparse and hybrid retrieval")
+    parser.add_argument("queries", help="JSONL file of labelled queries")
+    parser.add_argument("--rag-dir", default="rag")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--output", help="Also write the results as JSON to this path")
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+
+    with open(args.queries, "r") as f:
+        queries = [json.loads(line) for line in f if line.strip()]
+
+    lookup = load_lookup(args.rag_dir)
+    faiss_index, index_spec = load_index(args.rag_dir)
+    bm25_path = os.path.join(args.rag_dir, "bm25_index.npz")
+    if os.path.exists(bm25_path):
+        bm25_index = BM25Index.load(bm25_path)
+    else:
+        bm25_index = BM25Index.build((idx, chunk["text"]) for idx, chunk in lookup.items())
+
+    embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
+    start = time.perf_counter()
+    query_vectors = embedding_model.encode([q["query"] for q in queries])
+    embed_ms = 1000 * (time.perf_counter() - start) / max(len(queries), 1)
+
+    retriever = HybridRetriever(faiss_index, bm25_index, index_spec=index_spec)
+    results = evaluate(retriever, lookup, queries, query_vectors, args.k)
+
+    print(f"{len(queries)} queries, k={args.k}, avg query embedding {embed_ms:.1f} ms\n")
+    print(f"{'mode':<8} {'recall@' + str(args.k):>10} {'mrr':>7} {'p50 ms':>8} {'p95 ms':>8}")
+    for mode, scores in results.items():
+        print(
+            f"{mode:<8} {scores[f'recall@{args.k}']:>10.3f} {scores['mrr']:>7.3f} "
+            f"{scores['p50_ms']:>8.2f} {scores['p95_ms']:>8.2f}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"k": args.k, "queries": len(queries), "embed_ms": embed_ms, "modes": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from ann_index import IndexSpec
+from timing import span
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+RETRIEVAL_MODES = ("dense", "sparse", "hybrid")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """Sparse inverted index over the RAG chunks
+
+    Postings are stored CSR-style (one contiguous array of chunk ids and
+    one of weights per term) and the weights are precomputed BM25 impact
+    scores, so a query is a handful of array slices and scatter-adds.
+    """
+
+    def __init__(self, terms, offsets, doc_ids, weights, num_docs: int):
+        self.terms = list(terms)
+        self.term_rows: Dict[str, int] = {term: row for row, term in enumerate(self.terms)}
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.num_docs = num_docs
+
+    @classmethod
+    def build(cls, documents: Iterable[Tuple[int, str]], k1: float = 1.2, b: float = 0.75) -> "BM25Index":
+        """Build from `(faiss_id, text)` pairs"""
+        import numpy as np
+
+        postings = defaultdict(list)
+        doc_lengths = {}
+        for doc_id, text in documents:
+            tokens = tokenize(text)
+            doc_lengths[doc_id] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                postings[term].append((doc_id, tf))
+
+        num_docs = max(doc_lengths) + 1 if doc_lengths else 0
+        avg_length = sum(doc_lengths.values()) / len(doc_lengths) if doc_lengths else 0.0
+        terms = sorted(postings)
+        offsets = [0]
+        doc_ids, weights = [], []
+        for term in terms:
+            entries = postings[term]
+            idf = np.log(1 + (len(doc_lengths) - len(entries) + 0.5) / (len(entries) + 0.5))
+            for doc_id, tf in entries:
+                norm = k1 * (1 - b + b * doc_lengths[doc_id] / avg_length) if avg_length else k1
+                doc_ids.append(doc_id)
+                weights.append(idf * tf * (k1 + 1) / (tf + norm))
+            offsets.append(len(doc_ids))
+
+        return cls(
+            terms,
+            np.array(offsets, dtype=np.int64),
+            np.array(doc_ids, dtype=np.int32),
+            np.array(weights, dtype=np.float32),
+            num_docs,
+        )
+
+    def save(self, path: str):
+        import numpy as np
+
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                terms=np.array(self.terms),
+                offsets=self.offsets,
+                doc_ids=self.doc_ids,
+                weights=self.weights,
+                num_docs=np.array(self.num_docs),
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        import numpy as np
+
+        data = np.load(path)
+        return cls(
+            data["terms"].tolist(),
+            data["offsets"],
+            data["doc_ids"],
+            data["weights"],
+            int(data["num_docs"]),
+        )
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[int, float]]:
+        import numpy as np
+
+        scores = None
+        for term in set(tokenize(query)):
+            row = self.term_rows.get(term)
+            if row is None:
+                continue
+            if scores is None:
+                scores = np.zeros(self.num_docs, dtype=np.float32)
+            start, end = self.offsets[row], self.offsets[row + 1]
+            np.add.at(scores, self.doc_ids[start:end], self.weights[start:end])
+
+        if scores is None:
+            return []
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(idx), float(scores[idx])) for idx in ranked]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60) -> List[int]:
+    """Merge ranked id lists, scoring each id by sum(1 / (k + rank))"""
+    scores: Dict[int, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, idx in enumerate(ranking, start=1):
+            scores[idx] += 1.0 / (k + rank)
+    return sorted(scores, key=lambda idx: (-scores[idx], idx))
+
+
+class HybridRetriever:
+    """Ranks chunk ids with FAISS, BM25 or both fused by reciprocal rank
+
+    Dense hits below `min_dense_score` are dropped before fusion, matching
+    the lenient threshold `retrieve_context` has always applied. FAISS
+    scores are first converted to similarities using the index's
+    `IndexSpec`; the threshold is only meaningful (and only applied) for
+    normalised vectors. `nprobe` and `ef_search` tune IVF and HNSW
+    indexes and can be changed between searches.
+    """
+
+    def __init__(
+        self,
+        faiss_index,
+        bm25_index: Optional[BM25Index] = None,
+        mode: str = "hybrid",
+        min_dense_score: float = 0.01,
+        candidates_per_retriever: int = 20,
+        rrf_k: int = 60,
+        index_spec: Optional[IndexSpec] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+    ):
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode {mode!r}; expected one of {RETRIEVAL_MODES}")
+        if mode != "dense" and bm25_index is None:
+            mode = "dense"
+        self.faiss_index = faiss_index
+        self.bm25_index = bm25_index
+        self.mode = mode
+        self.min_dense_score = min_dense_score
+        self.candidates_per_retriever = candidates_per_retriever
+        self.rrf_k = rrf_k
+        self.index_spec = index_spec or IndexSpec.from_index(faiss_index)
+        self.nprobe = nprobe or self.index_spec.nprobe
+        self.ef_search = ef_search or self.index_spec.ef_search
+
+    def set_search_params(self, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+        if nprobe is not None:
+            self.nprobe = nprobe
+        if ef_search is not None:
+            self.ef_search = ef_search
+
+    def snapshot(self) -> dict:
+        return {
+            "mode": self.mode,
+            "index_type": self.index_spec.index_type,
+            "metric": self.index_spec.metric,
+            "nprobe": self.nprobe,
+            "ef_search": self.ef_search,
+        }
+
+    def dense(self, query_vector, k: int) -> List[int]:
+        params = self.index_spec.search_params(self.nprobe, self.ef_search)
+        with span("faiss_search"):
+            D, I = self.faiss_index.search(query_vector.reshape(1, -1).astype("float32"), k, params=params)
+        scores = self.index_spec.to_similarity(D[0])
+        threshold = self.min_dense_score if self.index_spec.normalized else float("-inf")
+        return [int(idx) for score, idx in zip(scores, I[0]) if idx >= 0 and score >= threshold]
+
+    def sparse(self, query: str, k: int) -> List[int]:
+        with span("bm25_search"):
+            return [idx for idx, _ in self.bm25_index.search(query, k)]
+
+    def rank(self, query: str, query_vector=None, k: int = 5, mode: Optional[str] = None) -> List[int]:
+        """Return up to `k` chunk ids, best first"""
+        mode = mode or self.mode
+        if mode == "dense":
+            return self.dense(query_vector, k)
+        if mode == "sparse":
+            return self.sparse(query, k)
+
+        candidates = max(k, self.candidates_per_retriever)
+        rankings = [self.dense(query_vector, candidates), self.sparse(query, candidates)]
+        with span("rank_fusion"):
+            fused = reciprocal_rank_fusion(rankings, k=self.rrf_k)
+        return fused[:k]
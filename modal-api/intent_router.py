@@ -0,0 +1,146 @@
+"""Keyword intent router that answers common questions without the LLM
+
+Every keyword of every intent is compiled into one regular expression, so
+routing a query is a single scan regardless of how many intents exist.
+An intent matches when each of its keyword groups has at least one
+whole-word hit, so "bus" no longer rejects "business school" the way the
+old substring check did, and none of its `exclude_keywords` appear.
+
+Actions:
+    answer  return `response` and `source_documents` directly
+    reject  out-of-scope query; return `response` with no sources
+    rag     tag the query but continue through retrieval and generation
+
+Intents are checked in order and the first match wins. Definitions can be
+loaded from a JSON list with the same fields as `Intent`.
+"""
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+ACTIONS = ("answer", "reject", "rag")
+NO_INFORMATION = "No specific information available"
+
+
+@dataclass
+class Intent:
+    name: str
+    keyword_groups: List[List[str]]
+    action: str = "rag"
+    response: str = ""
+    source_documents: List[str] = field(default_factory=list)
+    # Only match queries of at most this many words (None: any length)
+    max_words: Optional[int] = None
+    # Any of these in the query rules the intent out
+    exclude_keywords: List[str] = field(default_factory=list)
+
+    def __post_init__(self):
+        if self.action not in ACTIONS:
+            raise ValueError(f"Intent {self.name!r} has unknown action {self.action!r}")
+        if self.action != "rag" and not self.response:
+            raise ValueError(f"Intent {self.name!r} needs a response for action {self.action!r}")
+
+
+@dataclass
+class Route:
+    intent: Optional[str]
+    action: str
+    response: str = ""
+    source_documents: List[str] = field(default_factory=list)
+
+    @property
+    def bypasses_llm(self) -> bool:
+        return self.action in ("answer", "reject")
+
+
+DEFAULT_INTENTS = [
+    Intent(
+        name="greeting",
+        keyword_groups=[["hi", "hello", "hey", "good morning", "good afternoon"]],
+        action="answer",
+        response="Hi! How can I help you with the University of Hull today?",
+        max_words=4,
+    ),
+    Intent(
+        name="thanks",
+        keyword_groups=[["thanks", "thank you", "cheers"]],
+        action="answer",
+        response="You're welcome! Let me know if there is anything else you need.",
+        max_words=4,
+    ),
+    Intent(
+        name="out_of_scope",
+        keyword_groups=[[
+            "restaurant", "restaurants", "weather", "forecast", "pizza", "pub", "pubs",
+            "council", "tax", "cinema", "movie", "movies", "train", "trains", "bus",
+            "buses", "shopping", "store", "stores", "shop", "shops",
+        ]],
+        action="reject",
+        response=NO_INFORMATION,
+    ),
+    # Opening hours change with the calendar, so they are answered from the
+    # retrieved library pages; a canned answer with its source belongs in
+    # rag/intents.json, next to the index it was checked against
+    Intent(
+        name="library_hours",
+        keyword_groups=[["library"], ["opening hours", "opening times", "hours"]],
+        action="rag",
+        exclude_keywords=[
+            "account", "christmas", "easter", "holiday", "holidays", "bank holiday",
+            "vacation", "vacations", "summer",
+        ],
+    ),
+]
+
+class IntentRouter:
+    def __init__(self, intents: List[Intent]):
+        self.intents = intents
+        # keyword -> [(intent position, group position)]; exclusions use group -1
+        self._keyword_slots: Dict[str, List[Tuple[int, int]]] = {}
+        for i, intent in enumerate(intents):
+            for g, group in enumerate(intent.keyword_groups):
+                for keyword in group:
+                    self._keyword_slots.setdefault(keyword.lower(), []).append((i, g))
+            for keyword in intent.exclude_keywords:
+                self._keyword_slots.setdefault(keyword.lower(), []).append((i, -1))
+
+        # Longest keywords first so "good morning" wins over "good"
+        alternatives = sorted(self._keyword_slots, key=len, reverse=True)
+        pattern = "|".join(re.escape(keyword) for keyword in alternatives)
+        self._pattern = re.compile(rf"\b({pattern})\b") if alternatives else None
+
+    @classmethod
+    def from_file(cls, path: str) -> "IntentRouter":
+        with open(path, "r") as f:
+            return cls([Intent(**definition) for definition in json.load(f)])
+
+    def match(self, query: str) -> Optional[Intent]:
+        if self._pattern is None:
+            return None
+
+        satisfied: Set[Tuple[int, int]] = set()
+        for found in self._pattern.finditer(query.lower()):
+            satisfied.update(self._keyword_slots[found.group(1)])
+
+        word_count = len(query.split())
+        for i, intent in enumerate(self.intents):
+            if (i, -1) in satisfied:
+                continue
+            if all((i, g) in satisfied for g in range(len(intent.keyword_groups))):
+                # e.g. "hi, how do I apply for accommodation?" is not small talk
+                if intent.max_words is not None and word_count > intent.max_words:
+                    continue
+                return intent
+        return None
+
+    def route(self, query: str) -> Route:
+        intent = self.match(query)
+        if intent is None:
+            return Route(intent=None, action="rag")
+        return Route(
+            intent=intent.name,
+            action=intent.action,
+            response=intent.response,
+            source_documents=list(intent.source_documents),
+        )
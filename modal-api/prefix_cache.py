@@ -0,0 +1,131 @@
+import copy
+import hashlib
+import time
+from dataclasses import dataclass
+from threading import Lock
+from typing import Optional
+
+
+@dataclass
+class PrefixCacheStats:
+    prefix_tokens: int = 0
+    prefix_prefill_ms: float = 0.0
+    builds: int = 0
+    hits: int = 0
+    fallbacks: int = 0
+    tokens_saved: int = 0
+
+    def snapshot(self) -> dict:
+        per_token_ms = self.prefix_prefill_ms / self.prefix_tokens if self.prefix_tokens else 0.0
+        return {
+            "prefix_tokens": self.prefix_tokens,
+            "prefix_prefill_ms": self.prefix_prefill_ms,
+            "builds": self.builds,
+            "hits": self.hits,
+            "fallbacks": self.fallbacks,
+            "tokens_saved_per_request": self.prefix_tokens,
+            "tokens_saved_total": self.tokens_saved,
+            # Prefill cost scales roughly linearly with prompt length, so
+            # each hit skips about what building the prefix cost
+            "estimated_prefill_ms_saved_total": per_token_ms * self.tokens_saved,
+        }
+
+
+class PrefixKVCache:
+    """Key/value cache for the constant start of every prompt
+
+    The prefix (system prompt up to the retrieved context) is run through
+    the model once; each generation then starts from a copy of its
+    key/value cache, so only the per-request tokens are prefilled.
+
+    The cache is keyed on the prefix text: building it for a different
+    system prompt replaces the old one. A prompt whose tokenization does
+    not start with the cached prefix tokens falls back to a full prefill.
+    """
+
+    def __init__(self, model, tokenizer):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.stats = PrefixCacheStats()
+        self._lock = Lock()
+        self._prefix_key: Optional[str] = None
+        self._prefix_text = ""
+        self._prefix_ids = None
+        self._past_key_values = None
+
+    @staticmethod
+    def _key(prefix_text: str) -> str:
+        return hashlib.sha256(prefix_text.encode("utf-8")).hexdigest()
+
+    def build(self, prefix_text: str):
+        """Prefill `prefix_text` unless it is already the cached prefix"""
+        import torch
+
+        key = self._key(prefix_text)
+        with self._lock:
+            if key == self._prefix_key:
+                return
+
+            prefix_ids = self.tokenizer(prefix_text, return_tensors="pt")["input_ids"].to(self.model.device)
+            start = time.perf_counter()
+            with torch.no_grad():
+                outputs = self.model(input_ids=prefix_ids, use_cache=True)
+            if prefix_ids.is_cuda:
+                torch.cuda.synchronize()
+
+            self._prefix_key = key
+            self._prefix_text = prefix_text
+            self._prefix_ids = prefix_ids
+            self._past_key_values = outputs.past_key_values
+            self.stats.prefix_tokens = prefix_ids.shape[1]
+            self.stats.prefix_prefill_ms = 1000 * (time.perf_counter() - start)
+            self.stats.builds += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._prefix_key = None
+            self._prefix_ids = None
+            self._past_key_values = None
+
+    def _count(self, hit: bool, tokens_saved: int = 0):
+        # Generation threads call prepare concurrently
+        with self._lock:
+            if hit:
+                self.stats.hits += 1
+                self.stats.tokens_saved += tokens_saved
+            else:
+                self.stats.fallbacks += 1
+
+    def prepare(self, prompt_text: str) -> dict:
+        """Tokenize a prompt into `generate` inputs, reusing the prefix cache
+
+        Always returns usable inputs: with `past_key_values` when the
+        prompt starts with the cached prefix, plain tokenization otherwise.
+        """
+        import torch
+
+        inputs = self.tokenizer(prompt_text, return_tensors="pt").to(self.model.device)
+        with self._lock:
+            prefix_ids = self._prefix_ids
+            past_key_values = self._past_key_values
+            prefix_text = self._prefix_text
+
+        if prefix_ids is None or not prompt_text.startswith(prefix_text):
+            self._count(hit=False)
+            return dict(inputs)
+
+        input_ids = inputs["input_ids"]
+        prefix_length = prefix_ids.shape[1]
+        # Tokenizers can merge across the boundary; only reuse the cache
+        # when the full prompt really begins with the prefix tokens
+        if input_ids.shape[1] <= prefix_length or not torch.equal(input_ids[0, :prefix_length], prefix_ids[0]):
+            self._count(hit=False)
+            return dict(inputs)
+
+        self._count(hit=True, tokens_saved=prefix_length)
+        return {
+            "input_ids": input_ids,
+            "attention_mask": inputs["attention_mask"],
+            # generate extends the cache in place, so every call gets a copy
+            "past_key_values": copy.deepcopy(past_key_values),
+        }
@@ -0,0 +1,193 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Callable, List, Optional
+
+# Put before the kept turns by chat_pipeline.build_prompt; the packer
+# charges for it (and the newline after the turns) when history is kept
+HISTORY_HEADING = "\nPrevious conversation:\n"
+
+
+class TokenCounter:
+    """Counts tokens with the model's tokenizer, memoising by text
+
+    Retrieved chunks and earlier chat turns come back request after request,
+    so each distinct text is tokenized once and then served from an LRU map.
+    """
+
+    def __init__(self, tokenizer, max_entries: int = 4096):
+        self.tokenizer = tokenizer
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._counts: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = Lock()
+
+    def __call__(self, text: str) -> int:
+        with self._lock:
+            count = self._counts.get(text)
+            if count is not None:
+                self._counts.move_to_end(text)
+                self.hits += 1
+                return count
+
+        count = len(self.tokenizer.encode(text, add_special_tokens=False))
+        with self._lock:
+            self.misses += 1
+            self._counts[text] = count
+            if len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+        return count
+
+    def count(self, text: str) -> int:
+        """Tokens in `text` without caching it, for text that rarely repeats"""
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        ids = self.tokenizer.encode(text, add_special_tokens=False)[:max_tokens]
+        return self.tokenizer.decode(ids, skip_special_tokens=True)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"size": len(self._counts), "hits": self.hits, "misses": self.misses}
+
+
+@dataclass
+class PackedPrompt:
+    text: str
+    source_documents: List[str]
+    report: dict = field(default_factory=dict)
+
+
+class PromptPacker:
+    """Fits retrieved chunks and chat history into a prompt token budget
+
+    The system prompt, question and template are always included. Context
+    chunks are added in rank order up to `max_context_tokens` (the last one
+    may be cut short), then the conversation summary if there is one, then
+    history newest first while it fits. `render(prompt, context, history,
+    summary)` builds the prompt text.
+    Token counts of the individual pieces are summed, so the total is an
+    estimate that can differ from the joint tokenization by a few tokens.
+    """
+
+    def __init__(
+        self,
+        tokenizer,
+        render: Callable[[str, str, list, Optional[str]], str],
+        format_message: Callable[[object], str],
+        budget: int = 1536,
+        max_context_tokens: int = 600,
+        max_history_messages: int = 10,
+        min_truncated_chunk_tokens: int = 32,
+    ):
+        self.render = render
+        self.format_message = format_message
+        self.budget = budget
+        self.max_context_tokens = max_context_tokens
+        self.max_history_messages = max_history_messages
+        self.min_truncated_chunk_tokens = min_truncated_chunk_tokens
+        self.chunk_tokens = TokenCounter(tokenizer)
+        self.message_tokens = TokenCounter(tokenizer)
+        self.fixed_tokens = TokenCounter(tokenizer, max_entries=1024)
+        self.packed = 0
+        # pack() runs in worker threads (asyncio.to_thread)
+        self._lock = Lock()
+        self._spent = {
+            "fixed_tokens": 0, "context_tokens": 0, "summary_tokens": 0, "history_tokens": 0, "total_tokens": 0,
+        }
+
+    def pack(
+        self, prompt: str, chunks: List[dict], history: Optional[list] = None, summary: Optional[str] = None
+    ) -> PackedPrompt:
+        history = history or []
+        # The template and system prompt are the same for every request and
+        # served from the cache; only the question is tokenized each time
+        template_tokens = self.fixed_tokens(self.render("", "", [], None))
+        base_tokens = template_tokens + self.fixed_tokens.count(prompt)
+        remaining = self.budget - base_tokens
+
+        # Context chunks, in rank order
+        context_parts = []
+        source_documents = []
+        context_tokens = 0
+        truncated = False
+        context_limit = min(self.max_context_tokens, remaining)
+        for chunk in chunks:
+            cost = self.chunk_tokens(chunk["text"]) + 1
+            text = chunk["text"]
+            if context_tokens + cost > context_limit:
+                room = context_limit - context_tokens - 1
+                if room < self.min_truncated_chunk_tokens:
+                    break
+                text = self.chunk_tokens.truncate(text, room) + "..."
+                cost = room + 1
+                truncated = True
+            context_parts.append(text)
+            context_tokens += cost
+            if "source_document" in chunk:
+                source_documents.append(chunk["source_document"])
+            if truncated:
+                break
+        remaining -= context_tokens
+
+        # The rolling summary of older turns, with its heading; dropped
+        # whole if it does not fit
+        summary_tokens = 0
+        if summary:
+            # Rendered without the question, so the count is reused for as
+            # long as the conversation keeps the same summary
+            summary_tokens = self.fixed_tokens(self.render("", "", [], summary)) - template_tokens
+            if summary_tokens > remaining:
+                summary, summary_tokens = None, 0
+        remaining -= summary_tokens
+
+        # History, newest first; a turn that does not fit ends the search so
+        # the kept history stays contiguous. The heading only appears with
+        # history, so the first turn pays for it
+        kept_history = []
+        history_tokens = 0
+        for message in reversed(history[-self.max_history_messages:]):
+            cost = self.message_tokens(self.format_message(message)) + 1
+            if not kept_history:
+                cost += self.fixed_tokens(HISTORY_HEADING + "\n")
+            if history_tokens + cost > remaining:
+                break
+            kept_history.insert(0, message)
+            history_tokens += cost
+
+        context = "\n\n".join(context_parts)
+        report = {
+            "budget": self.budget,
+            "fixed_tokens": base_tokens,
+            "context_tokens": context_tokens,
+            "summary_tokens": summary_tokens,
+            "history_tokens": history_tokens,
+            "total_tokens": base_tokens + context_tokens + summary_tokens + history_tokens,
+            "chunks_used": len(context_parts),
+            "chunks_dropped": len(chunks) - len(context_parts),
+            "chunk_truncated": truncated,
+            "summary_used": summary_tokens > 0,
+            "history_used": len(kept_history),
+            "history_dropped": len(history) - len(kept_history),
+        }
+        with self._lock:
+            self.packed += 1
+            for key in self._spent:
+                self._spent[key] += report[key]
+        return PackedPrompt(
+            text=self.render(prompt, context, kept_history, summary) if context_parts else "",
+            source_documents=list(dict.fromkeys(source_documents)),
+            report=report,
+        )
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            packed, spent = self.packed, dict(self._spent)
+        return {
+            "budget": self.budget,
+            "prompts_packed": packed,
+            **{f"avg_{key}": value / packed if packed else 0.0 for key, value in spent.items()},
+            "chunk_token_cache": self.chunk_tokens.snapshot(),
+            "message_token_cache": self.message_tokens.snapshot(),
+        }
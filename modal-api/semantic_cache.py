@@ -0,0 +1,136 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from typing import List, Optional, Tuple
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+
+    def snapshot(self, size: int) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+class SemanticCache:
+    """Answer cache keyed on query embeddings
+
+    Entries live in fixed slots of a preallocated matrix of normalised
+    embeddings, so a lookup is a single matrix-vector product, with empty
+    and expired slots masked out before the best match is picked. A hit
+    needs cosine similarity >= `threshold` and an entry younger than
+    `ttl_seconds`; the least recently used entry is evicted when all
+    `max_entries` slots are taken.
+    """
+
+    def __init__(self, threshold: float = 0.92, max_entries: int = 1024, ttl_seconds: float = 3600):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.stats = CacheStats()
+        self._lock = Lock()
+        self._vectors = None
+        # Per-slot store time; -inf marks an empty slot
+        self._stored_at = None
+        # slot -> (stored_at, response, source_documents), in LRU order
+        self._entries: "OrderedDict[int, Tuple[float, str, List[str]]]" = OrderedDict()
+        self._free_slots: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _normalise(self, vector):
+        import numpy as np
+
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _allocate(self, dim: int):
+        import numpy as np
+
+        self._vectors = np.zeros((self.max_entries, dim), dtype=np.float32)
+        self._stored_at = np.full(self.max_entries, -np.inf)
+        self._free_slots = list(range(self.max_entries - 1, -1, -1))
+
+    def _remove(self, slot: int):
+        del self._entries[slot]
+        self._vectors[slot] = 0
+        self._stored_at[slot] = float("-inf")
+        self._free_slots.append(slot)
+
+    def lookup(self, query_vector) -> Optional[Tuple[str, List[str]]]:
+        """Return the cached (response, source_documents) for a similar query"""
+        import numpy as np
+
+        query = self._normalise(query_vector)
+        with self._lock:
+            if not self._entries:
+                self.stats.misses += 1
+                return None
+
+            # Expired entries can never hit again, so drop them here; the
+            # nearest live entry still gets its chance
+            live = self._stored_at >= time.monotonic() - self.ttl_seconds
+            expired = np.flatnonzero(~live & np.isfinite(self._stored_at))
+            for slot in expired.tolist():
+                self._remove(slot)
+            self.stats.expirations += len(expired)
+
+            scores = np.where(live, self._vectors @ query, -np.inf)
+            slot = int(scores.argmax())
+            if scores[slot] < self.threshold:
+                self.stats.misses += 1
+                return None
+
+            _, response, source_documents = self._entries[slot]
+            self._entries.move_to_end(slot)
+            self.stats.hits += 1
+            return response, list(source_documents)
+
+    def store(self, query_vector, response: str, source_documents: List[str]):
+        query = self._normalise(query_vector)
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != query.shape[0]:
+                self._allocate(query.shape[0])
+                self._entries.clear()
+
+            if not self._free_slots:
+                lru_slot = next(iter(self._entries))
+                self._remove(lru_slot)
+                self.stats.evictions += 1
+
+            slot = self._free_slots.pop()
+            stored_at = time.monotonic()
+            self._vectors[slot] = query
+            self._stored_at[slot] = stored_at
+            self._entries[slot] = (stored_at, response, list(source_documents))
+            self.stats.stores += 1
+
+    def invalidate(self):
+        """Drop every entry, e.g. after the RAG index has been reloaded"""
+        with self._lock:
+            self._entries.clear()
+            if self._vectors is not None:
+                self._allocate(self._vectors.shape[1])
+            self.stats.invalidations += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return self.stats.snapshot(len(self._entries))
@@ -1,11 +1,26 @@
+import asyncio
 import modal
-from typing import Optional, List, Dict
-from pydantic import BaseModel
 import os
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI
-import json
-from fastapi.responses import JSONResponse
+from contextlib import nullcontext
+from typing import List, Optional
+from fastapi import Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from admission import Rejected, register_gauges, release_after
+from chat_pipeline import (
+    ADMISSION_ENABLED,
+    ADMISSION_MAX_CONCURRENCY,
+    ADMISSION_MAX_QUEUE,
+    BATCH_MAX_SIZE,
+    BATCHING_ENABLED,
+    SESSION_COOKIE,
+    SUMMARY_MAX_QUEUE,
+    ChatPipeline,
+    ChatRequest,
+    SummaryRequest,
+)
+from startup import has_safetensors
+from timing import REGISTRY, start_request, timed_stream
 
 # Create Modal app
 app = modal.App("example-llm")
@@ -36,276 +51,190 @@ MODEL_DIR = "/model"
 # Create volume for model caching
 model_volume = modal.Volume.from_name("model-cache", create_if_missing=True)
 
-class Message(BaseModel):
-    content: str
-    is_user: bool
-    timestamp: Optional[str] = None
-
-class ChatRequest(BaseModel):
-    prompt: str
-    conversation_id: Optional[int] = None
-    history: Optional[List[Message]] = None
-
-class ChatResponse(BaseModel):
-    response: str
-    error: Optional[str] = None
-    source_documents: List[str] = []
-
-    model_config = {
-        "json_schema_extra": {
-            "examples": [
-                {
-                    "response": "Example response",
-                    "error": None,
-                    "source_documents": ["https://example.com/doc1"]
-                }
-            ]
-        }
-    }
-
-def format_chat_history(history: List[Message]) -> str:
-    """Format chat history into a string, limiting to recent messages that fit in context window"""
-    formatted_history = []
-    for msg in history[-5:]:  # Limit to last 5 messages to stay within context window
-        role = "Previous User Question" if msg.is_user else "Previous Assistant Answer"
-        formatted_history.append(f"{role}:\n{msg.content}\n")
-    return "\n".join(formatted_history)
-
-def is_library_hours_query(prompt: str) -> bool:
-    """Check if the query is about library hours"""
-    prompt_lower = prompt.lower()
-    library_keywords = ['library']
-    time_keywords = ['opening', 'hours', 'time', 'open', 'close', 'when']
-    
-    has_library = any(keyword in prompt_lower for keyword in library_keywords)
-    has_time = any(keyword in prompt_lower for keyword in time_keywords)
-    
-    return has_library and has_time
+# With admission control the container accepts the queues as well as the
+# requests generating, and sheds the excess itself
+if ADMISSION_ENABLED:
+    CONCURRENT_INPUTS = ADMISSION_MAX_CONCURRENCY + ADMISSION_MAX_QUEUE + SUMMARY_MAX_QUEUE
+else:
+    CONCURRENT_INPUTS = BATCH_MAX_SIZE if BATCHING_ENABLED else 1
+
+def rejection_response(rejected: Rejected, empty: Optional[dict] = None) -> JSONResponse:
+    if empty is None:
+        empty = {"response": "", "source_documents": []}
+    return JSONResponse(
+        {**empty, "error": str(rejected)},
+        status_code=rejected.status,
+        headers={"Retry-After": str(rejected.retry_after)},
+    )
 
 @app.cls(
     gpu="A10G",
     image=image,
     volumes={MODEL_DIR: model_volume},
     mounts=[rag_files],
-    secrets=[modal.Secret.from_name("huggingface-secret")]
+    secrets=[modal.Secret.from_name("huggingface-secret")],
+    allow_concurrent_inputs=CONCURRENT_INPUTS,
 )
-class Model:
-    def __init__(self):
-        self.faiss_index = None
-        self.document_lookup = None
-        self.embedding_model = None
-
+class Model(ChatPipeline):
     @modal.enter()
     def load(self):
+        # The LLM, the embedding model, the FAISS index and the chunks load
+        # concurrently; see ChatPipeline.cold_start
+        self.startup = self.cold_start("/root/rag")
+        print(f"Cold start:\n{self.startup.format()}")
+        print(f"System prompt prefix cached: {self.prefix_cache.stats.snapshot()}")
+        register_gauges(self.admission)
+
+    def admitted(self, http_request: Request):
+        """A generation slot for the request's session; raises Rejected when busy"""
+        if not ADMISSION_ENABLED:
+            return nullcontext()
+        return self.admission.admit(http_request.cookies.get(SESSION_COOKIE))
+
+    def load_llm(self):
+        return self._load_cached(MODEL_ID, f"{MODEL_DIR}/cache")
+
+    def load_draft_model(self):
+        # Loads alongside the main model; it shares the main tokenizer
+        if not self.draft_model_id:
+            return None
+        model, _ = self._load_cached(self.draft_model_id, f"{MODEL_DIR}/draft-cache")
+        return model
+
+    def _load_cached(self, model_id, cache_path):
         import torch
         from transformers import AutoModelForCausalLM, AutoTokenizer
 
         # Define cache paths
-        cache_path = f"{MODEL_DIR}/cache"
         model_path = f"{cache_path}/model"
         tokenizer_path = f"{cache_path}/tokenizer"
-        
-        print("Loading model and tokenizer...")
+        model_kwargs = dict(torch_dtype=torch.float16, device_map="auto", use_cache=True)
+
         if os.path.exists(model_path):
-            print("Loading from cache...")
-            self.model = AutoModelForCausalLM.from_pretrained(
-                model_path,
-                torch_dtype=torch.float16,
-                device_map="auto",
-                use_cache=True
-            )
-            self.tokenizer = AutoTokenizer.from_pretrained(tokenizer_path)
+            # safetensors weights are memory-mapped instead of unpickled
+            safetensors = has_safetensors(model_path)
+            model = AutoModelForCausalLM.from_pretrained(model_path, use_safetensors=safetensors, **model_kwargs)
+            tokenizer = AutoTokenizer.from_pretrained(tokenizer_path)
+            if not safetensors:
+                # One-off conversion of an older pickled cache
+                model.save_pretrained(model_path, safe_serialization=True)
         else:
-            print("Downloading model...")
             os.makedirs(cache_path, exist_ok=True)
-            
-            self.model = AutoModelForCausalLM.from_pretrained(
-                MODEL_ID,
-                use_auth_token=os.environ["HUGGING_FACE_TOKEN"],
-                torch_dtype=torch.float16,
-                device_map="auto",
-                use_cache=True
-            )
-            self.tokenizer = AutoTokenizer.from_pretrained(
-                MODEL_ID,
-                use_auth_token=os.environ["HUGGING_FACE_TOKEN"]
-            )
-            
-            # Save model and tokenizer
-            self.model.save_pretrained(model_path)
-            self.tokenizer.save_pretrained(tokenizer_path)
-
-        if self.tokenizer.pad_token_id is None:
-            self.tokenizer.pad_token_id = self.tokenizer.eos_token_id
-        if self.tokenizer.eos_token_id is None:
-            self.tokenizer.eos_token_id = self.tokenizer.convert_tokens_to_ids("</s>")
-
-        print("Model ready")
-        self._load_rag()
-
-    def _load_rag(self):
-        import faiss
-        from sentence_transformers import SentenceTransformer
-        
-        print("Loading RAG components...")
-        print(f"Checking contents of /root/rag:")
-        print(os.listdir("/root/rag"))
-        
-        # Load embedding model
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-        
-        # Load FAISS index
-        faiss_path = "/root/rag/faiss_index.bin"
-        print(f"Loading FAISS index from: {faiss_path}")
-        print(f"File exists: {os.path.exists(faiss_path)}")
-        self.faiss_index = faiss.read_index(faiss_path)
-        
-        # Load document lookup
-        lookup_path = "/root/rag/document_lookup.json"
-        print(f"Loading document lookup from: {lookup_path}")
-        print(f"File exists: {os.path.exists(lookup_path)}")
-        with open(lookup_path, "r") as f:
-            self.document_lookup = json.load(f)
-            
-        print("RAG components loaded successfully")
-
-    def retrieve_context(self, query: str, k: int = 5) -> tuple[str, List[str]]:
-        # Check if query is about non-university topics
-        non_uni_keywords = ['restaurant', 'weather', 'forecast', 'pizza', 'pub', 'council', 'tax', 
-                          'cinema', 'movie', 'train', 'bus', 'shopping', 'store', 'shop']
-        query_lower = query.lower()
-        if any(keyword in query_lower for keyword in non_uni_keywords):
-            return "", []
-
-        # Encode query
-        query_vector = self.embedding_model.encode([query])[0]
-        
-        # Search FAISS index
-        D, I = self.faiss_index.search(
-            query_vector.reshape(1, -1).astype('float32'), 
-            k
-        )
-        
-        # Get relevant chunks
-        relevant_chunks = []
-        source_documents = []
-        total_chars = 0
-        max_chars = 2000
-        
-        # Track relevance score
-        max_score = 0
-        
-        for score, idx in zip(D[0], I[0]):
-            if str(idx) in self.document_lookup:
-                max_score = max(max_score, score)
-                chunk = self.document_lookup[str(idx)]
-                chunk_text = chunk['text']
-                
-                # Include more chunks by being very lenient
-                if score < 0.01:  # Very lenient threshold
-                    continue
-                
-                if total_chars + len(chunk_text) > max_chars:
-                    remaining_chars = max_chars - total_chars
-                    if remaining_chars > 100:
-                        chunk_text = chunk_text[:remaining_chars] + "..."
-                        relevant_chunks.append(chunk_text)
-                        if 'source_document' in chunk:
-                            source_documents.append(chunk['source_document'])
-                    break
-                
-                relevant_chunks.append(chunk_text)
-                if 'source_document' in chunk:
-                    source_documents.append(chunk['source_document'])
-                total_chars += len(chunk_text)
-                
-                if total_chars >= max_chars:
-                    break
+            token = os.environ["HUGGING_FACE_TOKEN"]
+            model = AutoModelForCausalLM.from_pretrained(model_id, token=token, **model_kwargs)
+            tokenizer = AutoTokenizer.from_pretrained(model_id, token=token)
 
-        # Very lenient threshold
-        if max_score < 0.01:
-            return "", []
-            
-        # Format context
-        return "\n\n".join(relevant_chunks), list(set(source_documents))
+            # Save model and tokenizer
+            model.save_pretrained(model_path, safe_serialization=True)
+            tokenizer.save_pretrained(tokenizer_path)
+
+        return model, tokenizer
+
+    @modal.web_endpoint(method="GET")
+    def stats(self):
+        return {
+            "batching": self.scheduler.metrics.snapshot(),
+            "answer_cache": self.answer_cache.snapshot(),
+            "prefix_cache": self.prefix_cache.stats.snapshot(),
+            "prompt_packing": self.packer.snapshot(),
+            "retrieval": self.retriever.snapshot(),
+            "embedding": self.embedding_model.snapshot() if hasattr(self.embedding_model, "snapshot") else None,
+            "startup": self.startup.snapshot(),
+            "speculative": self.assisted.stats.snapshot() if self.assisted else None,
+            "admission": self.admission.snapshot(),
+        }
 
-    def generate(self, prompt: str, history: Optional[List[Message]] = None) -> tuple[str, List[str]]:
-        context, source_docs = self.retrieve_context(prompt)
-        
-        if not context.strip():
-            return "No specific information available", []
-        
-        system_prompt = (
-            "You are a University of Hull assistant. Your role is to:\n"
-            "1. Provide accurate information from the context\n"
-            "2. Give clear, direct answers without greetings or meta-language\n"
-            "3. Keep responses concise and relevant\n"
-            "4. Say 'No specific information available' when unsure\n"
-            "5. Present lists and steps in a clear format"
+    @modal.web_endpoint(method="POST")
+    async def chat_stream(self, request: ChatRequest, http_request: Request):
+        timer = start_request()
+        events = self.generate_stream(request.prompt, request.history, request.summary)
+        background = None
+        if ADMISSION_ENABLED:
+            try:
+                ticket = await self.admission.acquire(http_request.cookies.get(SESSION_COOKIE))
+            except Rejected as e:
+                timer.finish("chat_stream")
+                return rejection_response(e)
+            # The slot is held until the last event is sent; the background
+            # task covers a client that disconnects before the first one
+            events = release_after(events, ticket)
+            background = BackgroundTask(ticket.release)
+        return StreamingResponse(
+            timed_stream(events, timer, "chat_stream"),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            background=background,
         )
 
-        chat_context = ""
-        if history:
-            chat_context = f"\nPrevious conversation:\n{format_chat_history(history)}\n"
-
-        formatted_prompt = f"""<s>[INST] <<SYS>>
-{system_prompt}
-
-Context:
-{context}
+    @modal.method()
+    def speculative_speedup(self, prompts: List[str]) -> dict:
+        return self.compare_decoding(prompts)
 
-{chat_context if history else ""}
-Question: {prompt} [/INST]"""
-
-        outputs = self.model.generate(
-            **self.tokenizer(formatted_prompt, return_tensors="pt").to(self.model.device),
-            max_new_tokens=150,
-            min_new_tokens=10,
-            temperature=0.1,
-            do_sample=True,
-            top_p=0.9,
-            repetition_penalty=1.2,
-            eos_token_id=self.tokenizer.eos_token_id,
-            pad_token_id=self.tokenizer.pad_token_id,
-        )
-        output_text = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-
-        if "[/INST]" in output_text:
-            assistant_response = output_text.split("[/INST]", 1)[1].strip()
-        else:
-            assistant_response = output_text.strip()
-
-        cleaned_response = assistant_response.replace("</s>", "").strip()
-        
-        if sum(c.isdigit() for c in cleaned_response) > len(cleaned_response) * 0.3:
-            return "Error occurred. Please try again.", []
-            
-        # Return only the most relevant source document
-        most_relevant_source = source_docs[0] if source_docs else []
-        return cleaned_response, [most_relevant_source] if most_relevant_source else []
+    @modal.web_endpoint(method="GET")
+    def metrics(self):
+        return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
     @modal.web_endpoint(method="POST")
-    async def chat(self, request: ChatRequest):
+    async def chat(self, request: ChatRequest, http_request: Request):
+        timer = start_request()
         try:
-            # Get response and source docs from model
-            response, source_docs = self.generate(request.prompt, request.history)
-            
+            async with self.admitted(http_request):
+                # Get response and source docs from model
+                if BATCHING_ENABLED:
+                    response, source_docs = await self.generate_async(request.prompt, request.history, request.summary)
+                else:
+                    # In a thread, so queued requests are still admitted or shed meanwhile
+                    response, source_docs = await asyncio.to_thread(
+                        self.generate, request.prompt, request.history, request.summary
+                    )
+
             # Create minimal response with single most relevant source
-            return {
+            body = {
                 "response": response,
                 "source_documents": source_docs,
                 "error": None
             }
-            
+
+        except Rejected as e:
+            timer.finish("chat")
+            return rejection_response(e)
         except Exception as e:
-            return {
+            body = {
                 "response": "",
                 "source_documents": [],
                 "error": str(e)
             }
 
+        timer.finish("chat")
+        server_timing = timer.server_timing()
+        return JSONResponse(body, headers={"Server-Timing": server_timing} if server_timing else None)
+
+    @modal.web_endpoint(method="POST")
+    async def summarize(self, request: SummaryRequest):
+        # Called by the chat backend in the background, never while a user waits
+        timer = start_request()
+        try:
+            summary = await self.summarize_async(request.messages, request.summary)
+            body = {"summary": summary, "error": None}
+        except Rejected as e:
+            timer.finish("summarize")
+            return rejection_response(e, {"summary": ""})
+        except Exception as e:
+            body = {"summary": "", "error": str(e)}
+        timer.finish("summarize")
+        return body
+
 @app.local_entrypoint()
-def main():
+def main(speculative: bool = False):
     model = Model()
+    if speculative:
+        # modal run simple_llm.py --speculative (needs DRAFT_MODEL_ID)
+        print(model.speculative_speedup.remote([
+            "What are the library opening hours?",
+            "How do I apply for student accommodation?",
+            "When are tuition fees due?",
+            "What support is there for international students?",
+        ]))
+        return
     response = model.generate("What are the library opening hours?")
     print("Response:", response)
@@ -0,0 +1,139 @@
+"""Assisted (speculative) decoding with a small draft model
+
+The draft model proposes a few tokens at a time and the main model checks
+them all in one forward pass, keeping the accepted prefix. Generation goes
+through Hugging Face's `assistant_model` support, so sampling settings,
+the repetition penalty and the prefix KV cache apply exactly as in plain
+`generate`. The draft must share the main model's tokenizer, e.g.
+TinyLlama-1.1B for Llama-2.
+
+Transformers does not report how many drafted tokens were kept, so it is
+derived from forward-pass counts (per thread, so concurrent requests do
+not mix). Every main-model pass verifies one round of drafts and yields
+the accepted tokens plus one token of its own:
+
+    accepted = new_tokens - main_passes
+    acceptance_rate = accepted / draft_passes
+
+With no draft model accepted, every token costs a main-model pass as in
+plain decoding; `tokens_per_main_pass` is the upper bound on the speedup
+before the draft's own cost. `AssistedDecoding.compare` measures the real
+one: it times plain and assisted `generate` on the same prompts.
+"""
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+
+class ForwardCounter:
+    """Counts a module's forward passes, separately for each thread"""
+
+    def __init__(self, module):
+        self._local = threading.local()
+        module.register_forward_hook(self._hook)
+
+    def _hook(self, module, inputs, outputs):
+        self._local.count = getattr(self._local, "count", 0) + 1
+
+    def reset(self):
+        self._local.count = 0
+
+    def read(self) -> int:
+        return getattr(self._local, "count", 0)
+
+
+@dataclass
+class SpeculativeStats:
+    generations: int = 0
+    new_tokens: int = 0
+    main_passes: int = 0
+    draft_passes: int = 0
+    accepted_tokens: int = 0
+    total_seconds: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, new_tokens: int, main_passes: int, draft_passes: int, seconds: float):
+        with self._lock:
+            self.generations += 1
+            self.new_tokens += new_tokens
+            self.main_passes += main_passes
+            self.draft_passes += draft_passes
+            self.accepted_tokens += max(new_tokens - main_passes, 0)
+            self.total_seconds += seconds
+
+    def snapshot(self) -> dict:
+        return {
+            "generations": self.generations,
+            "new_tokens": self.new_tokens,
+            "acceptance_rate": self.accepted_tokens / self.draft_passes if self.draft_passes else 0.0,
+            "tokens_per_main_pass": self.new_tokens / self.main_passes if self.main_passes else 0.0,
+            "tokens_per_second": self.new_tokens / self.total_seconds if self.total_seconds else 0.0,
+        }
+
+
+class AssistedDecoding:
+    """`generate` on `model` with `draft_model` proposing tokens"""
+
+    def __init__(self, model, draft_model, num_assistant_tokens: int = 5, confidence_threshold: Optional[float] = None):
+        if draft_model is model:
+            raise ValueError("The draft model must be a separate model instance")
+        self.model = model
+        self.draft_model = draft_model
+        # A constant draft length keeps acceptance comparable across requests
+        draft_model.generation_config.num_assistant_tokens = num_assistant_tokens
+        draft_model.generation_config.num_assistant_tokens_schedule = "constant"
+        if confidence_threshold is not None:
+            # The draft stops early once its own next-token probability
+            # falls below this; 0 always drafts `num_assistant_tokens`
+            draft_model.generation_config.assistant_confidence_threshold = confidence_threshold
+        self.stats = SpeculativeStats()
+        self._main_passes = ForwardCounter(model)
+        self._draft_passes = ForwardCounter(draft_model)
+
+    def generate(self, **kwargs):
+        """Same arguments and output as `model.generate`, for a single sequence"""
+        self._main_passes.reset()
+        self._draft_passes.reset()
+        start = time.perf_counter()
+        outputs = self.model.generate(**kwargs, assistant_model=self.draft_model)
+        new_tokens = outputs.shape[1] - kwargs["input_ids"].shape[1]
+        self.stats.record(
+            new_tokens,
+            self._main_passes.read(),
+            self._draft_passes.read(),
+            time.perf_counter() - start,
+        )
+        return outputs
+
+    def compare(self, inputs: List[dict], **kwargs) -> dict:
+        """Wall-clock plain vs assisted `generate` on the same tokenized prompts
+
+        Each call is warmed up once, then every prompt runs through plain
+        `model.generate` and through `generate`. Acceptance figures cover
+        these assisted runs only; the running stats are left as they were.
+        """
+        def timed(generate) -> List[float]:
+            generate(**inputs[0], **kwargs)  # warm-up
+            seconds = []
+            for prompt_inputs in inputs:
+                start = time.perf_counter()
+                generate(**prompt_inputs, **kwargs)
+                seconds.append(time.perf_counter() - start)
+            return seconds
+
+        plain = timed(self.model.generate)
+        running, self.stats = self.stats, SpeculativeStats()
+        try:
+            assisted = timed(self.generate)
+            stats = self.stats.snapshot()
+        finally:
+            self.stats = running
+        return {
+            "prompts": len(inputs),
+            "plain_ms": 1000 * sum(plain),
+            "assisted_ms": 1000 * sum(assisted),
+            "speedup": sum(plain) / sum(assisted),
+            "acceptance_rate": stats["acceptance_rate"],
+            "tokens_per_main_pass": stats["tokens_per_main_pass"],
+        }
@@ -0,0 +1,265 @@
+import json
+import time
+from queue import Empty
+from threading import Event, Thread
+from typing import Callable, Iterator, List, Optional
+
+INST_MARKER = "[/INST]"
+EOS_MARKER = "</s>"
+DIGIT_ERROR_MESSAGE = "Error occurred. Please try again."
+
+
+def sse_event(event: str, data: dict) -> str:
+    """Format a single Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class HFGeneratorBackend:
+    """Streams decoded text from a Hugging Face causal LM as it is generated
+
+    Generation runs in a worker thread. An exception there is re-raised in
+    the consumer once the stream ends, and a generation that produces no
+    text for `token_timeout` seconds raises TimeoutError instead of
+    blocking the response forever.
+    """
+
+    def __init__(self, model, tokenizer, prefix_cache=None, assisted=None, token_timeout: float = 60.0):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.prefix_cache = prefix_cache
+        # Speculative decoding (speculative.AssistedDecoding), if enabled
+        self.assisted = assisted
+        self.token_timeout = token_timeout
+
+    def stream(self, formatted_prompt: str, **generation_kwargs) -> Iterator[str]:
+        from transformers import StoppingCriteriaList, TextIteratorStreamer
+
+        if self.prefix_cache is not None:
+            inputs = self.prefix_cache.prepare(formatted_prompt)
+        else:
+            inputs = self.tokenizer(formatted_prompt, return_tensors="pt").to(self.model.device)
+        streamer = TextIteratorStreamer(
+            self.tokenizer,
+            skip_prompt=True,
+            skip_special_tokens=True,
+            timeout=self.token_timeout,
+        )
+        # Lets the consumer stop generation early (e.g. client disconnected
+        # or the digit guard tripped) instead of running to max_new_tokens
+        cancelled = Event()
+        stopping_criteria = StoppingCriteriaList(
+            [lambda input_ids, scores, **kwargs: cancelled.is_set()]
+        )
+        generate = self.assisted.generate if self.assisted is not None else self.model.generate
+        errors = []
+
+        def run(**kwargs):
+            try:
+                generate(**kwargs)
+            except Exception as exc:
+                # Unblock the consumer; it re-raises once the stream ends
+                errors.append(exc)
+                streamer.end()
+
+        thread = Thread(
+            target=run,
+            kwargs={
+                **inputs,
+                **generation_kwargs,
+                "streamer": streamer,
+                "stopping_criteria": stopping_criteria,
+            },
+            daemon=True,
+        )
+        thread.start()
+        exhausted = timed_out = False
+        try:
+            try:
+                for text in streamer:
+                    if text:
+                        yield text
+                exhausted = True
+            except Empty:
+                timed_out = True
+                raise TimeoutError(f"No text generated for {self.token_timeout:g}s") from None
+            if errors:
+                raise errors[0]
+        finally:
+            cancelled.set()
+            if not exhausted and not timed_out:
+                # Stopped early: let generate notice and finish its last token
+                try:
+                    for _ in streamer:
+                        pass
+                except Empty:
+                    timed_out = True
+            if not timed_out:
+                thread.join()
+
+
+class StubGeneratorBackend:
+    """CPU-only backend that replays a canned answer word by word
+
+    Used to exercise the streaming path (and measure time-to-first-token)
+    without Modal, a GPU or Llama-2 weights.
+    """
+
+    def __init__(
+        self,
+        response: str = "The Brynmor Jones Library is open 24 hours a day during term time.",
+        first_token_delay: float = 0.05,
+        token_delay: float = 0.01,
+    ):
+        self.response = response
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+
+    def stream(self, formatted_prompt: str, **generation_kwargs) -> Iterator[str]:
+        max_new_tokens = generation_kwargs.get("max_new_tokens")
+        words = self.response.split(" ")
+        if max_new_tokens:
+            words = words[:max_new_tokens]
+
+        time.sleep(self.first_token_delay)
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(self.token_delay)
+            yield word if i == 0 else " " + word
+
+
+def load_tiny_backend(seed: int = 0) -> HFGeneratorBackend:
+    """Wrap a tiny randomly initialised Llama model for CPU-only testing"""
+    from tiny_llm import build_tiny_model
+
+    model, tokenizer = build_tiny_model(seed=seed)
+    return HFGeneratorBackend(model, tokenizer)
+
+
+class ResponseStreamFilter:
+    """Applies the `generate` post-processing incrementally
+
+    Drops stray `[/INST]` and `</s>` markers (or, with `skip_until_marker`,
+    everything up to the first `[/INST]` when the prompt is echoed back) and
+    trips the "too many digits" guard as soon as enough text has been seen
+    to judge it. Text that could still turn into a marker is held back
+    until the next chunk arrives.
+    """
+
+    def __init__(
+        self,
+        max_digit_ratio: float = 0.3,
+        min_chars_for_guard: int = 40,
+        skip_until_marker: bool = False,
+    ):
+        self.max_digit_ratio = max_digit_ratio
+        self.min_chars_for_guard = min_chars_for_guard
+        self.awaiting_marker = skip_until_marker
+        self.buffer = ""
+        self.emitted_chars = 0
+        self.digit_count = 0
+        self.tripped = False
+
+    def _held_back(self, text: str) -> int:
+        """Length of the suffix of `text` that could start a marker"""
+        held = 0
+        for marker in (INST_MARKER, EOS_MARKER):
+            for size in range(min(len(marker) - 1, len(text)), 0, -1):
+                if marker.startswith(text[-size:]):
+                    held = max(held, size)
+                    break
+        return held
+
+    def _emit(self, text: str) -> str:
+        if not self.emitted_chars:
+            text = text.lstrip()
+        self.emitted_chars += len(text)
+        self.digit_count += sum(c.isdigit() for c in text)
+        return text
+
+    def _digits_exceeded(self) -> bool:
+        return self.digit_count > self.emitted_chars * self.max_digit_ratio
+
+    def feed(self, text: str) -> str:
+        """Add a decoded chunk and return the text that is safe to send"""
+        if self.tripped:
+            return ""
+
+        self.buffer += text
+        if self.awaiting_marker:
+            if INST_MARKER not in self.buffer:
+                return ""
+            self.buffer = self.buffer.split(INST_MARKER, 1)[1]
+            self.awaiting_marker = False
+        for marker in (INST_MARKER, EOS_MARKER):
+            self.buffer = self.buffer.replace(marker, "")
+
+        split_at = len(self.buffer) - self._held_back(self.buffer)
+        ready, self.buffer = self.buffer[:split_at], self.buffer[split_at:]
+        ready = self._emit(ready)
+
+        if self.emitted_chars >= self.min_chars_for_guard and self._digits_exceeded():
+            self.tripped = True
+            return ""
+        return ready
+
+    def flush(self) -> str:
+        """Release any held-back text once generation has finished"""
+        if self.tripped:
+            return ""
+        remaining = self._emit(self.buffer.replace(EOS_MARKER, "").rstrip())
+        self.buffer = ""
+        self.awaiting_marker = False
+        if self.emitted_chars and self._digits_exceeded():
+            self.tripped = True
+            return ""
+        return remaining
+
+
+def stream_chat_events(
+    backend,
+    formatted_prompt: Optional[str],
+    source_documents: List[str],
+    on_complete: Optional[Callable[[str, List[str]], None]] = None,
+    **generation_kwargs,
+) -> Iterator[str]:
+    """Yield SSE events for a single chat turn
+
+    Emits `token` events as text is decoded, then either `done` with the
+    source documents or `error` if the digit guard trips, generation fails
+    or it stalls. `on_complete` receives the full response and sources of
+    a successful stream.
+    """
+    if formatted_prompt is None:
+        yield sse_event("token", {"text": "No specific information available"})
+        yield sse_event("done", {"source_documents": []})
+        return
+
+    response_filter = ResponseStreamFilter()
+    sent = []
+    try:
+        for piece in backend.stream(formatted_prompt, **generation_kwargs):
+            text = response_filter.feed(piece)
+            if response_filter.tripped:
+                break
+            if text:
+                sent.append(text)
+                yield sse_event("token", {"text": text})
+    except (RuntimeError, TimeoutError) as exc:
+        # The status line has already gone out; tell the client in-band
+        # so a failure is not mistaken for the end of the answer
+        yield sse_event("error", {"error": str(exc)})
+        return
+
+    if not response_filter.tripped:
+        text = response_filter.flush()
+        if text:
+            sent.append(text)
+            yield sse_event("token", {"text": text})
+
+    if response_filter.tripped:
+        yield sse_event("error", {"error": DIGIT_ERROR_MESSAGE})
+        return
+
+    if on_complete is not None:
+        on_complete("".join(sent), source_documents[:1])
+    yield sse_event("done", {"source_documents": source_documents[:1]})
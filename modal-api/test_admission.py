@@ -0,0 +1,142 @@
+import asyncio
+import time
+
+from admission import AdmissionController, Rejected, release_after
+
+
+async def hold(controller: AdmissionController, seconds: float, session=None, log=None):
+    async with controller.admit(session):
+        if log is not None:
+            log.append((session, controller.running))
+        await asyncio.sleep(seconds)
+
+
+def test_concurrency_is_bounded_and_queued_requests_are_served():
+    async def run():
+        controller = AdmissionController(2, max_queue=10, deadline=5, service_time=0.01)
+        log = []
+        await asyncio.gather(*(hold(controller, 0.02, log=log) for _ in range(6)))
+        return controller, log
+
+    controller, log = asyncio.run(run())
+    assert len(log) == 6
+    assert max(running for _, running in log) == 2
+    snapshot = controller.snapshot()
+    assert snapshot["completed"] == 6 and snapshot["running"] == 0 and snapshot["queue_depth"] == 0
+    assert snapshot["max_queue_depth"] == 4
+    assert sum(snapshot["rejected"].values()) == 0
+
+
+def test_full_queue_and_hopeless_deadlines_are_rejected_immediately():
+    async def run():
+        controller = AdmissionController(1, max_queue=2, deadline=1.0, service_time=0.3)
+        busy = [asyncio.create_task(hold(controller, 0.2)) for _ in range(3)]
+        await asyncio.sleep(0)
+        results = []
+        for max_queue, deadline in ((2, 1.0), (5, 0.5)):
+            controller.max_queue, controller.deadline = max_queue, deadline
+            start = time.perf_counter()
+            try:
+                await controller.acquire()
+            except Rejected as e:
+                results.append((e, time.perf_counter() - start))
+        controller.deadline = 5
+        await asyncio.gather(*busy)
+        return controller, results
+
+    controller, results = asyncio.run(run())
+    (full, full_seconds), (late, late_seconds) = results
+    assert (full.reason, full.status) == ("queue_full", 503)
+    assert (late.reason, late.status) == ("deadline", 503)
+    assert full.retry_after >= 1 and full_seconds < 0.05 and late_seconds < 0.05
+    assert controller.snapshot()["rejected"]["queue_full"] == 1
+
+
+def test_requests_give_up_when_the_deadline_passes_in_the_queue():
+    async def run():
+        controller = AdmissionController(1, max_queue=5, deadline=0.1, service_time=0.01)
+        busy = asyncio.create_task(hold(controller, 0.3))
+        await asyncio.sleep(0)
+        start = time.perf_counter()
+        try:
+            await controller.acquire()
+        except Rejected as e:
+            rejected = (e.reason, time.perf_counter() - start, controller.queue_depth)
+        await busy
+        return rejected
+
+    reason, waited, depth = asyncio.run(run())
+    assert reason == "timeout"
+    assert 0.05 < waited < 0.25
+    assert depth == 0
+
+
+def test_fair_sessions_take_turns_and_are_limited():
+    async def run():
+        controller = AdmissionController(1, max_queue=10, deadline=5, fair_sessions=True, session_limit=3, service_time=0.01)
+        log = []
+        first = asyncio.create_task(hold(controller, 0.05, "busy", log))
+        await asyncio.sleep(0)
+        tasks = [asyncio.create_task(hold(controller, 0.01, "busy", log)) for _ in range(2)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(hold(controller, 0.01, "quiet", log)))
+        await asyncio.sleep(0)
+        try:
+            await controller.acquire("busy")
+        except Rejected as e:
+            limited = e
+        await asyncio.gather(first, *tasks)
+        return log, limited
+
+    log, limited = asyncio.run(run())
+    # The quiet session is served before the busy one's second queued request
+    assert [session for session, _ in log] == ["busy", "busy", "quiet", "busy"]
+    assert (limited.reason, limited.status) == ("session_limit", 429)
+
+
+def test_cancelled_waiters_leave_the_queue():
+    async def run():
+        controller = AdmissionController(1, max_queue=5, deadline=5, service_time=0.01)
+        busy = asyncio.create_task(hold(controller, 0.05))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0.01)
+        depth = controller.queue_depth
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        await busy
+        return depth, controller.snapshot()
+
+    depth, snapshot = asyncio.run(run())
+    assert depth == 1
+    assert snapshot["queue_depth"] == 0 and snapshot["running"] == 0 and snapshot["admitted"] == 1
+
+
+def test_streamed_responses_release_from_another_thread():
+    async def run():
+        controller = AdmissionController(1, max_queue=5, deadline=5, service_time=0.01)
+        ticket = await controller.acquire()
+        events = release_after(iter(["a", "b"]), ticket)
+        sent = await asyncio.to_thread(lambda: list(events))
+        # A second release (the response's background task) is a no-op
+        ticket.release()
+        await asyncio.sleep(0.01)
+        return sent, controller.snapshot()
+
+    sent, snapshot = asyncio.run(run())
+    assert sent == ["a", "b"]
+    assert snapshot["running"] == 0 and snapshot["completed"] == 1
+
+
+def run_test_suite():
+    test_concurrency_is_bounded_and_queued_requests_are_served()
+    test_full_queue_and_hopeless_deadlines_are_rejected_immediately()
+    test_requests_give_up_when_the_deadline_passes_in_the_queue()
+    test_fair_sessions_take_turns_and_are_limited()
+    test_cancelled_waiters_leave_the_queue()
+    test_streamed_responses_release_from_another_thread()
+    print("Admission control tests passed")
+
+
+if __name__ == "__main__":
+    run_test_suite()
@@ -0,0 +1,112 @@
+import os
+import tempfile
+
+import numpy as np
+
+from ann_index import INDEX_TYPES, SPEC_FILENAME, IndexSpec, build_ann_index, load_index, save_index
+from hybrid_retrieval import HybridRetriever
+from tune_ann_index import noisy_queries, sweep, synthetic_vectors
+
+
+def test_every_index_type_finds_near_duplicates():
+    vectors = synthetic_vectors(2000, dim=32, clusters=20)
+    queries = noisy_queries(vectors, 20, noise=0.01)
+    for index_type in INDEX_TYPES:
+        spec = IndexSpec(index_type, pq_m=8)
+        index = build_ann_index(vectors, spec)
+        _, ids = index.search(queries, 1, params=spec.search_params(nprobe=spec.nlist, ef_search=64))
+        assert index.ntotal == len(vectors), index_type
+        exact = build_ann_index(vectors, IndexSpec("flat")).search(queries, 1)[1]
+        assert (ids == exact).mean() >= 0.8, index_type
+
+
+def test_parameters_are_fitted_to_small_corpora():
+    vectors = synthetic_vectors(100, dim=30)
+    spec = IndexSpec("ivf_pq", nlist=500, pq_m=48)
+    build_ann_index(vectors, spec)
+    assert spec.nlist == 100
+    assert 30 % spec.pq_m == 0 and spec.pq_m <= 30
+    assert 2 ** spec.pq_nbits <= 100
+
+
+def test_l2_scores_become_similarities():
+    vectors = synthetic_vectors(500, dim=16)
+    query = vectors[:1]
+    ip_spec, l2_spec = IndexSpec("flat", "ip"), IndexSpec("flat", "l2")
+    ip_scores, ip_ids = build_ann_index(vectors, ip_spec).search(query, 5)
+    l2_scores, l2_ids = build_ann_index(vectors, l2_spec).search(query, 5)
+    assert (ip_ids == l2_ids).all()
+    # Squared L2 between unit vectors is 2 - 2cos; converted back it matches
+    assert np.allclose(l2_spec.to_similarity(l2_scores), ip_scores, atol=1e-4)
+
+    # The retriever thresholds similarities, so L2 distances are not dropped
+    for spec in (ip_spec, l2_spec):
+        retriever = HybridRetriever(build_ann_index(vectors, spec), mode="dense", index_spec=spec)
+        assert retriever.rank("", query[0], k=3) == [int(i) for i in ip_ids[0][:3]]
+
+
+def test_spec_is_saved_next_to_the_index():
+    vectors = synthetic_vectors(300, dim=16)
+    with tempfile.TemporaryDirectory() as rag_dir:
+        spec = IndexSpec("hnsw", "l2", hnsw_m=8, ef_search=24)
+        save_index(build_ann_index(vectors, spec), spec, rag_dir)
+        index, loaded = load_index(rag_dir)
+        assert loaded == spec
+        assert index.ntotal == 300
+
+        # RAG dirs from before specs existed get one inferred from the index
+        os.remove(os.path.join(rag_dir, SPEC_FILENAME))
+        _, inferred = load_index(rag_dir)
+        assert (inferred.index_type, inferred.metric) == ("hnsw", "l2")
+
+
+def test_search_params_change_at_runtime():
+    vectors = synthetic_vectors(3000, dim=16, clusters=50)
+    spec = IndexSpec("ivf_flat", nlist=64, nprobe=1)
+    retriever = HybridRetriever(build_ann_index(vectors, spec), mode="dense", index_spec=spec)
+    exact = build_ann_index(vectors, IndexSpec("flat"))
+    queries = noisy_queries(vectors, 50)
+
+    def recall():
+        hits = 0
+        for query in queries:
+            expected = set(int(i) for i in exact.search(query.reshape(1, -1), 10)[1][0])
+            hits += len(expected & set(retriever.rank("", query, k=10)))
+        return hits / (10 * len(queries))
+
+    low = recall()
+    retriever.set_search_params(nprobe=64)
+    assert retriever.nprobe == 64
+    assert recall() == 1.0 > low
+
+
+def test_sweep_reports_recall_latency_and_memory():
+    vectors = synthetic_vectors(1000, dim=16)
+    rows = sweep(vectors, noisy_queries(vectors, 20), k=5, nprobe_values=(1, 8), ef_search_values=(16,),
+                 spec_overrides={"pq_m": 4})
+    assert [(r["index"], r["setting"]) for r in rows] == [
+        ("flat", "exact"),
+        ("hnsw", "ef_search=16"),
+        ("ivf_flat", "nprobe=1"),
+        ("ivf_flat", "nprobe=8"),
+        ("ivf_pq", "nprobe=1"),
+        ("ivf_pq", "nprobe=8"),
+    ]
+    assert rows[0]["recall"] == 1.0
+    assert all(r["memory_mb"] > 0 and r["p50_ms"] >= 0 for r in rows)
+    # Product quantisation is the smallest index
+    assert min(rows, key=lambda r: r["memory_mb"])["index"] == "ivf_pq"
+
+
+def run_test_suite():
+    test_every_index_type_finds_near_duplicates()
+    test_parameters_are_fitted_to_small_corpora()
+    test_l2_scores_become_similarities()
+    test_spec_is_saved_next_to_the_index()
+    test_search_params_change_at_runtime()
+    test_sweep_reports_recall_latency_and_memory()
+    print("ANN index tests passed")
+
+
+if __name__ == "__main__":
+    run_test_suite()
@@ -0,0 +1,121 @@
+import asyncio
+import sys
+import time
+
+from batching import BatchScheduler, HFBatchGenerator, StubBatchGenerator
+
+
+async def submit_concurrently(scheduler: BatchScheduler, prompts):
+    return await asyncio.gather(*(scheduler.submit(prompt) for prompt in prompts))
+
+
+def test_concurrent_prompts_share_batches():
+    async def run():
+        generator = StubBatchGenerator(batch_latency=0.05)
+        scheduler = BatchScheduler(generator, max_batch_size=4, max_wait_ms=20)
+        prompts = [f"question {i}" for i in range(10)]
+        outputs = await submit_concurrently(scheduler, prompts)
+        await scheduler.close()
+        return generator, scheduler, prompts, outputs
+
+    generator, scheduler, prompts, outputs = asyncio.run(run())
+    assert outputs == [f"Answer to: {prompt}" for prompt in prompts]
+    assert max(generator.batch_sizes) == 4
+    assert sum(generator.batch_sizes) == 10
+    assert len(generator.batch_sizes) == 3
+
+    metrics = scheduler.metrics.snapshot()
+    assert metrics["requests"] == 10
+    assert metrics["batches"] == 3
+    assert metrics["max_batch_size"] == 4
+
+
+def test_single_request_waits_at_most_the_window():
+    async def run():
+        scheduler = BatchScheduler(StubBatchGenerator(batch_latency=0), max_batch_size=8, max_wait_ms=30)
+        start = time.perf_counter()
+        output = await scheduler.submit("only one")
+        elapsed = time.perf_counter() - start
+        await scheduler.close()
+        return output, elapsed
+
+    output, elapsed = asyncio.run(run())
+    assert output == "Answer to: only one"
+    assert elapsed < 0.2
+
+
+def test_errors_are_sent_to_every_caller():
+    def failing_generator(prompts):
+        raise RuntimeError("CUDA out of memory")
+
+    async def run():
+        scheduler = BatchScheduler(failing_generator, max_batch_size=4, max_wait_ms=10)
+        results = await asyncio.gather(
+            *(scheduler.submit(str(i)) for i in range(3)), return_exceptions=True
+        )
+        await scheduler.close()
+        return results
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_batches_are_left_padded_without_changing_the_tokenizer():
+    from tiny_llm import ByteTokenizer, build_tiny_model
+
+    masks = []
+
+    class RecordingTokenizer(ByteTokenizer):
+        def __call__(self, *args, **kwargs):
+            inputs = super().__call__(*args, **kwargs)
+            masks.append(inputs["attention_mask"])
+            return inputs
+
+    model, _ = build_tiny_model()
+    tokenizer = RecordingTokenizer(padding_side="right")
+    generator = HFBatchGenerator(
+        model, tokenizer, max_new_tokens=4, do_sample=False, pad_token_id=tokenizer.pad_token_id
+    )
+    assert len(generator(["short", "a much longer prompt"])) == 2
+    # The short prompt is padded on the left...
+    assert masks[0][0, 0] == 0 and masks[0][0, -1] == 1
+    # ...but the shared tokenizer keeps its own default
+    assert tokenizer.padding_side == "right"
+
+
+def run_tiny_model_batch():
+    from tiny_llm import build_tiny_model
+
+    model, tokenizer = build_tiny_model()
+    generator = HFBatchGenerator(
+        model,
+        tokenizer,
+        max_new_tokens=8,
+        do_sample=False,
+        pad_token_id=tokenizer.pad_token_id,
+    )
+
+    async def run():
+        scheduler = BatchScheduler(generator, max_batch_size=4, max_wait_ms=20)
+        outputs = await submit_concurrently(scheduler, ["short", "a much longer prompt", "mid prompt", "x"])
+        await scheduler.close()
+        return scheduler, outputs
+
+    scheduler, outputs = asyncio.run(run())
+    print(f"Tiny model outputs: {outputs}")
+    print(f"Metrics: {scheduler.metrics.snapshot()}")
+
+
+def run_test_suite(use_tiny_model: bool = False):
+    test_concurrent_prompts_share_batches()
+    test_single_request_waits_at_most_the_window()
+    test_errors_are_sent_to_every_caller()
+    test_batches_are_left_padded_without_changing_the_tokenizer()
+    print("Batching scheduler tests passed")
+
+    if use_tiny_model:
+        run_tiny_model_batch()
+
+
+if __name__ == "__main__":
+    run_test_suite(use_tiny_model="--tiny" in sys.argv)
@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from ann_index import IndexSpec, load_index
+from build_rag_index import build_index, chunk_text
+from chunk_store import ChunkStore
+
+
+class FakeEmbedder:
+    """Deterministic stand-in for MiniLM that records what it embedded"""
+
+    def __init__(self, dim: int = 16):
+        self.dim = dim
+        self.embedded = []
+
+    def __call__(self, texts):
+        self.embedded.extend(texts)
+        vectors = []
+        for text in texts:
+            seed = int(hashlib.sha256(text.encode()).hexdigest()[:8], 16)
+            vectors.append(np.random.default_rng(seed).standard_normal(self.dim))
+        return np.array(vectors, dtype=np.float32)
+
+
+def write_pages(directory, pages):
+    for name, text in pages.items():
+        with open(os.path.join(directory, name), "w") as f:
+            f.write(text)
+
+
+def test_chunks_overlap_and_cover_text():
+    words = [f"word{i}" for i in range(300)]
+    chunks = chunk_text(" ".join(words), chunk_size=200, overlap=50)
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    assert chunks[0].split()[0] == "word0"
+    assert chunks[-1].split()[-1] == "word299"
+    assert set(chunks[0].split()) & set(chunks[1].split())
+
+
+def test_rebuild_only_embeds_changed_chunks():
+    with tempfile.TemporaryDirectory() as pages, tempfile.TemporaryDirectory() as output:
+        write_pages(pages, {
+            "library.txt": "The Brynmor Jones Library is open 24 hours during term. " * 20,
+            "allam.html": "<p>The Allam Medical Building hosts the simulation suite.</p>",
+        })
+
+        first = FakeEmbedder()
+        summary = build_index([pages], output, chunk_size=300, overlap=50, embed=first)
+        assert summary["embedded"] == summary["chunks"]
+
+        write_pages(pages, {"allam.html": "<p>The Allam Medical Building opens at 8am.</p>"})
+        second = FakeEmbedder()
+        summary = build_index([pages], output, chunk_size=300, overlap=50, embed=second)
+        assert second.embedded == ["The Allam Medical Building opens at 8am."]
+        assert summary["reused"] == summary["chunks"] - 1
+
+        import faiss
+
+        index = faiss.read_index(os.path.join(output, "faiss_index.bin"))
+        with open(os.path.join(output, "document_lookup.json")) as f:
+            lookup = json.load(f)
+        store = ChunkStore(os.path.join(output, "document_chunks.bin"))
+        try:
+            assert index.ntotal == len(lookup) == len(store)
+            for idx, chunk in lookup.items():
+                assert store.get(int(idx)) == chunk
+        finally:
+            store.close()
+
+
+def test_index_type_and_metric_are_recorded():
+    with tempfile.TemporaryDirectory() as tmp:
+        pages = os.path.join(tmp, "pages")
+        output = os.path.join(tmp, "rag")
+        os.makedirs(pages)
+        write_pages(pages, {f"page{i}.txt": f"Page {i} about campus building {i}. " * 10 for i in range(40)})
+
+        summary = build_index([pages], output, chunk_size=300, overlap=50, embed=FakeEmbedder(),
+                              index_spec=IndexSpec("hnsw", "l2", hnsw_m=8))
+        assert summary["index"] == "hnsw"
+        index, spec = load_index(output)
+        assert (spec.index_type, spec.metric, spec.normalized) == ("hnsw", "l2", True)
+        assert index.ntotal == summary["chunks"]
+
+
+def run_test_suite():
+    test_chunks_overlap_and_cover_text()
+    test_rebuild_only_embeds_changed_chunks()
+    test_index_type_and_metric_are_recorded()
+    print("RAG index builder tests passed")
+
+
+if __name__ == "__main__":
+    run_test_suite()
@@ -0,0 +1,145 @@
+import asyncio
+
+from benchmark import build_pipeline, find_regressions, synthetic_queries
+from intent_router import Intent, IntentRouter
+from tiny_llm import build_tiny_model
+
+
+def test_retrieve_context_on_synthetic_index():
+    pipeline = build_pipeline(200)
+    chunks = list(pipeline.document_lookup.lookup.values())
+    for query in synthetic_queries(chunks, 5):
+        context, sources = pipeline.retrieve_context(query)
+        assert context
+        assert sources and all(source.startswith("https://") for source in sources)
+        # 2000 characters of chunks, plus separators and the "..." marker
+        assert len(context) <= 2000 + 2 * 4 + 3
+
+
+def test_generate_with_tiny_model():
+    pipeline = build_pipeline(200)
+    pipeline.setup_generation(*build_tiny_model())
+    query = synthetic_queries(list(pipeline.document_lookup.lookup.values()), 1)[0]
+
+    response, sources = pipeline.generate(query)
+    assert isinstance(response, str)
+    assert len(sources) <= 1
+
+    async def run():
+        answer = await pipeline.generate_async(query)
+        await pipeline.scheduler.close()
+        return answer
+
+    response, sources = asyncio.run(run())
+    assert isinstance(response, str)
+    assert pipeline.scheduler.metrics.snapshot()["requests"] == 1
+
+
+def test_intents_bypass_generation():
+    pipeline = build_pipeline(50)
+    # No model is set up, so reaching generation would fail
+    response, sources = pipeline.generate("hello")
+    assert response.startswith("Hi!")
+    assert sources == []
+    # FAQ answers come from rag/intents.json, with their sources
+    pipeline.intent_router = IntentRouter([Intent(
+        name="fees_deadline",
+        keyword_groups=[["tuition fees"], ["due", "deadline"]],
+        action="answer",
+        response="Tuition fees are due at enrolment.",
+        source_documents=["https://example.com/fees"],
+    )])
+    response, sources = pipeline.generate("When are tuition fees due?")
+    assert response == "Tuition fees are due at enrolment."
+    assert sources == ["https://example.com/fees"]
+
+
+def test_summary_replaces_older_turns():
+    from chat_pipeline import SUMMARY_MAX_NEW_TOKENS, Message
+
+    pipeline = build_pipeline(200)
+    pipeline.setup_generation(*build_tiny_model())
+    query = synthetic_queries(list(pipeline.document_lookup.lookup.values()), 1)[0]
+    history = [Message(content=f"turn {i} " + "long answer " * 15, is_user=i % 2 == 0) for i in range(8)]
+
+    summary = pipeline.summarize_messages(history[:-2])
+    assert isinstance(summary, str)
+    assert len(pipeline.tokenizer.encode(summary)) <= SUMMARY_MAX_NEW_TOKENS
+
+    summary = "The student asked about library hours and was told 9am to 5pm."
+    full, _ = pipeline.prepare_prompt(query, history)
+    short, _ = pipeline.prepare_prompt(query, history[-2:], summary=summary)
+    assert "Summary of the earlier conversation:\n" + summary in short
+    assert "turn 0" not in short and "turn 7" in short
+    assert len(short) < len(full)
+    # A summarised follow-up depends on the conversation, so it is never cached
+    assert pipeline._lookup_answer(query, None, summary) == (None, None)
+
+
+def test_summaries_go_through_admission_control():
+    from admission import AdmissionController, Rejected
+    from chat_pipeline import Message
+
+    pipeline = build_pipeline(50)
+    pipeline.setup_generation(*build_tiny_model())
+    pipeline.admission = AdmissionController(1, max_queue=0)
+    pipeline.summary_admission = AdmissionController(1, max_queue=0)
+    messages = [Message(content="When are fees due?", is_user=True)]
+
+    async def run():
+        # Chat holds the only generation slot, so the summary is turned away
+        ticket = await pipeline.admission.acquire()
+        try:
+            await pipeline.summarize_async(messages)
+        except Rejected as exc:
+            assert exc.reason == "queue_full"
+        else:
+            raise AssertionError("summary ran beside a full chat load")
+        ticket.release()
+        return await pipeline.summarize_async(messages)
+
+    assert isinstance(asyncio.run(run()), str)
+    assert pipeline.admission.snapshot()["completed"] == 2
+    assert pipeline.summary_admission.snapshot()["completed"] == 2
+
+
+def test_missing_bm25_index_falls_back_to_dense():
+    from chat_pipeline import ChatPipeline
+    from chunk_store import JsonChunkLookup
+
+    class UnreadableLookup(JsonChunkLookup):
+        def items(self):
+            raise AssertionError("start-up must not read every chunk")
+
+    built = build_pipeline(50)
+    pipeline = ChatPipeline()
+    pipeline.attach_rag(built.embedding_model, built.faiss_index, UnreadableLookup(built.document_lookup.lookup))
+    assert pipeline.retriever.mode == "dense"
+    context, sources = pipeline.retrieve_context(synthetic_queries(list(built.document_lookup.lookup.values()), 1)[0])
+    assert context and sources
+
+
+def test_find_regressions():
+    baseline = {"retrieve": {"dense": {"p95_ms": 10.0, "rps": 100.0}, "sparse": {"p95_ms": 0.1, "rps": 50.0}}}
+    current = {"retrieve": {"dense": {"p95_ms": 13.0, "rps": 70.0}, "sparse": {"p95_ms": 0.2, "rps": 49.0}}}
+    regressions = find_regressions(baseline, current, max_regression=0.2)
+    # sparse p95 doubled but by less than the 1 ms noise floor
+    assert regressions == [
+        "retrieve.dense.p95_ms: 10.00 -> 13.00 ms",
+        "retrieve.dense.rps: 100.0 -> 70.0 req/s",
+    ]
+
+
+def run_test_suite():
+    test_retrieve_context_on_synthetic_index()
+    test_generate_with_tiny_model()
+    test_intents_bypass_generation()
+    test_summary_replaces_older_turns()
+    test_summaries_go_through_admission_control()
+    test_missing_bm25_index_falls_back_to_dense()
+    test_find_regressions()
+    print("Chat pipeline tests passed")
+
+
+if __name__ == "__main__":
+    run_test_suite()
@@ -0,0 +1,45 @@
+import json
+import os
+import tempfile
+
+from chunk_store import ChunkStore, JsonChunkLookup, convert_lookup_json
+
+
+def make_lookup():
+    return {
+        "0": {"text": "The library is open 24/7.", "source_document": "https://hull.ac.uk/library"},
+        "1": {"text": "Café in the Allam Medical Building – ground floor.", "source_document": "https://hull.ac.uk/allam"},
+        "3": {"text": "Borrowing limits for postgraduates.", "source_document": "https://hull.ac.uk/library"},
+        "4": {"text": "Chunk without a source"},
+    }
+
+
+def test_converted_store_matches_json_lookup():
+    lookup = make_lookup()
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "document_lookup.json")
+        store_path = os.path.join(tmp, "document_chunks.bin")
+        with open(json_path, "w") as f:
+            json.dump(lookup, f)
+
+        assert convert_lookup_json(json_path, store_path) == 4
+        store = ChunkStore(store_path)
+        reference = JsonChunkLookup(lookup)
+        try:
+            for idx in range(-1, 7):
+                assert store.get(idx) == reference.get(idx), idx
+                assert (idx in store) == (idx in reference), idx
+            # Source documents are interned: one table entry per distinct URL
+            assert store.sources == ["https://hull.ac.uk/library", "https://hull.ac.uk/allam"]
+            assert store.source(0) is store.source(3)
+        finally:
+            store.close()
+
+
+def run_test_suite():
+    test_converted_store_matches_json_lookup()
+    print("Chunk store tests passed")
+
+
+if __name__ == "__main__":
+    run_test_suite()
@@ -0,0 +1,147 @@
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from embedding_engine import PROBE_TEXTS, MiniLMEncoder, QueryEmbeddingEngine, embedding_agreement
+
+WORDS = sorted({word.strip("?,.").lower() for text in PROBE_TEXTS for word in text.split()})
+
+
+def build_tiny_encoder(seed: int = 0) -> MiniLMEncoder:
+    """Random 2-layer BERT with a word-level vocabulary; no downloads"""
+    import torch
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    with tempfile.TemporaryDirectory() as tmp:
+        vocab_path = os.path.join(tmp, "vocab.txt")
+        with open(vocab_path, "w") as f:
+            f.write("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "?", ",", "."] + WORDS))
+        tokenizer = BertTokenizerFast(vocab_file=vocab_path)
+    torch.manual_seed(seed)
+    config = BertConfig(
+        vocab_size=tokenizer.vocab_size, hidden_size=64, num_hidden_layers=2,
+        num_attention_heads=4, intermediate_size=128, max_position_embeddings=64,
+    )
+    return MiniLMEncoder(BertModel(config).eval(), tokenizer, max_length=64)
+
+
+class CountingEncoder:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        time.sleep(self.latency)
+        return np.array([[len(text), 1.0] for text in texts], dtype=np.float32)
+
+
+def test_encoder_matches_manual_mean_pooling():
+    import torch
+
+    encoder = build_tiny_encoder()
+    texts = PROBE_TEXTS[:3]
+    vectors = encoder(texts)
+    assert vectors.shape == (3, 64) and vectors.dtype == np.float32
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0, atol=1e-5)
+
+    # Padding must not change a sentence's embedding
+    inputs = encoder.tokenizer([texts[0]], return_tensors="pt")
+    with torch.inference_mode():
+        single = encoder.model(**inputs).last_hidden_state[0].mean(dim=0)
+    single = (single / single.norm()).numpy()
+    assert np.allclose(vectors[0], single, atol=1e-5)
+
+
+def test_int8_stays_close_to_fp32():
+    encoder = build_tiny_encoder()
+    quantized = encoder.quantize()
+    assert quantized.quantized and not encoder.quantized
+    assert embedding_agreement(encoder, quantized) > 0.98
+    assert embedding_agreement(encoder, encoder) > 0.9999
+
+
+def test_repeated_queries_hit_the_cache():
+    encoder = CountingEncoder()
+    engine = QueryEmbeddingEngine(encoder, cache_size=2)
+    first = engine.encode(["library hours"])
+    again = engine.encode(["library hours"])
+    assert np.array_equal(first, again)
+    assert len(encoder.calls) == 1
+
+    engine.encode(["fees", "parking", "library hours"])
+    # Two misses go to the encoder together; the repeat is served from cache
+    assert encoder.calls[-1] == ["fees", "parking"]
+    assert engine.snapshot()["cache"]["hits"] == 2
+    assert engine.snapshot()["cache"]["evictions"] == 1
+
+
+def test_concurrent_queries_share_a_forward_pass():
+    encoder = CountingEncoder(latency=0.02)
+    engine = QueryEmbeddingEngine(encoder, max_batch_size=16, max_wait_ms=20)
+    results = {}
+
+    def ask(i):
+        results[i] = engine.encode([f"question {i}"])[0]
+
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(results[i][0] == len(f"question {i}") for i in range(12))
+    assert len(encoder.calls) < 12
+    assert engine.snapshot()["batching"]["max_batch_size"] > 1
+
+
+def test_encoder_errors_reach_the_caller():
+    def broken(texts):
+        raise RuntimeError("encoder failed")
+
+    engine = QueryEmbeddingEngine(broken)
+    try:
+        engine.encode(["anything"])
+    except RuntimeError as e:
+        assert str(e) == "encoder failed"
+    else:
+        raise AssertionError("expected RuntimeError")
+    assert engine.snapshot()["cache"]["size"] == 0
+
+
+def test_pipeline_retrieves_with_the_engine():
+    import faiss
+
+    from chat_pipeline import ChatPipeline
+    from chunk_store import JsonChunkLookup
+
+    encoder = build_tiny_encoder().quantize()
+    chunks = {str(i): {"text": text, "source_document": f"https://www.hull.ac.uk/{i}"} for i, text in enumerate(PROBE_TEXTS)}
+    index = faiss.IndexFlatIP(64)
+    # The index holds fp32 embeddings, as built by build_rag_index.py
+    index.add(build_tiny_encoder()(PROBE_TEXTS))
+
+    pipeline = ChatPipeline()
+    pipeline.attach_rag(pipeline.embedding_engine(encoder), index, JsonChunkLookup(chunks))
+    pipeline.retriever.mode = "dense"
+    # A random tiny model separates sentences poorly, so allow a near miss
+    for i, text in enumerate(PROBE_TEXTS):
+        sources = [chunk["source_document"] for chunk in pipeline.retrieve_chunks(text, k=2)]
+        assert f"https://www.hull.ac.uk/{i}" in sources
+
+
+def run_test_suite():
+    test_encoder_matches_manual_mean_pooling()
+    test_int8_stays_close_to_fp32()
+    test_repeated_queries_hit_the_cache()
+    test_concurrent_queries_share_a_forward_pass()
+    test_encoder_errors_reach_the_caller()
+    test_pipeline_retrieves_with_the_engine()
+    print("Embedding engine tests passed")
+
+
+if __name__ == "__main__":
+    run_test_suite()
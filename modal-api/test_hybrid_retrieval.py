@@ -0,0 +1,83 @@
+import os
+import tempfile
+
+from hybrid_retrieval import BM25Index, HybridRetriever, reciprocal_rank_fusion
+
+CHUNKS = [
+    "The library is open 24 hours a day during term time.",
+    "Module ABC1234 covers advanced machine learning and is assessed by coursework.",
+    "Accommodation fees for halls of residence are paid each term.",
+    "Study rooms in the library can be booked online.",
+]
+
+
+def build_bm25() -> BM25Index:
+    return BM25Index.build(enumerate(CHUNKS))
+
+
+def build_flat_index():
+    import faiss
+    import numpy as np
+
+    # One unit vector per chunk, so dense similarity is easy to set up
+    index = faiss.IndexFlatIP(len(CHUNKS))
+    index.add(np.eye(len(CHUNKS), dtype="float32"))
+    return index
+
+
+def test_bm25_ranks_exact_identifiers_first():
+    bm25 = build_bm25()
+    hits = bm25.search("What is the syllabus of abc1234?", k=3)
+    assert hits[0][0] == 1 and hits[0][1] > hits[1][1]
+    # Chunks with more of the query's terms rank higher
+    assert [idx for idx, _ in bm25.search("library study rooms", k=4)] == [3, 0]
+    assert bm25.search("parking permits") == []
+
+
+def test_rank_fusion_merges_and_deduplicates():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 4, 1]], k=60)
+    # 1 and 3 appear in both lists (ties broken by id), then the single hits
+    assert fused == [1, 3, 2, 4]
+
+
+def test_hybrid_mode_ranks_the_union():
+    import numpy as np
+
+    retriever = HybridRetriever(build_flat_index(), build_bm25(), mode="hybrid")
+    query = "ABC1234 module fees"
+    vector = np.array([0.1, 0.0, 0.9, 0.0], dtype="float32")
+    vector /= np.linalg.norm(vector)
+
+    # Dense: chunk 2, then chunk 0; the others are below min_dense_score
+    assert retriever.rank(query, vector, k=4, mode="dense") == [2, 0]
+    # Sparse: chunk 1 matches two terms, chunk 2 one
+    assert retriever.rank(query, vector, k=4, mode="sparse") == [1, 2]
+    # Fused: chunk 2 is in both lists, then each list's other hit by rank
+    assert retriever.rank(query, vector, k=4) == [2, 1, 0]
+    assert retriever.rank(query, vector, k=2) == [2, 1]
+
+
+def test_bm25_save_and_load_round_trip():
+    bm25 = build_bm25()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bm25_index.npz")
+        bm25.save(path)
+        loaded = BM25Index.load(path)
+    assert loaded.terms == bm25.terms and loaded.num_docs == bm25.num_docs
+    assert (loaded.offsets == bm25.offsets).all()
+    assert (loaded.doc_ids == bm25.doc_ids).all()
+    assert (loaded.weights == bm25.weights).all()
+    for query in ("abc1234", "library rooms", "term fees"):
+        assert loaded.search(query, k=4) == bm25.search(query, k=4)
+
+
+def run_test_suite():
+    test_bm25_ranks_exact_identifiers_first()
+    test_rank_fusion_merges_and_deduplicates()
+    test_hybrid_mode_ranks_the_union()
+    test_bm25_save_and_load_round_trip()
+    print("Hybrid retrieval tests passed")
+
+
+if __name__ == "__main__":
+    run_test_suite()
@@ -0,0 +1,55 @@
+import json
+import os
+import tempfile
+
+from intent_router import DEFAULT_INTENTS, IntentRouter
+
+
+def test_default_intents():
+    router = IntentRouter(DEFAULT_INTENTS)
+    assert router.route("Hello!").action == "answer"
+    assert router.route("Any good pizza near campus?").action == "reject"
+    assert router.route("What are the library opening hours?").intent == "library_hours"
+    # Hours are answered from the retrieved pages, not a canned reply
+    assert router.route("What are the library opening hours?").action == "rag"
+    for query in (
+        "How do I open a library account?",
+        "Is the library open on Christmas Day?",
+        "Does the library close at Easter?",
+        "library opening hours in the summer vacation",
+    ):
+        assert router.route(query).intent is None, query
+    # Whole-word matching: "bus" must not reject "business"
+    assert router.route("Where is the business school?").intent is None
+    # Greetings only short-circuit short messages
+    assert router.route("hi, how do I apply for student accommodation?").intent is None
+
+
+def test_intents_from_file_answer_with_sources():
+    definitions = [{
+        "name": "library_hours",
+        "keyword_groups": [["library"], ["hours", "open"]],
+        "action": "answer",
+        "response": "The library is open 24/7 during term time.",
+        "source_documents": ["https://example.com/library"],
+    }]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "intents.json")
+        with open(path, "w") as f:
+            json.dump(definitions, f)
+        router = IntentRouter.from_file(path)
+
+    route = router.route("What are the library opening hours?")
+    assert route.bypasses_llm
+    assert route.source_documents == ["https://example.com/library"]
+    assert router.route("How do I renew a library book?").intent is None
+
+
+def run_test_suite():
+    test_default_intents()
+    test_intents_from_file_answer_with_sources()
+    print("Intent router tests passed")
+
+
+if __name__ == "__main__":
+    run_test_suite()
@@ -0,0 +1,62 @@
+import torch
+
+from prefix_cache import PrefixKVCache
+from tiny_llm import build_tiny_model
+
+PREFIX = "<s>[INST] <<SYS>>\nYou are a University of Hull assistant.\n\nContext:\n"
+PROMPT = PREFIX + "The library is open 24/7.\n\n\nQuestion: When is the library open? [/INST]"
+
+
+def test_cached_prefix_matches_full_prefill():
+    model, tokenizer = build_tiny_model()
+    cache = PrefixKVCache(model, tokenizer)
+    cache.build(PREFIX)
+
+    settings = dict(max_new_tokens=20, do_sample=False, pad_token_id=tokenizer.pad_token_id)
+    with_cache = model.generate(**cache.prepare(PROMPT), **settings)
+    without_cache = model.generate(**tokenizer(PROMPT), **settings)
+    assert torch.equal(with_cache, without_cache)
+
+    # The shared cache must not be extended by a generation
+    again = model.generate(**cache.prepare(PROMPT), **settings)
+    assert torch.equal(again, without_cache)
+
+    stats = cache.stats.snapshot()
+    assert stats["hits"] == 2
+    assert stats["tokens_saved_total"] == 2 * stats["prefix_tokens"]
+
+
+def test_sampling_settings_and_invalidation():
+    model, tokenizer = build_tiny_model()
+    cache = PrefixKVCache(model, tokenizer)
+    cache.build(PREFIX)
+
+    outputs = model.generate(
+        **cache.prepare(PROMPT),
+        max_new_tokens=10,
+        min_new_tokens=10,
+        temperature=0.1,
+        do_sample=True,
+        top_p=0.9,
+        repetition_penalty=1.2,
+        eos_token_id=tokenizer.eos_token_id,
+        pad_token_id=tokenizer.pad_token_id,
+    )
+    assert outputs.shape[1] == tokenizer(PROMPT)["input_ids"].shape[1] + 10
+
+    # A different system prompt rebuilds; prompts built from the old one
+    # fall back to a full prefill
+    cache.build(PREFIX.replace("University of Hull", "Library"))
+    assert cache.stats.builds == 2
+    assert "past_key_values" not in cache.prepare(PROMPT)
+    assert cache.stats.fallbacks == 1
+
+
+def run_test_suite():
+    test_cached_prefix_matches_full_prefill()
+    test_sampling_settings_and_invalidation()
+    print("Prefix KV cache tests passed")
+
+
+if __name__ == "__main__":
+    run_test_suite()
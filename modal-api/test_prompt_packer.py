@@ -0,0 +1,108 @@
+from dataclasses import dataclass
+
+from prompt_packer import PromptPacker
+from tiny_llm import ByteTokenizer
+
+
+@dataclass
+class Turn:
+    content: str
+    is_user: bool
+
+
+def format_message(msg) -> str:
+    role = "Previous User Question" if msg.is_user else "Previous Assistant Answer"
+    return f"{role}:\n{msg.content}\n"
+
+
+def render(prompt, context, history, summary=None):
+    chat = "\n".join(format_message(msg) for msg in history)
+    earlier = f"Summary:\n{summary}\n" if summary else ""
+    return f"[SYS]\nContext:\n{context}\n\n{earlier}{chat}\nQuestion: {prompt} [/INST]"
+
+
+def make_packer(**kwargs):
+    return PromptPacker(ByteTokenizer(), render=render, format_message=format_message, **kwargs)
+
+
+def test_context_respects_token_limit_and_rank_order():
+    packer = make_packer(budget=1000, max_context_tokens=150)
+    chunks = [
+        {"text": "a" * 100, "source_document": "doc-1"},
+        {"text": "b" * 100, "source_document": "doc-2"},
+        {"text": "c" * 100, "source_document": "doc-3"},
+    ]
+    packed = packer.pack("When?", chunks)
+    assert packed.report["context_tokens"] <= 150
+    assert packed.report["chunks_used"] == 2
+    assert packed.report["chunk_truncated"]
+    assert packed.source_documents == ["doc-1", "doc-2"]
+    assert "c" * 10 not in packed.text
+
+
+def test_history_keeps_newest_turns_within_budget():
+    packer = make_packer(budget=400, max_context_tokens=100)
+    history = [Turn(f"turn {i} " + "x" * 60, i % 2 == 0) for i in range(8)]
+    packed = packer.pack("And on Sunday?", [{"text": "Open 24/7", "source_document": "doc"}], history)
+
+    kept = packed.report["history_used"]
+    assert 0 < kept < len(history)
+    assert "turn 7" in packed.text and "turn 0" not in packed.text
+    assert packed.report["total_tokens"] <= 400
+
+
+def test_history_heading_counts_against_the_budget():
+    chunks = [{"text": "Open 24/7", "source_document": "doc"}]
+    history = [Turn(f"turn {i} " + "x" * 20, i % 2 == 0) for i in range(4)]
+    full = make_packer(budget=1000).pack("And on Sunday?", chunks, history).report
+    assert full["history_used"] == 4
+
+    # One token short: all four turns would fit without their heading
+    packer = make_packer(budget=full["total_tokens"] - 1)
+    packed = packer.pack("And on Sunday?", chunks, history)
+    assert packed.report["history_used"] == 3
+    assert packed.report["total_tokens"] <= packer.budget
+
+
+def test_token_counts_are_cached():
+    packer = make_packer()
+    chunks = [{"text": "The library is open 24/7.", "source_document": "doc"}]
+    history = [Turn("Hi", True)]
+    packer.pack("When?", chunks, history)
+    packer.pack("Where?", chunks, history)
+    assert packer.chunk_tokens.snapshot() == {"size": 1, "hits": 1, "misses": 1}
+    assert packer.message_tokens.snapshot()["hits"] == 1
+    # Template and history heading are counted once, whatever the question
+    assert packer.fixed_tokens.snapshot() == {"size": 2, "hits": 2, "misses": 2}
+    packer.pack("Who?", chunks, history, summary="Asked about fees.")
+    packer.pack("Why?", chunks, history, summary="Asked about fees.")
+    # ...and so is the summary, for as long as it stays the same
+    assert packer.fixed_tokens.snapshot() == {"size": 3, "hits": 7, "misses": 3}
+
+
+def test_summary_is_counted_and_dropped_when_it_does_not_fit():
+    chunks = [{"text": "x" * 50, "source_document": "doc-1"}]
+    history = [Turn("question", True), Turn("answer", False)]
+    summary = "The user asked about parking permits. " * 3
+
+    packed = make_packer(budget=1000).pack("When?", chunks, history, summary=summary)
+    assert summary in packed.text
+    assert packed.report["summary_used"]
+    assert packed.report["summary_tokens"] >= len(summary)
+
+    tight = make_packer(budget=120).pack("When?", chunks, history, summary=summary)
+    assert summary not in tight.text
+    assert tight.report["summary_tokens"] == 0 and not tight.report["summary_used"]
+
+
+def run_test_suite():
+    test_context_respects_token_limit_and_rank_order()
+    test_history_keeps_newest_turns_within_budget()
+    test_history_heading_counts_against_the_budget()
+    test_token_counts_are_cached()
+    test_summary_is_counted_and_dropped_when_it_does_not_fit()
+    print("Prompt packer tests passed")
+
+
+if __name__ == "__main__":
+    run_test_suite()
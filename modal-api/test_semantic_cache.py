@@ -0,0 +1,72 @@
+import time
+
+import numpy as np
+
+from semantic_cache import SemanticCache
+
+
+def unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_near_duplicate_query_hits():
+    cache = SemanticCache(threshold=0.9)
+    cache.store(unit(1, 0, 0), "Open 24 hours", ["https://hull.ac.uk/library"])
+
+    assert cache.lookup(unit(1, 0.1, 0)) == ("Open 24 hours", ["https://hull.ac.uk/library"])
+    assert cache.lookup(unit(0, 1, 0)) is None
+    assert cache.snapshot()["hits"] == 1
+    assert cache.snapshot()["misses"] == 1
+
+
+def test_lru_eviction_keeps_recently_used():
+    cache = SemanticCache(threshold=0.99, max_entries=2)
+    cache.store(unit(1, 0, 0), "a", ["doc-a"])
+    cache.store(unit(0, 1, 0), "b", ["doc-b"])
+    cache.lookup(unit(1, 0, 0))
+    cache.store(unit(0, 0, 1), "c", ["doc-c"])
+
+    assert cache.lookup(unit(0, 1, 0)) is None
+    assert cache.lookup(unit(1, 0, 0))[0] == "a"
+    assert cache.lookup(unit(0, 0, 1))[0] == "c"
+    assert cache.snapshot()["evictions"] == 1
+
+
+def test_ttl_and_invalidation():
+    cache = SemanticCache(threshold=0.9, ttl_seconds=0.01)
+    cache.store(unit(1, 0), "stale", ["doc"])
+    time.sleep(0.02)
+    assert cache.lookup(unit(1, 0)) is None
+    assert cache.snapshot()["expirations"] == 1
+
+    cache.ttl_seconds = 60
+    cache.store(unit(1, 0), "fresh", ["doc"])
+    cache.invalidate()
+    assert cache.lookup(unit(1, 0)) is None
+    assert len(cache) == 0
+
+
+def test_expired_nearest_entry_does_not_hide_a_valid_one():
+    cache = SemanticCache(threshold=0.9, ttl_seconds=60)
+    cache.store(unit(1, 0.3), "second", ["doc-2"])
+    cache.store(unit(1, 0), "nearest", ["doc-1"])
+    # Age the nearest entry past the TTL
+    slot = next(reversed(cache._entries))
+    cache._stored_at[slot] -= 120
+
+    assert cache.lookup(unit(1, 0)) == ("second", ["doc-2"])
+    assert cache.snapshot()["expirations"] == 1
+    assert len(cache) == 1
+
+
+def run_test_suite():
+    test_near_duplicate_query_hits()
+    test_lru_eviction_keeps_recently_used()
+    test_ttl_and_invalidation()
+    test_expired_nearest_entry_does_not_hide_a_valid_one()
+    print("Semantic cache tests passed")
+
+
+if __name__ == "__main__":
+    run_test_suite()
@@ -0,0 +1,96 @@
+import copy
+
+from speculative import AssistedDecoding
+from tiny_llm import build_tiny_model
+
+GREEDY = dict(max_new_tokens=40, min_new_tokens=40, do_sample=False)
+
+
+def test_exact_copy_draft_is_always_accepted():
+    model, tokenizer = build_tiny_model()
+    assisted = AssistedDecoding(model, copy.deepcopy(model), num_assistant_tokens=4, confidence_threshold=0)
+    inputs = tokenizer("What are the library opening hours?")
+    expected = model.generate(**inputs, **GREEDY)
+    outputs = assisted.generate(**inputs, **GREEDY)
+    assert outputs.tolist() == expected.tolist()
+    stats = assisted.stats.snapshot()
+    assert stats["new_tokens"] == 40
+    assert stats["acceptance_rate"] > 0.9
+    # Four drafts plus one verified token per main-model pass
+    assert stats["tokens_per_main_pass"] > 4
+
+
+def test_unrelated_draft_changes_nothing_but_speed():
+    model, tokenizer = build_tiny_model(seed=0)
+    draft, _ = build_tiny_model(seed=1)
+    assisted = AssistedDecoding(model, draft)
+    inputs = tokenizer("How do I apply for accommodation?")
+    expected = model.generate(**inputs, **GREEDY)
+    assert assisted.generate(**inputs, **GREEDY).tolist() == expected.tolist()
+    stats = assisted.stats.snapshot()
+    assert stats["acceptance_rate"] < 0.2
+    assert stats["tokens_per_main_pass"] < 1.3
+
+
+def test_sampling_and_repetition_penalty_still_apply():
+    from chat_pipeline import GENERATION_KWARGS
+
+    model, tokenizer = build_tiny_model()
+    assisted = AssistedDecoding(model, copy.deepcopy(model))
+    inputs = tokenizer("When are tuition fees due?")
+    kwargs = {**GENERATION_KWARGS, "max_new_tokens": 30, "min_new_tokens": 30}
+    outputs = assisted.generate(**inputs, **kwargs, pad_token_id=tokenizer.pad_token_id)
+    assert outputs.shape[1] == inputs["input_ids"].shape[1] + 30
+    assert assisted.stats.snapshot()["acceptance_rate"] > 0
+
+
+def test_compare_times_plain_and_assisted_generate():
+    model, tokenizer = build_tiny_model()
+    assisted = AssistedDecoding(model, copy.deepcopy(model), num_assistant_tokens=4, confidence_threshold=0)
+    inputs = [tokenizer(prompt) for prompt in ("When are fees due?", "Where is the library?")]
+    report = assisted.compare(inputs, **GREEDY)
+    assert report["prompts"] == 2
+    assert report["plain_ms"] > 0 and report["assisted_ms"] > 0
+    assert report["speedup"] == report["plain_ms"] / report["assisted_ms"]
+    assert report["acceptance_rate"] > 0.9
+    # The running stats only count real requests
+    assert assisted.stats.snapshot()["generations"] == 0
+
+
+def test_draft_must_be_a_separate_model():
+    model, _ = build_tiny_model()
+    try:
+        AssistedDecoding(model, model)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Expected ValueError")
+
+
+def test_pipeline_generates_with_a_draft_model():
+    from benchmark import build_pipeline
+
+    model, tokenizer = build_tiny_model()
+    pipeline = build_pipeline(50)
+    pipeline.setup_generation(model, tokenizer, draft_model=copy.deepcopy(model))
+    response, sources = pipeline.generate("library study rooms")
+    assert isinstance(response, str) and sources
+    events = list(pipeline.generate_stream("accommodation fees"))
+    assert events
+    assert pipeline.assisted.stats.snapshot()["generations"] == 2
+    report = pipeline.compare_decoding(["library study rooms"], max_new_tokens=8)
+    assert report["prompts"] == 1 and report["speedup"] > 0
+
+
+def run_test_suite():
+    test_exact_copy_draft_is_always_accepted()
+    test_unrelated_draft_changes_nothing_but_speed()
+    test_sampling_and_repetition_penalty_still_apply()
+    test_compare_times_plain_and_assisted_generate()
+    test_draft_must_be_a_separate_model()
+    test_pipeline_generates_with_a_draft_model()
+    print("Speculative decoding tests passed")
+
+
+if __name__ == "__main__":
+    run_test_suite()
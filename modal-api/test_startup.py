@@ -0,0 +1,97 @@
+import os
+import tempfile
+import time
+
+from chat_pipeline import ChatPipeline
+from cold_start import StubPipeline, write_synthetic_rag
+from startup import StartupReport, has_safetensors, load_concurrently
+
+
+def test_loaders_run_concurrently():
+    report = StartupReport()
+    results = load_concurrently(
+        {name: (lambda name=name: time.sleep(0.2) or name) for name in ("a", "b", "c")},
+        report,
+    )
+    assert results == {"a": "a", "b": "b", "c": "c"}
+    snapshot = report.snapshot()
+    assert snapshot["sequential_s"] >= 0.6
+    assert snapshot["total_s"] < 0.45
+    assert set(snapshot["phases"]) == {"a", "b", "c"}
+
+
+def test_loader_errors_reach_the_caller():
+    def broken():
+        raise FileNotFoundError("faiss_index.bin")
+
+    report = StartupReport()
+    try:
+        load_concurrently({"ok": lambda: 1, "faiss_index": broken}, report)
+    except FileNotFoundError:
+        pass
+    else:
+        raise AssertionError("expected FileNotFoundError")
+    # The failed phase is still timed
+    assert {p.name for p in report.phases} == {"ok", "faiss_index"}
+
+
+def test_cold_start_overlaps_llm_and_rag():
+    with tempfile.TemporaryDirectory() as rag_dir:
+        write_synthetic_rag(rag_dir, 200)
+        pipeline = StubPipeline(llm_seconds=0.3, embedding_seconds=0.2)
+        report = pipeline.cold_start(rag_dir)
+
+        phases = report.snapshot()["phases"]
+        assert list(phases)[-1] == "setup_generation"
+        # Retrieval was ready before the LLM finished loading
+        assert phases["attach_rag"]["start_s"] < phases["llm"]["duration_s"]
+        # Everything else loaded in the shadow of the LLM
+        assert report.total_s < phases["llm"]["duration_s"] + 0.1
+
+        assert type(pipeline.document_lookup).__name__ == "ChunkStore"
+        assert pipeline.faiss_index.ntotal == len(pipeline.document_lookup)
+        response, sources = pipeline.generate("library opening hours")
+        assert isinstance(response, str)
+
+
+def test_load_rag_falls_back_to_json_lookup():
+    with tempfile.TemporaryDirectory() as rag_dir:
+        write_synthetic_rag(rag_dir, 50)
+        os.remove(os.path.join(rag_dir, "document_chunks.bin"))
+        pipeline = StubPipeline()
+        pipeline.load_rag(rag_dir)
+        assert type(pipeline.document_lookup).__name__ == "JsonChunkLookup"
+        assert pipeline.retrieve_context("library opening hours")[1]
+
+
+def test_has_safetensors():
+    with tempfile.TemporaryDirectory() as model_dir:
+        assert not has_safetensors(model_dir)
+        open(os.path.join(model_dir, "pytorch_model.bin"), "w").close()
+        assert not has_safetensors(model_dir)
+        open(os.path.join(model_dir, "model.safetensors"), "w").close()
+        assert has_safetensors(model_dir)
+    assert not has_safetensors(os.path.join(model_dir, "missing"))
+
+
+def test_base_pipeline_needs_an_llm_loader():
+    try:
+        ChatPipeline().load_llm()
+    except NotImplementedError:
+        pass
+    else:
+        raise AssertionError("expected NotImplementedError")
+
+
+def run_test_suite():
+    test_loaders_run_concurrently()
+    test_loader_errors_reach_the_caller()
+    test_cold_start_overlaps_llm_and_rag()
+    test_load_rag_falls_back_to_json_lookup()
+    test_has_safetensors()
+    test_base_pipeline_needs_an_llm_loader()
+    print("Startup tests passed")
+
+
+if __name__ == "__main__":
+    run_test_suite()
@@ -0,0 +1,159 @@
+import json
+import sys
+import time
+
+from streaming import ResponseStreamFilter, StubGeneratorBackend, stream_chat_events
+
+
+def parse_events(raw_events):
+    events = []
+    for raw in raw_events:
+        lines = raw.strip().split("\n")
+        events.append((lines[0][len("event: "):], json.loads(lines[1][len("data: "):])))
+    return events
+
+
+def test_filter_strips_markers_across_chunks():
+    response_filter = ResponseStreamFilter()
+    pieces = ["The library", " is open", "[/IN", "ST] 24 hours", "</", "s>"]
+    text = "".join(response_filter.feed(piece) for piece in pieces) + response_filter.flush()
+    assert text == "The library is open 24 hours"
+
+
+def test_filter_skips_echoed_prompt():
+    response_filter = ResponseStreamFilter(skip_until_marker=True)
+    pieces = ["<s>[INST] Question: hours? [/", "INST]", "  Open 9am", " to 5pm"]
+    text = "".join(response_filter.feed(piece) for piece in pieces) + response_filter.flush()
+    assert text == "Open 9am to 5pm"
+
+
+def test_digit_guard_trips_incrementally():
+    backend = StubGeneratorBackend(response=" ".join(["123456789"] * 20), first_token_delay=0, token_delay=0)
+    events = parse_events(stream_chat_events(backend, "prompt", ["https://example.com/doc1"]))
+    assert events[-1] == ("error", {"error": "Error occurred. Please try again."})
+    assert len(events) < 20
+
+
+def test_stream_sends_tokens_then_sources():
+    backend = StubGeneratorBackend(first_token_delay=0, token_delay=0)
+    events = parse_events(stream_chat_events(backend, "prompt", ["https://example.com/doc1", "https://example.com/doc2"]))
+    text = "".join(data["text"] for event, data in events if event == "token")
+    assert text == backend.response
+    assert events[-1] == ("done", {"source_documents": ["https://example.com/doc1"]})
+
+
+def warm_up_imports():
+    # So the timings below measure the stream, not importing transformers
+    from tiny_llm import ByteTokenizer
+
+    ByteTokenizer()("warm up")
+
+
+class FailingModel:
+    """Stands in for a causal LM whose generate fails or never produces a token"""
+    device = "cpu"
+
+    def __init__(self, error=None, hang=None):
+        self.error = error
+        self.hang = hang
+
+    def generate(self, streamer, **kwargs):
+        streamer.put(kwargs["input_ids"])  # the prompt, skipped by the streamer
+        if self.hang is not None:
+            self.hang.wait()
+        raise self.error
+
+
+def test_generation_errors_reach_the_consumer():
+    from streaming import HFGeneratorBackend
+    from tiny_llm import ByteTokenizer
+
+    warm_up_imports()
+    backend = HFGeneratorBackend(FailingModel(error=RuntimeError("CUDA out of memory")), ByteTokenizer(), token_timeout=5)
+    start = time.perf_counter()
+    try:
+        list(backend.stream("prompt"))
+    except RuntimeError as exc:
+        assert str(exc) == "CUDA out of memory"
+    else:
+        raise AssertionError("generate's error was swallowed")
+    assert time.perf_counter() - start < 1
+
+
+def test_stuck_generation_times_out():
+    from threading import Event
+
+    from streaming import HFGeneratorBackend
+    from tiny_llm import ByteTokenizer
+
+    warm_up_imports()
+    hang = Event()
+    backend = HFGeneratorBackend(FailingModel(error=RuntimeError("late"), hang=hang), ByteTokenizer(), token_timeout=0.1)
+    start = time.perf_counter()
+    try:
+        list(backend.stream("prompt"))
+    except TimeoutError:
+        pass
+    else:
+        raise AssertionError("stream did not time out")
+    hang.set()
+    assert time.perf_counter() - start < 1
+
+
+class BrokenBackend:
+    """Yields a few words, then fails the way HFGeneratorBackend.stream does"""
+
+    def __init__(self, error):
+        self.error = error
+
+    def stream(self, formatted_prompt, **generation_kwargs):
+        yield "The library"
+        raise self.error
+
+
+def test_stream_failures_end_with_an_error_event():
+    sources = ["https://example.com/doc1"]
+    for error in (RuntimeError("CUDA out of memory"), TimeoutError("No text generated for 60s")):
+        completed = []
+        events = parse_events(stream_chat_events(
+            BrokenBackend(error), "prompt", sources, on_complete=lambda *args: completed.append(args)
+        ))
+        assert events[0] == ("token", {"text": "The library"})
+        assert events[-1] == ("error", {"error": str(error)})
+        assert "done" not in [event for event, _ in events]
+        assert completed == []
+
+
+def measure_time_to_first_token(backend, prompt: str = "<s>[INST] What are the library opening hours? [/INST]"):
+    start = time.time()
+    first_token = None
+    for event in stream_chat_events(backend, prompt, [], max_new_tokens=150):
+        if first_token is None and event.startswith("event: token"):
+            first_token = time.time() - start
+    total = time.time() - start
+    return first_token, total
+
+
+def run_test_suite(use_tiny_model: bool = False):
+    test_filter_strips_markers_across_chunks()
+    test_filter_skips_echoed_prompt()
+    test_digit_guard_trips_incrementally()
+    test_stream_sends_tokens_then_sources()
+    test_generation_errors_reach_the_consumer()
+    test_stuck_generation_times_out()
+    test_stream_failures_end_with_an_error_event()
+    print("Streaming filter tests passed")
+
+    backend = StubGeneratorBackend()
+    if use_tiny_model:
+        from streaming import load_tiny_backend
+        backend = load_tiny_backend()
+
+    print(f"\nBackend: {type(backend).__name__}")
+    first_token, total = measure_time_to_first_token(backend)
+    print(f"Time to first token: {first_token * 1000:.1f} ms")
+    print(f"Total stream time: {total * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    run_test_suite(use_tiny_model="--tiny" in sys.argv)
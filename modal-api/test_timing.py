@@ -0,0 +1,99 @@
+import asyncio
+
+from benchmark import build_pipeline, synthetic_queries
+from timing import (
+    NULL_TIMER,
+    REGISTRY,
+    STAGE_SECONDS,
+    Histogram,
+    current_timer,
+    start_request,
+    timed_stream,
+)
+from tiny_llm import build_tiny_model
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("demo_seconds", "Demo", ["stage"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 2.0):
+        histogram.observe(value, "embed")
+    lines = histogram.render()
+    assert 'demo_seconds_bucket{stage="embed",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{stage="embed",le="1.0"} 3' in lines
+    assert 'demo_seconds_bucket{stage="embed",le="+Inf"} 4' in lines
+    assert 'demo_seconds_count{stage="embed"} 4' in lines
+    assert 'demo_seconds_sum{stage="embed"} 3.05' in lines
+
+
+def test_generate_records_every_stage():
+    pipeline = build_pipeline(200)
+    pipeline.setup_generation(*build_tiny_model())
+    query = synthetic_queries(list(pipeline.document_lookup.lookup.values()), 1)[0]
+
+    timer = start_request(enabled=True)
+    pipeline.generate(query)
+    for stage in ("embed", "answer_cache", "faiss_search", "bm25_search", "rank_fusion",
+                  "chunk_lookup", "pack_prompt", "tokenize", "generate", "decode", "postprocess"):
+        assert stage in timer.stages, stage
+    assert "generate;dur=" in timer.server_timing()
+    assert timer.server_timing().split(", ")[-1].startswith("total;dur=")
+
+    timer.finish("chat")
+    metrics = REGISTRY.render()
+    assert 'chat_stage_duration_seconds_count{stage="generate"}' in metrics
+    assert 'chat_request_duration_seconds_count{endpoint="chat"}' in metrics
+    assert "chat_prompt_tokens_count" in metrics
+    assert "chat_generation_tokens_per_second_count" in metrics
+
+
+def test_spans_follow_the_request_into_threads():
+    pipeline = build_pipeline(200)
+    pipeline.setup_generation(*build_tiny_model())
+    query = synthetic_queries(list(pipeline.document_lookup.lookup.values()), 1)[0]
+
+    async def run():
+        timer = start_request(enabled=True)
+        await pipeline.generate_async(query)
+        await pipeline.scheduler.close()
+        return timer
+
+    timer = asyncio.run(run())
+    assert {"embed", "faiss_search", "pack_prompt", "generate"} <= set(timer.stages)
+
+
+def test_stream_is_timed_across_steps():
+    pipeline = build_pipeline(200)
+    pipeline.setup_generation(*build_tiny_model())
+    query = synthetic_queries(list(pipeline.document_lookup.lookup.values()), 1)[0]
+
+    timer = start_request(enabled=True)
+    events = timed_stream(pipeline.generate_stream(query), timer, "chat_stream")
+    # Nothing runs until the stream is consumed, possibly in another context
+    start_request(enabled=False)
+    assert list(events)[-1].startswith("event: done")
+    assert {"embed", "time_to_first_token", "generate"} <= set(timer.stages)
+    assert current_timer() is NULL_TIMER
+
+
+def test_disabled_timer_records_nothing():
+    pipeline = build_pipeline(50)
+    before = STAGE_SECONDS.render()
+    timer = start_request(enabled=False)
+    pipeline.retrieve_context("library opening hours")
+    timer.finish("chat")
+    assert timer is NULL_TIMER
+    assert timer.server_timing() == ""
+    assert STAGE_SECONDS.render() == before
+
+
+def run_test_suite():
+    test_histogram_renders_cumulative_buckets()
+    test_generate_records_every_stage()
+    test_spans_follow_the_request_into_threads()
+    test_stream_is_timed_across_steps()
+    test_disabled_timer_records_nothing()
+    print("Timing tests passed")
+
+
+if __name__ == "__main__":
+    run_test_suite()
@@ -0,0 +1,244 @@
+"""Per-request stage timing and Prometheus-style metrics
+
+A `RequestTimer` collects named spans for one request; it is reached
+through a context variable, so pipeline code only calls `span("embed")`
+and timings follow the request across `asyncio.to_thread`. When metrics
+are disabled the current timer is `NULL_TIMER`, whose spans are a shared
+no-op context manager.
+
+Finished timers feed `STAGE_SECONDS`, rendered with the other metrics in
+the Prometheus text format by `REGISTRY.render()`. `server_timing()`
+formats the spans for a `Server-Timing` response header.
+"""
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from threading import Lock
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Set METRICS_ENABLED=0 to skip all timing and histogram updates
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 768, 1024, 1536, 2048, 4096)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200, 400)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._lock = Lock()
+        # label values -> [per-bucket counts..., +Inf count], sum
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *label_values: str):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = ([0] * (len(self.buckets) + 1), [0.0])
+                self._series[label_values] = series
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1][0] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    labels = _format_labels(self.label_names, label_values, f'le="{le}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.label_names, label_values)
+                lines.append(f"{self.name}_sum{labels} {total[0]}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {value}")
+        return lines
+
+
+class Gauge:
+    """Reports the current value of `read()` at render time"""
+
+    def __init__(self, name: str, documentation: str, read):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {float(self.read())}",
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "chat_stage_duration_seconds", "Time spent in each stage of a chat request", ["stage"],
+))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "chat_request_duration_seconds", "End-to-end chat request time", ["endpoint"],
+))
+PROMPT_TOKENS = REGISTRY.register(Histogram(
+    "chat_prompt_tokens", "Prompt tokens per generation", buckets=TOKEN_BUCKETS,
+))
+GENERATED_TOKENS = REGISTRY.register(Histogram(
+    "chat_generated_tokens", "New tokens per generation", buckets=TOKEN_BUCKETS,
+))
+TOKENS_PER_SECOND = REGISTRY.register(Histogram(
+    "chat_generation_tokens_per_second", "Decoding speed per generate call", buckets=RATE_BUCKETS,
+))
+
+
+class RequestTimer:
+    def __init__(self):
+        self.start = time.perf_counter()
+        # stage -> accumulated seconds, in first-seen order
+        self.stages: Dict[str, float] = {}
+
+    def record(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def span(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def finish(self, endpoint: str):
+        """Export the stages and the total to the histograms"""
+        for stage, seconds in self.stages.items():
+            STAGE_SECONDS.observe(seconds, stage)
+        REQUEST_SECONDS.observe(time.perf_counter() - self.start, endpoint)
+
+    def server_timing(self) -> str:
+        entries = [f"{stage};dur={1000 * seconds:.2f}" for stage, seconds in self.stages.items()]
+        entries.append(f"total;dur={1000 * (time.perf_counter() - self.start):.2f}")
+        return ", ".join(entries)
+
+
+class _NullTimer:
+    stages: Dict[str, float] = {}
+
+    def record(self, stage: str, seconds: float):
+        pass
+
+    def span(self, stage: str):
+        return _NULL_SPAN
+
+    def finish(self, endpoint: str):
+        pass
+
+    def server_timing(self) -> str:
+        return ""
+
+
+_NULL_SPAN = nullcontext()
+_DONE = object()
+NULL_TIMER = _NullTimer()
+_current_timer: ContextVar = ContextVar("request_timer", default=NULL_TIMER)
+
+
+def start_request(enabled: Optional[bool] = None):
+    """Install a new timer for the current request and return it"""
+    if enabled is None:
+        enabled = METRICS_ENABLED
+    timer = RequestTimer() if enabled else NULL_TIMER
+    _current_timer.set(timer)
+    return timer
+
+
+def current_timer():
+    return _current_timer.get()
+
+
+def span(stage: str):
+    return _current_timer.get().span(stage)
+
+
+@contextmanager
+def use_timer(timer):
+    token = _current_timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _current_timer.reset(token)
+
+
+def timed_stream(events: Iterator, timer, endpoint: str) -> Iterator:
+    """Iterate `events` with `timer` installed, finishing it at the end
+
+    Streaming responses advance the generator from worker threads that do
+    not share the endpoint's context, so each step re-installs the timer.
+    """
+    try:
+        while True:
+            with use_timer(timer):
+                event = next(events, _DONE)
+            if event is _DONE:
+                return
+            yield event
+    finally:
+        timer.finish(endpoint)
+
+
+def record_generation(prompt_tokens: int, new_tokens: int, seconds: float):
+    """Token counts and decoding speed of one generated sequence"""
+    if not METRICS_ENABLED:
+        return
+    PROMPT_TOKENS.observe(prompt_tokens)
+    GENERATED_TOKENS.observe(new_tokens)
+    if seconds > 0:
+        TOKENS_PER_SECOND.observe(new_tokens / seconds)
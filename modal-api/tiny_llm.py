@@ -0,0 +1,105 @@
+from typing import List, Union
+
+
+class ByteTokenizer:
+    """Byte-level tokenizer with the subset of the HF tokenizer API we use
+
+    Lets tests build a real `generate`-capable model without downloading a
+    tokenizer from the Hub.
+    """
+
+    pad_token_id = 0
+    bos_token_id = 1
+    eos_token_id = 2
+    byte_offset = 3
+    vocab_size = 256 + byte_offset
+
+    def __init__(self, padding_side: str = "left"):
+        self.padding_side = padding_side
+
+    def encode(self, text: str, add_special_tokens: bool = True) -> List[int]:
+        ids = [b + self.byte_offset for b in text.encode("utf-8")]
+        return [self.bos_token_id] + ids if add_special_tokens else ids
+
+    def __call__(
+        self,
+        text: Union[str, List[str]],
+        return_tensors: str = "pt",
+        padding: bool = False,
+        add_special_tokens: bool = True,
+    ):
+        import torch
+        from transformers import BatchEncoding
+
+        texts = [text] if isinstance(text, str) else text
+        encoded = [self.encode(t, add_special_tokens) for t in texts]
+        width = max(len(ids) for ids in encoded)
+        if len(set(len(ids) for ids in encoded)) > 1 and not padding:
+            raise ValueError("Sequences have different lengths; pass padding=True")
+
+        input_ids, attention_mask = [], []
+        for ids in encoded:
+            pad = [self.pad_token_id] * (width - len(ids))
+            mask = [1] * len(ids)
+            if self.padding_side == "left":
+                input_ids.append(pad + ids)
+                attention_mask.append([0] * len(pad) + mask)
+            else:
+                input_ids.append(ids + pad)
+                attention_mask.append(mask + [0] * len(pad))
+
+        return BatchEncoding(
+            {
+                "input_ids": torch.tensor(input_ids, dtype=torch.long),
+                "attention_mask": torch.tensor(attention_mask, dtype=torch.long),
+            },
+            tensor_type=return_tensors,
+        )
+
+    def decode(self, ids, skip_special_tokens: bool = False, **kwargs) -> str:
+        if hasattr(ids, "tolist"):
+            ids = ids.tolist()
+        data = bytearray()
+        for i in ids:
+            if i >= self.byte_offset:
+                data.append(i - self.byte_offset)
+            elif not skip_special_tokens and i == self.eos_token_id:
+                data.extend(b"</s>")
+        return data.decode("utf-8", errors="ignore")
+
+    def batch_decode(self, sequences, skip_special_tokens: bool = False, **kwargs) -> List[str]:
+        return [self.decode(ids, skip_special_tokens=skip_special_tokens) for ids in sequences]
+
+    def convert_tokens_to_ids(self, token: str) -> int:
+        return {"<pad>": self.pad_token_id, "<s>": self.bos_token_id, "</s>": self.eos_token_id}[token]
+
+
+def build_tiny_model(
+    hidden_size: int = 64,
+    num_hidden_layers: int = 2,
+    seed: int = 0,
+):
+    """Build a randomly initialised Llama model and byte tokenizer on CPU
+
+    Exercises the real `generate` code paths with a model small enough to
+    run in a test suite. Output text is gibberish.
+    """
+    import torch
+    from transformers import LlamaConfig, LlamaForCausalLM
+
+    torch.manual_seed(seed)
+    tokenizer = ByteTokenizer()
+    config = LlamaConfig(
+        vocab_size=tokenizer.vocab_size,
+        hidden_size=hidden_size,
+        intermediate_size=hidden_size * 2,
+        num_hidden_layers=num_hidden_layers,
+        num_attention_heads=4,
+        num_key_value_heads=4,
+        max_position_embeddings=4096,
+        bos_token_id=tokenizer.bos_token_id,
+        eos_token_id=tokenizer.eos_token_id,
+        pad_token_id=tokenizer.pad_token_id,
+    )
+    model = LlamaForCausalLM(config).eval()
+    return model, tokenizer
@@ -0,0 +1,187 @@
+"""Sweep FAISS index types and search settings: recall@k, latency, memory
+
+Builds flat, HNSW, IVF-Flat and IVF-PQ indexes over the corpus vectors
+and, for each `nprobe`/`ef_search` value, measures recall@k against exact
+search, single-query latency and the index size:
+
+    python tune_ann_index.py --rag-dir rag/ --k 5
+    python tune_ann_index.py --synthetic 50000 --output sweep.json
+
+Vectors come from `embedding_cache.npz` in the RAG directory, or from the
+flat index itself. Queries are embedded from --query-file (one question
+per line, needs sentence-transformers) or, by default, are corpus vectors
+with noise added, so the nearest neighbours are not the query itself.
+Pick the cheapest row with acceptable recall, then rebuild with
+`build_rag_index.py --index-type ...` and set FAISS_NPROBE/FAISS_EF_SEARCH.
+"""
+import argparse
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+from ann_index import IndexSpec, build_ann_index, index_memory_bytes, load_index
+from benchmark import summarize
+
+DEFAULT_NPROBE = (1, 4, 16, 64)
+DEFAULT_EF_SEARCH = (16, 32, 64, 128)
+
+
+def load_vectors(rag_dir: str):
+    import numpy as np
+
+    cache_path = os.path.join(rag_dir, "embedding_cache.npz")
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as cache:
+            vectors = np.stack([cache[key] for key in cache.files]).astype("float32")
+    else:
+        index, _ = load_index(rag_dir, mmap=False)
+        vectors = index.reconstruct_n(0, index.ntotal)
+    import faiss
+
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def synthetic_vectors(count: int, dim: int = 384, clusters: int = 200, seed: int = 0):
+    """Clustered unit vectors, closer to real embeddings than uniform noise"""
+    import faiss
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype("float32")
+    vectors = centres[rng.integers(0, clusters, count)] + 0.5 * rng.standard_normal((count, dim)).astype("float32")
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def noisy_queries(vectors, count: int, noise: float = 0.3, seed: int = 1):
+    import faiss
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    rows = vectors[rng.choice(len(vectors), size=min(count, len(vectors)), replace=False)]
+    queries = rows + noise * rng.standard_normal(rows.shape).astype("float32") / np.sqrt(rows.shape[1])
+    queries = queries.astype("float32")
+    faiss.normalize_L2(queries)
+    return queries
+
+
+def recall_at_k(found, exact) -> float:
+    """Mean fraction of the exact top-k ids that the index also returned"""
+    k = exact.shape[1]
+    hits = sum(len(set(f[f >= 0]) & set(e[e >= 0])) for f, e in zip(found, exact))
+    return hits / (len(exact) * k)
+
+
+def measure(index, spec: IndexSpec, queries, exact, k: int, nprobe=None, ef_search=None) -> dict:
+    params = spec.search_params(nprobe, ef_search)
+    found = []
+    latencies = []
+    start = time.perf_counter()
+    for query in queries:
+        query_start = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), k, params=params)
+        latencies.append(time.perf_counter() - query_start)
+        found.append(ids[0])
+    stats = summarize(latencies, time.perf_counter() - start)
+    return {
+        "recall": recall_at_k(found, exact),
+        "p50_ms": stats["p50_ms"],
+        "p95_ms": stats["p95_ms"],
+        "qps": stats["rps"],
+    }
+
+
+def sweep(
+    vectors,
+    queries,
+    k: int = 5,
+    index_types: Optional[List[str]] = None,
+    nprobe_values=DEFAULT_NPROBE,
+    ef_search_values=DEFAULT_EF_SEARCH,
+    spec_overrides: Optional[dict] = None,
+) -> List[Dict]:
+    """One row per index type and search setting"""
+    exact_index = build_ann_index(vectors, IndexSpec("flat"))
+    _, exact = exact_index.search(queries, k)
+
+    rows = []
+    for index_type in index_types or ["flat", "hnsw", "ivf_flat", "ivf_pq"]:
+        spec = IndexSpec(index_type, **(spec_overrides or {}))
+        build_start = time.perf_counter()
+        index = build_ann_index(vectors, spec)
+        base = {
+            "index": index_type,
+            "build_s": time.perf_counter() - build_start,
+            "memory_mb": index_memory_bytes(index) / 2**20,
+        }
+        if spec.is_ivf:
+            settings = [{"nprobe": n} for n in nprobe_values if n <= spec.nlist]
+        elif index_type == "hnsw":
+            settings = [{"ef_search": ef} for ef in ef_search_values]
+        else:
+            settings = [{}]
+        for setting in settings:
+            row = {**base, "setting": " ".join(f"{key}={value}" for key, value in setting.items()) or "exact"}
+            row.update(measure(index, spec, queries, exact, k, **setting))
+            rows.append(row)
+    return rows
+
+
+def print_rows(rows: List[Dict], k: int):
+    print(f"{'index':<9} {'setting':<13} {'recall@' + str(k):>9} {'p50 ms':>8} {'p95 ms':>8} {'qps':>8} {'MB':>8} {'build s':>8}")
+    for row in rows:
+        print(
+            f"{row['index']:<9} {row['setting']:<13} {row['recall']:>9.3f} {row['p50_ms']:>8.3f} "
+            f"{row['p95_ms']:>8.3f} {row['qps']:>8.0f} {row['memory_mb']:>8.1f} {row['build_s']:>8.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall/latency/memory sweep over FAISS index types")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--rag-dir", help="RAG directory built by build_rag_index.py")
+    source.add_argument("--synthetic", type=int, help="Use this many clustered random vectors instead")
+    parser.add_argument("--query-file", help="Questions, one per line, embedded with MiniLM")
+    parser.add_argument("--queries", type=int, default=500, help="Noisy corpus queries when no --query-file")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--types", nargs="+", choices=["flat", "hnsw", "ivf_flat", "ivf_pq"])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=list(DEFAULT_NPROBE))
+    parser.add_argument("--ef-search", type=int, nargs="+", default=list(DEFAULT_EF_SEARCH))
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--pq-m", type=int, default=48)
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--output", help="Write the rows as JSON to this path")
+    args = parser.parse_args()
+
+    vectors = load_vectors(args.rag_dir) if args.rag_dir else synthetic_vectors(args.synthetic)
+    if args.query_file:
+        from sentence_transformers import SentenceTransformer
+
+        with open(args.query_file) as f:
+            questions = [line.strip() for line in f if line.strip()]
+        queries = SentenceTransformer("all-MiniLM-L6-v2").encode(questions, normalize_embeddings=True)
+        queries = queries.astype("float32")
+    else:
+        queries = noisy_queries(vectors, args.queries)
+
+    print(f"{len(vectors)} vectors of dim {vectors.shape[1]}, {len(queries)} queries\n")
+    rows = sweep(
+        vectors,
+        queries,
+        k=args.k,
+        index_types=args.types,
+        nprobe_values=args.nprobe,
+        ef_search_values=args.ef_search,
+        spec_overrides={"nlist": args.nlist, "pq_m": args.pq_m, "hnsw_m": args.hnsw_m},
+    )
+    print_rows(rows, args.k)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "vectors": len(vectors), "rows": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()